@@ -20,15 +20,21 @@ from __future__ import absolute_import, print_function
 
 import argparse
 import logging
-import pyvis
-import shutil
 import os
 import json
+import time
 
-import renkuaqs.graph_utils as graph_utils
+import renkuaqs.graph_build_pool as graph_build_pool
+import renkuaqs.metrics as metrics
+import renkuaqs.static_assets as static_assets
+import renkuaqs.graph_reduction as graph_reduction
 
 from . import config
 from functools import partial
+from urllib.parse import urlparse, parse_qs
+from renkuaqs.graph_snapshot import GraphSnapshotStore
+from renkuaqs.single_flight import SingleFlight
+from renkuaqs.graph_build_pool import GraphBuildPool
 from pip._vendor import pkg_resources
 from renku.version import __version__
 from http.server import SimpleHTTPRequestHandler
@@ -50,84 +56,287 @@ def _check_renku_version():
                      "You should consider install the suggested version.",)
 
 
+def _graph_version():
+    repo = Repo('.')
+    sha = repo.head.commit.hexsha
+    short_sha = repo.git.rev_parse(sha, short=8)
+    return short_sha
+
+
+_graph_snapshots = GraphSnapshotStore(
+    int(os.environ.get(config.GRAPH_SNAPSHOTS_ENV, config.GRAPH_SNAPSHOTS_DEFAULT)))
+# concurrent requests for the same graph version share a single rebuild
+_graph_builds = SingleFlight()
+# replaced by a pool of worker processes when the graph server is started
+_graph_build_pool = GraphBuildPool(max_workers=0)
+
+
+def _build_graph_snapshot(graph_version, paths):
+    graph_snapshot = _graph_build_pool.run(graph_build_pool.build_graph_snapshot_artifact, graph_version, paths)
+    _graph_snapshots.put(graph_snapshot)
+    metrics.snapshot_triples.set(len(graph_snapshot))
+    metrics.snapshot_bytes.set(len(graph_snapshot.graph_ttl_content.encode()))
+    logging.info(f"Graph snapshot built for the version {graph_version}, {len(graph_snapshot)} triples")
+    return graph_snapshot
+
+
+def _get_graph_snapshot(paths):
+    """Return the snapshot of the current graph version, building it only when the version changed."""
+    graph_version = _graph_version()
+    graph_snapshot = _graph_snapshots.get(graph_version)
+    metrics.cache_lookup("snapshot", graph_snapshot is not None)
+    if graph_snapshot is None:
+        graph_snapshot = _graph_builds.do(('snapshot', graph_version), _build_graph_snapshot, graph_version, paths)
+    return graph_snapshot
+
+
+def _build_reduced_snapshot(graph_snapshot, reductions):
+    reduced_snapshot = _graph_build_pool.run(graph_build_pool.build_reduced_snapshot_artifact,
+                                             graph_snapshot, reductions)
+    graph_snapshot.reduced_snapshots[reductions] = reduced_snapshot
+    logging.info(f"Reduced graph snapshot built for the version {graph_snapshot.graph_version} "
+                 f"and the reductions {','.join(reductions)}, {len(reduced_snapshot)} triples")
+    return reduced_snapshot
+
+
+def _get_reduced_snapshot(graph_snapshot, reductions):
+    """Return the view of a snapshot with the reductions applied, building it once per snapshot and reductions."""
+    reductions = tuple(sorted(reductions))
+    if not reductions:
+        return graph_snapshot
+    reduced_snapshot = graph_snapshot.reduced_snapshots.get(reductions)
+    metrics.cache_lookup("reduced_snapshot", reduced_snapshot is not None)
+    if reduced_snapshot is None:
+        reduced_snapshot = _graph_builds.do(('reduced', graph_snapshot.graph_version, reductions),
+                                            _build_reduced_snapshot, graph_snapshot, reductions)
+    return reduced_snapshot
+
+
+def _reductions_param(query_params):
+    # eg reduce=Activity,AstrophysicalRegion, the reductions of graph_reduction_config.json
+    return graph_reduction.parse_reductions(",".join(query_params.get('reduce', [])))
+
+
 class HTTPGraphHandler(SimpleHTTPRequestHandler):
+    endpoints = ('/', '/graph_version', '/ttl_graph', '/subgraph', '/subsets', '/metrics', '/lib/bindings/utils.js')
+
     def __init__(self, request, client_address, *args, **kwargs) -> None:
+        self.response_status = None
         super().__init__(request, client_address, *args, **kwargs)
         self.logger = logging.getLogger(self.__class__.__name__)
 
+    def send_response(self, code, message=None) -> None:
+        self.response_status = code
+        super().send_response(code, message)
 
     def do_GET(self) -> None:
+        endpoint = urlparse(self.path).path
+        if endpoint not in self.endpoints:
+            endpoint = 'static'
+        start = time.perf_counter()
+        try:
+            self._do_GET()
+            if self.response_status is None:
+                # rather than closing the connection without any response, nor status to count
+                self.send_error(404, f"{self.path} not found")
+        finally:
+            metrics.http_request_duration_seconds.observe(time.perf_counter() - start, endpoint=endpoint)
+            metrics.http_requests_total.inc(endpoint=endpoint, status=self.response_status)
+
+    def _do_GET(self) -> None:
         mount_path_env = os.environ.get('MOUNT_PATH', None)
         logging.info(f'self.path = {self.path}, os.cwd = {os.getcwd()}, mount_path = {mount_path_env}')
         if self.path == '/':
 
+            # the status is sent once the page is built, a failed build is not reported as a success
             try:
-                self.send_response(200)
-                self.send_header("Content-type", "text/html")
-                self.end_headers()
-                graph_utils.inspect_oda_graph_inputs(None, paths=os.getcwd())
-                graph_html_content, ttl_content = graph_utils.build_graph_html(None, paths=os.getcwd(),
-                                                                               template_location="remote",
-                                                                               include_ttl_content_within_html=False)
-                self.wfile.write(graph_html_content.encode())
+                graph_html_content = _graph_builds.do(('html', _graph_version()),
+                                                      _graph_build_pool.run,
+                                                      graph_build_pool.build_graph_html_artifact, os.getcwd())
+                status = 200
             except Exception as e:
-                output_html = f'''
+                graph_html_content = f'''
                 <html><head></head><body><h1>Error while generating the output graph:</h1>
                 <p>{e}</p>
                 </body>
                 </html>
                 '''
-                self.wfile.write(output_html.encode())
+                status = 500
                 logging.warning(f"Error while generating the output graph: {e}")
 
+            self.send_response(status)
+            self.send_header("Content-type", "text/html")
+            self.end_headers()
+            self.wfile.write(graph_html_content.encode())
+
         if self.path == '/graph_version':
             self.send_response(200)
             self.send_header("Content-type", "text/html")
             self.end_headers()
-            repo = Repo('.')
-            sha = repo.head.commit.hexsha
-            short_sha = repo.git.rev_parse(sha, short=8)
+            short_sha = _graph_version()
             logging.info(f"Graph version, git revision is: {short_sha}")
             self.wfile.write(short_sha.encode())
 
         if self.path.startswith('/ttl_graph'):
-            graph_ttl_content = graph_utils.extract_graph(None, paths=os.getcwd())
-            logging.info(f"ttl graph = {graph_ttl_content[0:100]}")
-            repo = Repo('.')
-            sha = repo.head.commit.hexsha
-            short_sha = repo.git.rev_parse(sha, short=8)
-            logging.info(f"Graph version, git revision is: {short_sha}")
-
-            output_obj = {
-                'graph_ttl_content': graph_ttl_content,
-                'graph_version': short_sha
-            }
+            query_params = parse_qs(urlparse(self.path).query)
+            since = query_params.get('since', [None])[0]
+            try:
+                reductions = _reductions_param(query_params)
+            except ValueError as e:
+                self.send_error(400, str(e))
+                return
+
+            graph_snapshot = _get_reduced_snapshot(_get_graph_snapshot(os.getcwd()), reductions)
+            logging.info(f"Graph version, git revision is: {graph_snapshot.graph_version}")
+
+            previous_snapshot = _graph_snapshots.get(since) if since is not None else None
+            if since is not None:
+                metrics.cache_lookup("snapshot_delta", previous_snapshot is not None)
+            if previous_snapshot is not None:
+                previous_snapshot = _get_reduced_snapshot(previous_snapshot, reductions)
+
+            if previous_snapshot is not None:
+                added_triples, removed_triples = graph_snapshot.delta(previous_snapshot)
+                logging.info(f"Graph delta since {since}: {len(added_triples)} added, "
+                             f"{len(removed_triples)} removed triples")
+                output_obj = {
+                    'graph_version': graph_snapshot.graph_version,
+                    'since': previous_snapshot.graph_version,
+                    'delta': True,
+                    'added_triples': "\n".join(added_triples),
+                    'removed_triples': "\n".join(removed_triples)
+                }
+            else:
+                # no retained snapshot to compare with, the full graph is returned
+                logging.info(f"ttl graph = {graph_snapshot.graph_ttl_content[0:100]}")
+                output_obj = {
+                    'graph_ttl_content': graph_snapshot.graph_ttl_content,
+                    'graph_version': graph_snapshot.graph_version,
+                    'delta': False
+                }
             self.send_response(200)
             self.send_header("Content-type", "text/html")
             self.end_headers()
             self.wfile.write(json.dumps(output_obj).encode())
 
-        if self.path == '/lib/bindings/utils.js':
-            pyvis_package_path = pyvis.__path__[0]
-            shutil.copy(pyvis_package_path)
-            logging.info(f'lib bindings utils js path {self.path}')
-            logging.info(f'Graph http server GET pointing at : {self.path}')
-            super().do_GET()
+        if self.path == '/metrics':
+            self.send_response(200)
+            self.send_header("Content-type", "text/plain; version=0.0.4")
+            self.end_headers()
+            self.wfile.write(metrics.registry.expose().encode())
+
+        if self.path.startswith('/subgraph'):
+            query_params = parse_qs(urlparse(self.path).query)
+            node = query_params.get('node', [None])[0]
+            if node is None:
+                self.send_error(400, "the node parameter is required")
+                return
+            try:
+                depth = int(query_params.get('depth', ['1'])[0])
+            except ValueError:
+                self.send_error(400, "the depth parameter must be an integer")
+                return
+            predicates = None
+            if 'predicates' in query_params:
+                predicates = [p.strip() for p in ",".join(query_params['predicates']).split(",") if p.strip()]
+
+            try:
+                reductions = _reductions_param(query_params)
+            except ValueError as e:
+                self.send_error(400, str(e))
+                return
+
+            graph_snapshot = _get_reduced_snapshot(_get_graph_snapshot(os.getcwd()), reductions)
+            try:
+                output_obj = graph_snapshot.subgraph(node, depth=depth, predicates=predicates)
+            except KeyError:
+                self.send_error(404, f"node {node} not found in the graph")
+                return
+
+            self.send_response(200)
+            self.send_header("Content-type", "application/json")
+            self.end_headers()
+            self.wfile.write(json.dumps(output_obj).encode())
+
+        if self.path.startswith('/subsets'):
+            query_params = parse_qs(urlparse(self.path).query)
+            try:
+                reductions = _reductions_param(query_params)
+            except ValueError as e:
+                self.send_error(400, str(e))
+                return
+
+            subset_name = query_params.get('subset', [None])[0]
+            if subset_name is not None and reductions:
+                # the triples of the subsets are those of the graph before the reductions
+                self.send_error(400, "the subset and reduce parameters cannot be combined")
+                return
+
+            graph_snapshot = _get_reduced_snapshot(_get_graph_snapshot(os.getcwd()), reductions)
+            if subset_name is None:
+                # the membership of the nodes within each subset, the subsets are then filtered by the client
+                output_obj = graph_snapshot.subsets()
+            elif subset_name in graph_snapshot.node_subsets:
+                output_obj = {
+                    'graph_version': graph_snapshot.graph_version,
+                    'subset': subset_name,
+                    'triples': "\n".join(graph_snapshot.node_subsets[subset_name]['triples_nt'])
+                }
+            else:
+                self.send_error(404, f"subset {subset_name} not found")
+                return
 
+            self.send_response(200)
+            self.send_header("Content-type", "application/json")
+            self.end_headers()
+            self.wfile.write(json.dumps(output_obj).encode())
+
+        if self.path.startswith(f'/{static_assets.STATIC_URL_PREFIX}/'):
+            asset_path = static_assets.resolve(urlparse(self.path).path)
+            if asset_path is None:
+                self.send_error(404, f"{self.path} not found")
+                return
+            self._send_asset(asset_path, "public, max-age=31536000, immutable")
+
+        if self.path == '/lib/bindings/utils.js':
+            # not content-hashed, kept for pages generated with the plain pyvis template
+            asset_path = static_assets.asset_path('lib/bindings/utils.js')
+            logging.info(f'lib bindings utils js path {asset_path}')
+            if asset_path is None:
+                self.send_error(404, f"{self.path} not found")
+                return
+            self._send_asset(asset_path, "no-cache")
+
+    def _send_asset(self, asset_path, cache_control):
+        with open(asset_path, "rb") as asset_f:
+            asset_content = asset_f.read()
+        self.send_response(200)
+        self.send_header("Content-type", self.guess_type(asset_path))
+        self.send_header("Content-Length", str(len(asset_content)))
+        self.send_header("Cache-Control", cache_control)
+        self.end_headers()
+        self.wfile.write(asset_content)
 
 
 def _start_graph_http_server(*args):
+    global _graph_build_pool
+
     logging.info(args)
 
     ap = argparse.ArgumentParser()
     ap.add_argument('wwwroot')
     ap.add_argument('port')
+    ap.add_argument('--build-workers', type=int, default=None,
+                    help=f"Number of worker processes building the graph, "
+                         f"default from the {config.GRAPH_BUILD_WORKERS_ENV} environment variable")
     args = ap.parse_args(args)
 
     logging.info(args)
 
-    from http.server import HTTPServer
-    server = HTTPServer(
+    _graph_build_pool = GraphBuildPool(max_workers=args.build_workers, paths=os.getcwd())
+
+    from http.server import ThreadingHTTPServer
+    server = ThreadingHTTPServer(
         ('localhost', int(args.port)),
         partial(HTTPGraphHandler, directory=args.wwwroot),
         )
@@ -139,6 +348,7 @@ def _start_graph_http_server(*args):
         pass
 
     server.server_close()
+    _graph_build_pool.shutdown()
     logging.info("Graph server stopped.")
 
 def setup_graph_visualizer():
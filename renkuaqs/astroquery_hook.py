@@ -0,0 +1,74 @@
+import sys
+
+# This module is copied as the sitecustomize.py of the processes launched by renku run,
+# it should therefore only rely on the standard library and be cheap to import:
+# the astroquery hooks are only enabled once astroquery is actually imported.
+
+HOOKED_MODULE = "astroquery"
+
+
+def enable_hooks():
+    print(f"\033[31menabling hooks for astroquery\033[0m")
+
+    import aqsconverters.aq
+    import renkuaqs.capture
+
+    aqsconverters.aq.autolog()
+    renkuaqs.capture.install()
+
+
+class _HookedLoader(object):
+    """Delegate to the loader of astroquery, and enable the hooks once the module is executed."""
+
+    def __init__(self, loader, finder):
+        self._loader = loader
+        self._finder = finder
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._loader.exec_module(module)
+        self._finder.uninstall()
+        try:
+            enable_hooks()
+        except Exception as e:
+            print(f"\033[31mfailed to enable the hooks for astroquery: {e}\033[0m")
+
+
+class AstroqueryHookFinder(object):
+    """sys.meta_path finder waiting for the import of astroquery."""
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname != HOOKED_MODULE:
+            return None
+        # delegate to the finders following this one, eg those of the editable installs or of zipimport
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        if spec.loader is None:
+            return spec
+        spec.loader = _HookedLoader(spec.loader, self)
+        return spec
+
+    def install(self):
+        if HOOKED_MODULE in sys.modules:
+            enable_hooks()
+        elif self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+
+if __name__ == "sitecustomize":
+    AstroqueryHookFinder().install()
@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import fcntl
+import atexit
+import logging
+import threading
+
+from pathlib import Path
+from renkuaqs.config import RUN_TOKEN_ENV
+
+ENV_RENKU_HOME = "RENKU_HOME"
+CAPTURE_FILE_NAME = "capture.jsonl"
+# the parallel renku runs of a checkout each capture their annotations within their own directory
+RUNS_DIR = "runs"
+
+# the captured annotations are flushed to disk (and fsynced) every CAPTURE_BATCH_SIZE records,
+# every CAPTURE_BATCH_SECONDS seconds, and at the exit of the process
+CAPTURE_BATCH_SIZE = 100
+CAPTURE_BATCH_SECONDS = 1.0
+
+
+class CaptureWriter(object):
+    """Append-only JSONL capture of the astroquery annotations of a run, one annotation per line."""
+
+    def __init__(self, path, batch_size=CAPTURE_BATCH_SIZE, batch_seconds=CAPTURE_BATCH_SECONDS):
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self.batch_seconds = batch_seconds
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def write(self, annotation_id_hash, annotation):
+        record = json.dumps({"hash": annotation_id_hash, "annotation": annotation}, separators=(",", ":"))
+        with self._lock:
+            self._pending.append(record + "\n")
+            if len(self._pending) >= self.batch_size or \
+                    time.monotonic() - self._last_flush >= self.batch_seconds:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._pending:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "ab+") as capture_f:
+                # several processes of the same run can append to the capture file
+                fcntl.flock(capture_f, fcntl.LOCK_EX)
+                try:
+                    content = "".join(self._pending).encode()
+                    # the incomplete last record of a process killed while writing is terminated,
+                    # so that it is not merged with the first record of this batch
+                    if capture_f.seek(0, os.SEEK_END) > 0:
+                        capture_f.seek(-1, os.SEEK_END)
+                        if capture_f.read(1) != b"\n":
+                            content = b"\n" + content
+                    capture_f.write(content)
+                    capture_f.flush()
+                    os.fsync(capture_f.fileno())
+                finally:
+                    fcntl.flock(capture_f, fcntl.LOCK_UN)
+            self._pending = []
+        self._last_flush = time.monotonic()
+
+
+def read_capture(path):
+    """Stream the (hash, annotation) records of a capture file."""
+    path = Path(path)
+    if not path.exists():
+        return
+    with open(path) as capture_f:
+        fcntl.flock(capture_f, fcntl.LOCK_SH)
+        try:
+            for line_number, line in enumerate(capture_f, 1):
+                if not line.endswith("\n"):
+                    # incomplete last record, of a process killed while writing
+                    break
+                try:
+                    record = json.loads(line)
+                    annotation_id_hash, annotation = record["hash"], record["annotation"]
+                except (ValueError, TypeError, KeyError) as e:
+                    # incomplete record of a process killed while writing, terminated by the next batch
+                    logging.warning(f"Skipping the corrupt record at line {line_number} of {path}: {e}")
+                    continue
+                yield annotation_id_hash, annotation
+        finally:
+            fcntl.flock(capture_f, fcntl.LOCK_UN)
+
+
+_capture_writer = None
+
+
+def run_path(renku_project_root, run_token):
+    """Directory of a renku run, holding its sitecustomize and its capture file."""
+    from aqsconverters.io import AQS_ANNOTATION_DIR
+
+    return Path(renku_project_root, AQS_ANNOTATION_DIR, RUNS_DIR, run_token)
+
+
+def capture_path(renku_project_root, run_token=None):
+    from aqsconverters.io import AQS_ANNOTATION_DIR, COMMON_DIR
+
+    if run_token:
+        return run_path(renku_project_root, run_token).joinpath(CAPTURE_FILE_NAME)
+    return Path(renku_project_root, AQS_ANNOTATION_DIR, COMMON_DIR, CAPTURE_FILE_NAME)
+
+
+def log_aqs_annotation(oda_annotation, hash, force=False):
+    """Drop-in replacement of aqsconverters.io.log_aqs_annotation, appending to the capture file of the run."""
+    global _capture_writer
+
+    if ENV_RENKU_HOME in os.environ:
+        renku_project_root = os.environ[ENV_RENKU_HOME]
+    elif force:
+        renku_project_root = ".renku"
+    else:
+        # we are not running as part of renku run
+        return
+
+    if _capture_writer is None:
+        _capture_writer = CaptureWriter(capture_path(renku_project_root, os.environ.get(RUN_TOKEN_ENV)))
+        atexit.register(_capture_writer.flush)
+
+    if isinstance(oda_annotation, str):
+        oda_annotation = json.loads(oda_annotation)
+    _capture_writer.write(hash, oda_annotation)
+
+
+def install():
+    """Route the annotations of the aqsconverters autolog hooks to the capture file."""
+    import aqsconverters.io
+
+    aqsconverters.io.log_aqs_annotation = log_aqs_annotation
+    try:
+        import aqsconverters.aq
+    except ImportError:
+        return
+    if hasattr(aqsconverters.aq, "log_aqs_annotation"):
+        aqsconverters.aq.log_aqs_annotation = log_aqs_annotation
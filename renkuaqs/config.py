@@ -14,3 +14,41 @@
 # limitations under the License.
 
 ENTITY_METADATA_AQS_DIR = '.aqs'
+
+# directory of the files generated for the interactive graph (graph.html, full_graph.ttl and the static assets),
+# excluded from git through .git/info/exclude rather than the committed .gitignore
+GRAPH_ARTIFACTS_DIR = 'renkuaqs-graph'
+
+# number of worker processes used by the graph server to build the graph, 0 builds within the request thread
+GRAPH_BUILD_WORKERS_ENV = 'RENKUAQS_GRAPH_BUILD_WORKERS'
+GRAPH_BUILD_WORKERS_DEFAULT = 2
+
+# number of recent graph snapshots kept by the graph server, to compute the deltas between graph versions
+GRAPH_SNAPSHOTS_ENV = 'RENKUAQS_GRAPH_SNAPSHOTS'
+GRAPH_SNAPSHOTS_DEFAULT = 4
+
+# cache of the data extracted from the project files, keyed by content (eg the nb2rdf output of a notebook checksum)
+CACHE_DIR_ENV = 'RENKUAQS_CACHE_DIR'
+CACHE_DIR_DEFAULT = '~/.cache/renkuaqs'
+
+# number of worker processes extracting the metadata from the input notebooks, default is the number of cpus
+INSPECT_WORKERS_ENV = 'RENKUAQS_INSPECT_WORKERS'
+
+# token of the current renku run, keying the directory where the annotations of the run are captured
+RUN_TOKEN_ENV = 'RENKUAQS_RUN_TOKEN'
+
+# SPARQL queries slower than this threshold are logged, along with their name and bindings,
+# and appended as JSON lines to the slow-query log file when given
+SLOW_QUERY_SECONDS_ENV = 'RENKUAQS_SLOW_QUERY_SECONDS'
+SLOW_QUERY_SECONDS_DEFAULT = 1.0
+SLOW_QUERY_LOG_ENV = 'RENKUAQS_SLOW_QUERY_LOG'
+
+# SPARQL results cache, keyed by the fingerprint of the graph (commit and annotations), the query and its bindings:
+# size in MB of the in-memory LRU (0 disables it), and the optional on-disk layer within the .renku/cache folder
+# of the project, whose least recently used results are evicted beyond its size in MB
+SPARQL_CACHE_MB_ENV = 'RENKUAQS_SPARQL_CACHE_MB'
+SPARQL_CACHE_MB_DEFAULT = 64
+SPARQL_DISK_CACHE_ENV = 'RENKUAQS_SPARQL_DISK_CACHE'
+SPARQL_DISK_CACHE_MB_ENV = 'RENKUAQS_SPARQL_DISK_CACHE_MB'
+SPARQL_DISK_CACHE_MB_DEFAULT = 256
+SPARQL_DISK_CACHE_DIR = '.renku/cache/renkuaqs-sparql'
@@ -0,0 +1,42 @@
+import os
+import hashlib
+import tempfile
+
+
+def content_hash(content: bytes):
+    return hashlib.sha256(content).hexdigest()
+
+
+def file_content_hash(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return content_hash(f.read())
+
+
+def write_file_atomically(path, content):
+    """Write a file through a temporary file renamed over it, readers never see a partially written file."""
+    if isinstance(content, str):
+        content = content.encode()
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    # dot-prefixed, so that it is not picked up by the glob patterns scanning the folders
+    tmp_fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(tmp_fd, "wb") as tmp_f:
+            tmp_f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_file_if_changed(path, content):
+    """Atomically write a file only if its content changed, return whether it was written."""
+    if isinstance(content, str):
+        content = content.encode()
+    if file_content_hash(path) == content_hash(content):
+        return False
+    write_file_atomically(path, content)
+    return True
@@ -0,0 +1,92 @@
+import os
+import logging
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
+
+import renkuaqs.metrics as metrics
+
+from renkuaqs.config import GRAPH_BUILD_WORKERS_ENV, GRAPH_BUILD_WORKERS_DEFAULT
+
+
+def _init_worker(paths):
+    from renku.domain_model.project_context import project_context
+
+    if paths is not None:
+        project_context.push_path(paths)
+
+
+def _run_recording_stages(fn, *args, **kwargs):
+    # the stage durations observed within the worker are sent back along with the result
+    with metrics.recorded_stages() as stages:
+        result = fn(*args, **kwargs)
+    return result, stages
+
+
+def build_graph_html_artifact(paths):
+    import renkuaqs.graph_utils as graph_utils
+
+    # the request threads already run the builds in parallel
+    graph_utils.inspect_oda_graph_inputs(None, paths=paths, workers=1)
+    graph_html_content, ttl_content = graph_utils.build_graph_html(None, paths=paths,
+                                                                   template_location="remote",
+                                                                   include_ttl_content_within_html=False)
+    return graph_html_content
+
+
+def build_graph_snapshot_artifact(graph_version, paths):
+    import renkuaqs.graph_utils as graph_utils
+    from renkuaqs.graph_snapshot import GraphSnapshot, skolemize_graph
+
+    # before the subsets are evaluated, so that the blank nodes are the same IRIs within the subsets
+    overall_graph = skolemize_graph(graph_utils._overall_graph(None, paths))
+    # the subsets are evaluated once per graph version, rather than by the browser at each page load
+    subset_graphs = graph_utils.nodes_subset_graphs(overall_graph,
+                                                    fingerprint=graph_utils.overall_graph_fingerprint(None, paths))
+    return GraphSnapshot.from_graph(overall_graph, graph_version, subset_graphs=subset_graphs)
+
+
+def build_reduced_snapshot_artifact(graph_snapshot, reductions):
+    # the snapshot is parsed again and reduced, it only depends on its triples and the reduction config
+    return graph_snapshot.reduce(reductions)
+
+
+class GraphBuildPool(object):
+    """Run the CPU-heavy graph builds in worker processes, so the server threads stay responsive.
+
+    Results come back pickled (html/ttl strings, graph snapshots); with max_workers=0
+    the builds are run within the calling thread.
+    """
+
+    def __init__(self, max_workers=None, paths=None):
+        if max_workers is None:
+            max_workers = int(os.environ.get(GRAPH_BUILD_WORKERS_ENV, GRAPH_BUILD_WORKERS_DEFAULT))
+        self.max_workers = max_workers
+        self.paths = paths
+        self._executor = None
+        if max_workers > 0:
+            # spawn rather than fork, the server is multi-threaded
+            self._executor = ProcessPoolExecutor(max_workers=max_workers,
+                                                 mp_context=multiprocessing.get_context("spawn"),
+                                                 initializer=_init_worker,
+                                                 initargs=(paths,))
+            logging.info(f"Graph builds will run in a pool of {max_workers} worker processes")
+
+    def run(self, fn, *args, **kwargs):
+        if self._executor is None:
+            if self.paths is None:
+                return fn(*args, **kwargs)
+            from renku.domain_model.project_context import project_context
+
+            # the project context is local to each thread, as it is to each worker process
+            with project_context.with_path(self.paths):
+                return fn(*args, **kwargs)
+        result, stages = self._executor.submit(_run_recording_stages, fn, *args, **kwargs).result()
+        for stage_name, duration in stages:
+            metrics.observe_stage(stage_name, duration)
+        return result
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,169 @@
+import re
+import sys
+import json
+import gzip
+import rdflib
+
+from contextlib import contextmanager
+from rdflib.plugins.serializers.nt import _nt_row
+
+import renkuaqs.metrics as metrics
+
+FORMATS = ("nt", "nquads", "turtle", "json-ld")
+COMPRESSIONS = ("none", "gzip", "zstd")
+
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".zst": "zstd"}
+
+# local names written as prefixed names within turtle, the others are written as full IRIs
+_TURTLE_LOCAL_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_\-]*$")
+
+
+def compression_from_filename(filename):
+    for suffix, compression in COMPRESSION_SUFFIXES.items():
+        if filename is not None and filename.endswith(suffix):
+            return compression
+    return "none"
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("the zstd compression requires the zstandard package, eg pip install renku-aqs[zstd]")
+    return zstandard
+
+
+@contextmanager
+def open_output(filename=None, compression="none"):
+    """Binary stream writing to filename, or to stdout when None or "-", compressed on the fly."""
+    to_stdout = filename is None or filename == "-"
+    output_f = sys.stdout.buffer if to_stdout else open(filename, "wb")
+    try:
+        if compression == "gzip":
+            with gzip.GzipFile(fileobj=output_f, mode="wb") as compressed_f:
+                yield compressed_f
+        elif compression == "zstd":
+            with _zstandard().ZstdCompressor().stream_writer(output_f, closefd=False) as compressed_f:
+                yield compressed_f
+        else:
+            yield output_f
+    finally:
+        if to_stdout:
+            output_f.flush()
+        else:
+            output_f.close()
+
+
+def write_ntriples(graph, stream):
+    n_triples = 0
+    for triple in graph:
+        stream.write(_nt_row(triple).encode())
+        n_triples += 1
+    return n_triples
+
+
+def write_nquads(named_graphs, stream):
+    """Write each graph of named_graphs, a dict of graph name to graph, as a named graph."""
+    n_triples = 0
+    for graph_name, graph in named_graphs.items():
+        graph_name = rdflib.URIRef(graph_name).n3()
+        for triple in graph:
+            stream.write(f"{_nt_row(triple)[:-3]} {graph_name} .\n".encode())
+            n_triples += 1
+    return n_triples
+
+
+class _TurtleTerms(object):
+    """Turtle form of the terms, the prefixed names of the IRIs are computed once per IRI."""
+
+    def __init__(self, namespace_manager, prefixes):
+        self.namespace_manager = namespace_manager
+        self.prefixes = prefixes
+        self._iris = {}
+
+    def __call__(self, term):
+        if not isinstance(term, rdflib.URIRef):
+            return term.n3()
+        iri = self._iris.get(term)
+        if iri is None:
+            iri = self._iris[term] = self._prefixed_name(term) or term.n3()
+        return iri
+
+    def _prefixed_name(self, term):
+        try:
+            prefix, namespace, local_name = self.namespace_manager.compute_qname(term, generate=False)
+        except (KeyError, ValueError):
+            return None
+        if prefix in self.prefixes and _TURTLE_LOCAL_NAME.match(local_name):
+            return f"{prefix}:{local_name}"
+        return None
+
+
+def write_turtle(graph, stream):
+    """Turtle grouping the triples by subject, written one subject at a time
+    rather than with the pretty-printing turtle serializer, which processes the whole graph first."""
+    prefixes = set()
+    for prefix, namespace in graph.namespaces():
+        if prefix:
+            prefixes.add(prefix)
+            stream.write(f"@prefix {prefix}: {rdflib.URIRef(namespace).n3()} .\n".encode())
+    stream.write(b"\n")
+    turtle_term = _TurtleTerms(graph.namespace_manager, prefixes)
+
+    n_triples = 0
+    for subject in graph.subjects(unique=True):
+        predicate_objects = [f"{turtle_term(predicate)} {turtle_term(obj)}"
+                             for predicate, obj in graph.predicate_objects(subject)]
+        stream.write((f"{turtle_term(subject)} " + " ;\n    ".join(predicate_objects) + " .\n\n").encode())
+        n_triples += len(predicate_objects)
+    return n_triples
+
+
+def _jsonld_id(node):
+    return node.n3() if isinstance(node, rdflib.BNode) else str(node)
+
+
+def _jsonld_value(obj):
+    if isinstance(obj, rdflib.Literal):
+        value = {"@value": str(obj)}
+        if obj.language:
+            value["@language"] = obj.language
+        elif obj.datatype:
+            value["@type"] = str(obj.datatype)
+        return value
+    return {"@id": _jsonld_id(obj)}
+
+
+def write_jsonld(graph, stream):
+    """Expanded JSON-LD, one node object per subject, written one subject at a time."""
+    stream.write(b"[")
+    n_triples = 0
+    for i_subject, subject in enumerate(graph.subjects(unique=True)):
+        node = {"@id": _jsonld_id(subject)}
+        for predicate, obj in graph.predicate_objects(subject):
+            if predicate == rdflib.RDF.type and not isinstance(obj, rdflib.Literal):
+                node.setdefault("@type", []).append(_jsonld_id(obj))
+            else:
+                node.setdefault(str(predicate), []).append(_jsonld_value(obj))
+            n_triples += 1
+        stream.write(((",\n" if i_subject > 0 else "\n") + json.dumps(node)).encode())
+    stream.write(b"\n]\n")
+    return n_triples
+
+
+def write_graph(graph, stream, format="nt"):
+    """Write the graph to a binary stream in one of FORMATS, without building the whole serialisation in memory.
+
+    For nquads, graph can be a dict of graph name to graph, eg the renku graph and the annotations.
+    Returns the number of triples written.
+    """
+    with metrics.stage("serialisation"):
+        if format == "nquads":
+            return write_nquads(graph if isinstance(graph, dict) else {graph.identifier: graph}, stream)
+        elif format == "nt":
+            return write_ntriples(graph, stream)
+        elif format == "turtle":
+            return write_turtle(graph, stream)
+        elif format == "json-ld":
+            return write_jsonld(graph, stream)
+        raise ValueError(f"unsupported format {format}, choose one of {', '.join(FORMATS)}")
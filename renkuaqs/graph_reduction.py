@@ -0,0 +1,72 @@
+import json
+import rdflib
+
+from importlib import resources
+
+import renkuaqs.metrics as metrics
+
+# properties labelling an absorbed node, otherwise the local name of its IRI is used
+LABEL_PREDICATES = (rdflib.URIRef("http://purl.org/dc/terms/title"), rdflib.RDFS.label)
+
+
+def reduction_config():
+    with resources.open_text("renkuaqs", 'graph_reduction_config.json') as graph_reduction_config_fn_f:
+        return json.load(graph_reduction_config_fn_f)
+
+
+def parse_reductions(reductions_str, config=None):
+    """Parse a comma separated list of reductions (eg Activity,AstrophysicalRegion) of graph_reduction_config.json."""
+    if config is None:
+        config = reduction_config()
+    reductions = tuple(sorted({r.strip() for r in reductions_str.split(",") if r.strip()}))
+    unknown_reductions = [r for r in reductions if r not in config]
+    if unknown_reductions:
+        raise ValueError(f"unknown reduction(s) {', '.join(unknown_reductions)}, "
+                         f"choose among {', '.join(config)}")
+    return reductions
+
+
+def _local_name(iri):
+    return str(iri).rsplit('#', 1)[-1].rsplit('/', 1)[-1]
+
+
+def _node_label(graph, node):
+    for label_predicate in LABEL_PREDICATES:
+        for label in graph.objects(node, label_predicate):
+            return str(label)
+    return _local_name(node)
+
+
+def reduce_graph(graph, reductions, config=None):
+    """Apply, in place, the reductions of graph_reduction_config.json as the graph viewer does.
+
+    The nodes reached from a node of a reduced type (eg Activity) through one of its predicates_to_absorb
+    (eg hasInputs) are absorbed within it: the edge is replaced by a literal with the label of the absorbed node,
+    whose own triples are removed when no other node refers to it.
+    """
+    if config is None:
+        config = reduction_config()
+    predicates_to_absorb = {reduction: set(config[reduction]['predicates_to_absorb'].split(","))
+                            for reduction in reductions}
+
+    with metrics.stage("reduction"):
+        absorbed_edges = set()
+        for node, node_type in graph.subject_objects(rdflib.RDF.type):
+            predicates = predicates_to_absorb.get(_local_name(node_type))
+            if not predicates:
+                continue
+            for predicate, child in graph.predicate_objects(node):
+                if not isinstance(child, rdflib.Literal) and _local_name(predicate) in predicates:
+                    absorbed_edges.add((node, predicate, child))
+
+        child_labels = {child: _node_label(graph, child) for node, predicate, child in absorbed_edges}
+
+        for node, predicate, child in absorbed_edges:
+            graph.remove((node, predicate, child))
+            graph.add((node, predicate, rdflib.Literal(child_labels[child])))
+
+        for child in child_labels:
+            if (None, None, child) not in graph:
+                graph.remove((child, None, None))
+
+    return graph
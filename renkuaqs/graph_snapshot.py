@@ -0,0 +1,313 @@
+import io
+import base64
+import hashlib
+import threading
+import rdflib
+
+import renkuaqs.metrics as metrics
+import renkuaqs.graph_export as graph_export
+import renkuaqs.graph_reduction as graph_reduction
+
+from collections import defaultdict, OrderedDict
+from rdflib.plugins.serializers.nt import _nt_row
+
+
+class GraphSnapshot(object):
+    """Immutable view of the overall graph for one graph version, with an adjacency index."""
+
+    def __init__(self, graph_version, graph_ttl_content, triples_nt, edges, node_types, node_literals,
+                 node_subsets=None):
+        self.graph_version = graph_version
+        self.graph_ttl_content = graph_ttl_content
+        # one N-Triples line per triple, used to compute the deltas between versions
+        self.triples_nt = triples_nt
+        # edges are kept as (subject, predicate, object) tuples of plain strings
+        self.edges = edges
+        self.node_types = node_types
+        self.node_literals = node_literals
+
+        self._adjacency = defaultdict(list)
+        for edge_id, (s, p, o) in enumerate(self.edges):
+            self._adjacency[s].append(edge_id)
+            if o != s:
+                self._adjacency[o].append(edge_id)
+
+        # subgraphs of the subsets of graph_nodes_subset_config.json, evaluated along with the snapshot,
+        # by subset name: the nodes (as in edges) and the triples (as N-Triples lines) of the subgraph
+        self.node_subsets = node_subsets or {}
+
+        self._node_index = None
+        self._subset_bitsets = None
+        self._triple_hashes = None
+        # reduced views of the snapshot (see reduce), keyed by the sorted reductions
+        self.reduced_snapshots = {}
+
+    @classmethod
+    def from_graph(cls, graph: rdflib.Graph, graph_version, graph_ttl_content=None, subset_graphs=None,
+                   node_subsets=None):
+        """Build the snapshot of a graph, subset_graphs are the subgraphs of graph_nodes_subset_config.json
+        evaluated over it (see graph_utils.nodes_subset_graphs).
+
+        The blank nodes of the graph are expected to be skolemized (see skolemize_graph),
+        otherwise their triples differ between the snapshots of the same graph."""
+        triples_nt = []
+        edges = []
+        node_types = defaultdict(list)
+        node_literals = defaultdict(lambda: defaultdict(list))
+
+        for s, p, o in graph:
+            triples_nt.append(_nt_line((s, p, o)))
+            if isinstance(o, rdflib.Literal):
+                node_literals[str(s)][str(p)].append(str(o))
+            elif p == rdflib.RDF.type:
+                node_types[str(s)].append(str(o))
+            else:
+                edges.append((str(s), str(p), str(o)))
+
+        if graph_ttl_content is None:
+            with metrics.stage("serialisation"):
+                graph_ttl_content = graph.serialize(format="n3")
+
+        if subset_graphs is not None:
+            node_subsets = {subset_name: {
+                'nodes': sorted({str(node) for triple in subset_graph for node in (triple[0], triple[2])
+                                 if not isinstance(node, rdflib.Literal)}),
+                'triples_nt': [_nt_line(triple) for triple in subset_graph]
+            } for subset_name, subset_graph in subset_graphs.items()}
+
+        return cls(graph_version,
+                   graph_ttl_content,
+                   triples_nt,
+                   edges,
+                   dict(node_types),
+                   {node: dict(literals) for node, literals in node_literals.items()},
+                   node_subsets=node_subsets)
+
+    def __len__(self):
+        # number of triples of the graph the snapshot was built from
+        return len(self.triples_nt)
+
+    @property
+    def triple_hashes(self):
+        if self._triple_hashes is None:
+            self._triple_hashes = {_triple_hash(triple_nt): triple_nt for triple_nt in self.triples_nt}
+        return self._triple_hashes
+
+    def delta(self, previous_snapshot):
+        """Triples added and removed since a previous snapshot, as N-Triples lines."""
+        current_hashes = self.triple_hashes
+        previous_hashes = previous_snapshot.triple_hashes
+        added = [current_hashes[h] for h in current_hashes.keys() - previous_hashes.keys()]
+        removed = [previous_hashes[h] for h in previous_hashes.keys() - current_hashes.keys()]
+        return sorted(added), sorted(removed)
+
+    @property
+    def node_index(self):
+        """All the nodes of the snapshot, sorted, the positions of the bits of the subset bitsets."""
+        if self._node_index is None:
+            self._node_index = sorted(set(self._adjacency) | set(self.node_types) | set(self.node_literals))
+        return self._node_index
+
+    def subset_bitsets(self):
+        """Membership of the nodes of node_index within each subset, as base64 encoded bitsets:
+        bit i (byte i // 8, least significant bit first) is set when the i-th node is within the subset."""
+        if self._subset_bitsets is None:
+            node_positions = {node: i_node for i_node, node in enumerate(self.node_index)}
+            subset_bitsets = {}
+            for subset_name, node_subset in self.node_subsets.items():
+                bitset = bytearray((len(node_positions) + 7) // 8)
+                for node in node_subset['nodes']:
+                    i_node = node_positions.get(node)
+                    if i_node is not None:
+                        bitset[i_node // 8] |= 1 << (i_node % 8)
+                subset_bitsets[subset_name] = base64.b64encode(bytes(bitset)).decode()
+            self._subset_bitsets = subset_bitsets
+        return self._subset_bitsets
+
+    def subsets(self):
+        """The subset bitsets in the format of the /subsets endpoint."""
+        subset_bitsets = self.subset_bitsets()
+        return {
+            'graph_version': self.graph_version,
+            'nodes': self.node_index,
+            'subsets': {subset_name: {'bitset': subset_bitsets[subset_name],
+                                      'n_triples': len(node_subset['triples_nt'])}
+                        for subset_name, node_subset in self.node_subsets.items()}
+        }
+
+    def reduce(self, reductions):
+        """Build the snapshot of the graph with the reductions of graph_reduction_config.json applied."""
+        graph = rdflib.Graph()
+        graph.parse(data="\n".join(self.triples_nt), format="nt")
+        for prefix, namespace in _ttl_prefixes(self.graph_ttl_content):
+            graph.bind(prefix, namespace)
+        graph_reduction.reduce_graph(graph, reductions)
+        stream = io.BytesIO()
+        graph_export.write_turtle(graph, stream)
+        # the subsets are not evaluated again, the absorbed nodes are no longer within the node index
+        return GraphSnapshot.from_graph(graph, self.graph_version,
+                                        graph_ttl_content=stream.getvalue().decode(),
+                                        node_subsets=self.node_subsets)
+
+    def __getstate__(self):
+        # the views and indexes derived from the snapshot are not sent to, or back from, the worker processes
+        state = self.__dict__.copy()
+        state.update(reduced_snapshots={}, _node_index=None, _subset_bitsets=None, _triple_hashes=None)
+        return state
+
+    def has_node(self, node):
+        return node in self._adjacency or node in self.node_types or node in self.node_literals
+
+    def node_info(self, node):
+        return {
+            'id': node,
+            'types': self.node_types.get(node, []),
+            'literals': self.node_literals.get(node, {})
+        }
+
+    def subgraph(self, node, depth=1, predicates=None):
+        """Return the k-hop neighbourhood of a node, in the compact nodes/edges format."""
+        if not self.has_node(node):
+            raise KeyError(node)
+
+        visited = {node}
+        frontier = [node]
+        edge_ids = set()
+        for _ in range(depth):
+            next_frontier = []
+            for frontier_node in frontier:
+                for edge_id in self._adjacency.get(frontier_node, []):
+                    s, p, o = self.edges[edge_id]
+                    if predicates and not _predicate_matches(p, predicates):
+                        continue
+                    edge_ids.add(edge_id)
+                    neighbour = o if s == frontier_node else s
+                    if neighbour not in visited:
+                        visited.add(neighbour)
+                        next_frontier.append(neighbour)
+            frontier = next_frontier
+            if not frontier:
+                break
+
+        return {
+            'graph_version': self.graph_version,
+            'nodes': [self.node_info(n) for n in sorted(visited)],
+            'edges': [{'from': self.edges[edge_id][0],
+                       'label': self.edges[edge_id][1],
+                       'to': self.edges[edge_id][2]} for edge_id in sorted(edge_ids)]
+        }
+
+
+# namespace of the IRIs replacing the blank nodes of the graph
+SKOLEM_NAMESPACE = "urn:renkuaqs:bnode:"
+
+
+def skolemize_graph(graph, max_rounds=8):
+    """Replace, in place, the blank nodes of the graph by IRIs derived from the triples around them.
+
+    The labels of the blank nodes differ each time a graph is parsed, the IRIs do not: the same graph gives
+    the same triples, and no spurious deltas between versions. The IRIs are refined from the neighbourhood
+    of each blank node until they no longer split further, blank nodes with indistinguishable
+    neighbourhoods are merged.
+    """
+    bnode_triples = defaultdict(list)
+    for triple in graph:
+        s, p, o = triple
+        if isinstance(s, rdflib.BNode):
+            bnode_triples[s].append(triple)
+        if isinstance(o, rdflib.BNode) and o != s:
+            bnode_triples[o].append(triple)
+    if not bnode_triples:
+        return graph
+
+    def term_label(term, labels):
+        return labels[term] if isinstance(term, rdflib.BNode) else term.n3()
+
+    labels = {bnode: "" for bnode in bnode_triples}
+    for i_round in range(max_rounds):
+        refined_labels = {}
+        for bnode, triples in bnode_triples.items():
+            label_hash = hashlib.blake2b(labels[bnode].encode(), digest_size=16)
+            for line in sorted(f"> {p.n3()} {term_label(o, labels)}" if s == bnode else
+                               f"< {p.n3()} {term_label(s, labels)}" for s, p, o in triples):
+                label_hash.update(line.encode() + b"\n")
+            refined_labels[bnode] = label_hash.hexdigest()
+        split = len(set(refined_labels.values())) > len(set(labels.values()))
+        labels = refined_labels
+        if i_round > 0 and not split:
+            break
+
+    skolem_iris = {bnode: rdflib.URIRef(SKOLEM_NAMESPACE + label) for bnode, label in labels.items()}
+    bnode_triples = {triple for triples in bnode_triples.values() for triple in triples}
+    for s, p, o in bnode_triples:
+        graph.remove((s, p, o))
+    for s, p, o in bnode_triples:
+        graph.add((skolem_iris.get(s, s), p, skolem_iris.get(o, o)))
+    return graph
+
+
+def _nt_line(triple):
+    # a single N-Triples line, the line breaks within the literals are escaped
+    return _nt_row(triple).rstrip("\n")
+
+
+def _ttl_prefixes(graph_ttl_content):
+    # the prefixes declared at the top of the turtle content
+    for line in graph_ttl_content.splitlines():
+        if line.startswith("@prefix "):
+            prefix, namespace = line[len("@prefix "):].rstrip(" .").split(": ", 1)
+            yield prefix, namespace.strip("<>")
+        elif line.strip():
+            break
+
+
+def _predicate_matches(predicate, predicates):
+    # predicates can be given either as full IRIs or as local names (eg hasInputs)
+    for p in predicates:
+        if predicate == p or predicate.endswith('#' + p) or predicate.endswith('/' + p):
+            return True
+    return False
+
+
+def _triple_hash(triple_nt):
+    # stable across processes, unlike the builtin hash
+    return hashlib.blake2b(triple_nt.encode(), digest_size=8).digest()
+
+
+# shortest prefix of a sha matching a graph version, as the default abbreviation of git
+MIN_GRAPH_VERSION_PREFIX = 7
+
+
+class GraphSnapshotStore(object):
+    """Bounded LRU of the recent graph snapshots, keyed by graph version."""
+
+    def __init__(self, max_snapshots):
+        self.max_snapshots = max_snapshots
+        self._snapshots = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, graph_version):
+        if not graph_version:
+            return None
+        with self._lock:
+            version = graph_version if graph_version in self._snapshots else None
+            if version is None and len(graph_version) >= MIN_GRAPH_VERSION_PREFIX:
+                # either the short or the full sha can be given, as long as it designates a single snapshot
+                matching_versions = [v for v in self._snapshots
+                                     if v.startswith(graph_version) or graph_version.startswith(v)]
+                if len(matching_versions) == 1:
+                    version = matching_versions[0]
+            if version is None:
+                return None
+            self._snapshots.move_to_end(version)
+            return self._snapshots[version]
+
+    def put(self, graph_snapshot):
+        with self._lock:
+            self._snapshots[graph_snapshot.graph_version] = graph_snapshot
+            self._snapshots.move_to_end(graph_snapshot.graph_version)
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+
+    def __len__(self):
+        return len(self._snapshots)
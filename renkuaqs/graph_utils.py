@@ -7,6 +7,11 @@ import yaml
 import json
 import hashlib
 import glob
+import time
+import shutil
+import tarfile
+import tempfile
+import functools
 import urllib.request
 
 from prettytable import PrettyTable
@@ -18,18 +23,25 @@ from astropy.coordinates import SkyCoord, Angle
 from IPython.display import display
 from pyvis.network import Network
 from importlib import resources
-from nb2workflow import ontology
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 from renku.domain_model.project_context import project_context
 from renku.command.graph import export_graph_command
 from renku.core.errors import RenkuException
-from renku.core.util.git import get_entity_from_revision
+from git import Repo
 
 import renkuaqs.javascript_graph_utils as javascript_graph_utils
+import renkuaqs.metrics as metrics
+import renkuaqs.static_assets as static_assets
+import renkuaqs.nb2rdf_cache as nb2rdf_cache
+import renkuaqs.file_utils as file_utils
+import renkuaqs.sparql as sparql
+import renkuaqs.sparql_cache as sparql_cache
+import renkuaqs.graph_export as graph_export
+import renkuaqs.graph_reduction as graph_reduction
 
-from renkuaqs.config import ENTITY_METADATA_AQS_DIR
-from renkuaqs.plugin import AQS
+from renkuaqs.config import ENTITY_METADATA_AQS_DIR, INSPECT_WORKERS_ENV, GRAPH_ARTIFACTS_DIR
 
 # TODO improve this
 __this_dir__ = os.path.join(os.path.abspath(os.path.dirname(__file__)))
@@ -38,65 +50,199 @@ __this_dir__ = os.path.join(os.path.abspath(os.path.dirname(__file__)))
 graph_configuration = yaml.load(open(os.path.join(__this_dir__, "graph_config.yaml")), Loader=yaml.SafeLoader)
 
 
-def _aqs_graph(revision=None, paths=None):
+def _aqs_graph(revision=None, paths=None, entity_checksums=None):
+    """Load the annotations of the .aqs folder.
+
+    When entity_checksums is given, only the <entity>/<checksum> folders of those checksums are loaded,
+    otherwise the full history of the annotations is.
+    """
     G = rdflib.Graph()
-    if os.path.exists(ENTITY_METADATA_AQS_DIR):
-        annotation_list = []
-        entity_folder_list = glob.glob(f"{ENTITY_METADATA_AQS_DIR}/*")
-        for entity_folder in entity_folder_list:
-            print("Scanning entity folder: ", entity_folder)
-            revision_entity_folder_list = glob.glob(f"{entity_folder}/*")
-            for revision_entity_folder in revision_entity_folder_list:
-                print("Scanning entity folder checksum: ", revision_entity_folder)
-                annotation_object_list = glob.glob(f"{revision_entity_folder}/*.jsonld")
-                for annotation_object_file in annotation_object_list:
-                    with open(annotation_object_file) as annotation_object_file_fn:
-                        annotation_object = json.load(annotation_object_file_fn)
-                    annotation_list.append(annotation_object)
-                    G.parse(data=json.dumps(annotation_object), format="json-ld")
+    with metrics.stage("aqs_load"):
+        for revision_entity_folder in _aqs_checksum_folders():
+            if entity_checksums is not None and os.path.basename(revision_entity_folder) not in entity_checksums:
+                continue
+            print("Scanning entity folder checksum: ", revision_entity_folder)
+            for annotation_object_file in sorted(glob.glob(f"{revision_entity_folder}/*.jsonld")):
+                with open(annotation_object_file) as annotation_object_file_fn:
+                    G.parse(data=annotation_object_file_fn.read(), format="json-ld")
 
     return G
 
 
+def _is_checksum(name):
+    # the checksums of renku are git blob hashes (sha1), or sha256
+    return len(name) in (40, 64) and all(c in "0123456789abcdef" for c in name)
+
+
+def _aqs_checksum_folders(aqs_dir=ENTITY_METADATA_AQS_DIR):
+    """The .aqs/<entity>/<checksum> folders, the entity being the path of the notebook without its extension,
+    eg .aqs/notebooks/analysis/<checksum> for notebooks/analysis.ipynb.
+
+    A checksum folder is a folder holding annotations, or an empty folder named after a checksum
+    (a notebook without annotations), the folders being populated aside (dot-prefixed) are skipped.
+    """
+    for root, dir_names, file_names in os.walk(aqs_dir):
+        dir_names[:] = sorted(dir_name for dir_name in dir_names if not dir_name.startswith("."))
+        if root == aqs_dir:
+            continue
+        if any(file_name.endswith(".jsonld") for file_name in file_names) or \
+                (not dir_names and not file_names and _is_checksum(os.path.basename(root))):
+            # the annotations of a notebook are not nested within the checksum folder of another one
+            dir_names[:] = []
+            yield root
+
+
+def _folder_size(folder):
+    return sum(os.path.getsize(os.path.join(root, file_name))
+               for root, dir_names, file_names in os.walk(folder) for file_name in file_names)
+
+
+def gc_aqs_annotations(paths, scope="all-revisions", delete=False, pack=None):
+    """Find the .aqs/<entity>/<checksum> folders not referenced any longer, and optionally delete or pack them.
+
+    With scope "all-revisions" the folders are kept if their checksum is referenced anywhere within the renku graph
+    (which covers all the revisions), with scope "head" only if it is the checksum of a file at HEAD.
+    """
+    if paths is None:
+        paths = project_context.path
+    aqs_dir = os.path.join(paths, ENTITY_METADATA_AQS_DIR)
+
+    if scope == "head":
+        referenced_checksums = set(_revision_checksums(str(paths), Repo(paths).head.commit.hexsha).values())
+    else:
+        referenced_checksums = _graph_entity_checksums(_renku_graph(None, paths))
+
+    orphaned_folders = [(folder, _folder_size(folder)) for folder in _aqs_checksum_folders(aqs_dir)
+                        if os.path.basename(folder) not in referenced_checksums]
+
+    output = PrettyTable()
+    output.field_names = ["Orphaned annotation folder", "Size (bytes)"]
+    output.align["Orphaned annotation folder"] = "l"
+    output.align["Size (bytes)"] = "r"
+    for folder, size in orphaned_folders:
+        output.add_row([folder, size])
+    print(output, "\n")
+
+    reclaimable_size = sum(size for folder, size in orphaned_folders)
+    print(f"{len(orphaned_folders)} orphaned annotation folders, {reclaimable_size} bytes reclaimable")
+
+    if pack is not None and orphaned_folders:
+        with tarfile.open(pack, "w:gz") as archive:
+            for folder, size in orphaned_folders:
+                archive.add(folder, arcname=os.path.relpath(folder, paths))
+        print(f"orphaned annotation folders packed into {pack}")
+
+    if (delete or pack is not None) and orphaned_folders:
+        for folder, size in orphaned_folders:
+            shutil.rmtree(folder)
+            # the entity folders left empty, up to the .aqs folder
+            entity_folder = os.path.dirname(folder)
+            while os.path.abspath(entity_folder) != os.path.abspath(aqs_dir) and not os.listdir(entity_folder):
+                os.rmdir(entity_folder)
+                entity_folder = os.path.dirname(entity_folder)
+        print(f"{len(orphaned_folders)} orphaned annotation folders removed")
+
+    return orphaned_folders
+
+
+def _graph_entity_checksums(graph):
+    # checksums of the entities the renku graph refers to
+    return {str(checksum) for checksum in
+            graph.objects(None, rdflib.URIRef('https://swissdatasciencecenter.github.io/renku-ontology#checksum'))}
+
+
 def _renku_graph(revision=None, paths=None):
     # FIXME: use (revision) filter
 
-    cmd_result = export_graph_command().working_directory(paths).build().execute()
+    with metrics.stage("renku_export"):
+        cmd_result = export_graph_command().working_directory(paths).build().execute()
 
-    if cmd_result.status == cmd_result.FAILURE:
-        raise RenkuException("fail to export the renku graph")
-    graph = cmd_result.output.as_rdflib_graph()
+        if cmd_result.status == cmd_result.FAILURE:
+            raise RenkuException("fail to export the renku graph")
+        graph = cmd_result.output.as_rdflib_graph()
 
     return graph
 
 
 def write_graph_files(graph_html_content, ttl_content):
-    html_fn = 'graph.html'
-    ttl_fn = 'full_graph.ttl'
+    os.makedirs(GRAPH_ARTIFACTS_DIR, exist_ok=True)
+    javascript_graph_utils.git_exclude_file(GRAPH_ARTIFACTS_DIR)
+
+    html_fn = os.path.join(GRAPH_ARTIFACTS_DIR, 'graph.html')
+    ttl_fn = os.path.join(GRAPH_ARTIFACTS_DIR, 'full_graph.ttl')
 
     with open(ttl_fn, 'w') as gfn:
         gfn.write(ttl_content)
 
-    javascript_graph_utils.gitignore_file(ttl_fn)
-
     javascript_graph_utils.write_modified_html_content(graph_html_content, html_fn)
-    javascript_graph_utils.gitignore_file(html_fn)
+
+    # the html refers to the vendored assets relatively
+    static_assets.copy_assets(GRAPH_ARTIFACTS_DIR)
 
     return html_fn, ttl_fn
 
 
-def extract_graph(revision, paths):
+def extract_graph(revision, paths, full_history=False):
+    overall_graph = _overall_graph(revision, paths, full_history=full_history)
+
+    with metrics.stage("serialisation"):
+        graph_str = overall_graph.serialize(format="n3")
+
+    return graph_str
+
+
+# names of the graphs merged into the overall graph, as written by export_graph with nquads
+SOURCE_GRAPH_NAMES = {
+    "aqs": "urn:renkuaqs:graph:aqs",
+    "renku": "urn:renkuaqs:graph:renku",
+    "ontologies": "urn:renkuaqs:graph:ontologies"
+}
+
+
+def export_graph(revision, paths, filename=None, format="nt", compression="none", full_history=False):
+    """Stream the overall graph to filename (stdout when None) in one of graph_export.FORMATS,
+    optionally compressed, return the number of triples written.
+
+    With nquads the renku graph, the annotations and the ontologies are written as separate named graphs,
+    and are not merged in memory.
+    """
+    if format == "nquads":
+        graph = _source_graphs(revision, paths, full_history=full_history)
+    else:
+        graph = _overall_graph(revision, paths, full_history=full_history)
+
+    with graph_export.open_output(filename, compression=compression) as output_f:
+        return graph_export.write_graph(graph, output_f, format=format)
+
+
+def _source_graphs(revision, paths, full_history=False):
     if paths is None:
         paths = project_context.path
 
     renku_graph = _renku_graph(revision, paths)
 
-    aqs_graph = _aqs_graph(revision, paths)
+    # skip the annotations of the entity versions no longer referenced within the renku graph
+    entity_checksums = None if full_history else _graph_entity_checksums(renku_graph)
+    aqs_graph = _aqs_graph(revision, paths, entity_checksums=entity_checksums)
 
     ontologies_graph = _nodes_subset_ontologies_graph()
 
+    return {
+        SOURCE_GRAPH_NAMES["aqs"]: aqs_graph,
+        SOURCE_GRAPH_NAMES["renku"]: renku_graph,
+        SOURCE_GRAPH_NAMES["ontologies"]: ontologies_graph
+    }
+
+
+def _overall_graph(revision, paths, full_history=False):
+    if paths is None:
+        paths = project_context.path
+
+    aqs_graph, renku_graph, ontologies_graph = _source_graphs(revision, paths, full_history=full_history).values()
+
     # not the recommended approach but works in our case https://rdflib.readthedocs.io/en/stable/merging.html
-    overall_graph = aqs_graph + renku_graph + ontologies_graph
+    with metrics.stage("merge"):
+        overall_graph = aqs_graph + renku_graph + ontologies_graph
 
     overall_graph.bind("aqs", "http://www.w3.org/ns/aqs#")
     overall_graph.bind("oa", "http://www.w3.org/ns/oa#")
@@ -105,9 +251,7 @@ def extract_graph(revision, paths):
     overall_graph.bind("odas", "https://odahub.io/ontology#")
     overall_graph.bind("local-renku", f"file://{paths}/")
 
-    graph_str = overall_graph.serialize(format="n3")
-
-    return graph_str
+    return overall_graph
 
 
 def _nodes_subset_ontologies_graph():
@@ -116,31 +260,75 @@ def _nodes_subset_ontologies_graph():
     with resources.open_text("renkuaqs", graph_nodes_subset_config_fn) as graph_nodes_subset_config_fn_f:
         graph_nodes_subset_config_obj = json.load(graph_nodes_subset_config_fn_f)
 
-    for subset_obj_name, subset_obj_dict in graph_nodes_subset_config_obj.items():
-        if 'ontology_url' in subset_obj_dict:
-            data = urllib.request.urlopen(subset_obj_dict['ontology_url'])
-            G.parse(data)
-        elif 'ontology_path' in subset_obj_dict:
-            if os.path.exists(subset_obj_dict['ontology_path']):
-                with open(subset_obj_dict['ontology_path']) as oo_fn:
-                    G.parse(oo_fn)
-            else:
-                print(f"\033[31m{subset_obj_dict['ontology_path']} not found\033[0m")
+    with metrics.stage("ontology_load"):
+        for subset_obj_name, subset_obj_dict in graph_nodes_subset_config_obj.items():
+            if 'ontology_url' in subset_obj_dict:
+                data = urllib.request.urlopen(subset_obj_dict['ontology_url'])
+                G.parse(data)
+            elif 'ontology_path' in subset_obj_dict:
+                if os.path.exists(subset_obj_dict['ontology_path']):
+                    with open(subset_obj_dict['ontology_path']) as oo_fn:
+                        G.parse(oo_fn)
+                else:
+                    print(f"\033[31m{subset_obj_dict['ontology_path']} not found\033[0m")
 
     return G
 
 
+def nodes_subset_query(subset_obj_dict):
+    # as composed by the graph viewer from a subset of graph_nodes_subset_config.json
+    return f"""CONSTRUCT {{
+                {subset_obj_dict['query_construct']}
+            }}
+            WHERE {{
+                {subset_obj_dict['query_where']}
+            }}"""
+
+
+def overall_graph_fingerprint(revision, paths, full_history=False):
+    """Fingerprint of the graph built by _overall_graph, keying the results cache of the queries run over it."""
+    if paths is None:
+        paths = project_context.path
+    return sparql_cache.graph_fingerprint(paths, revision, "overall", full_history)
+
+
+def nodes_subset_graphs(graph, fingerprint=None):
+    """Evaluate the queries of the subsets of graph_nodes_subset_config.json over a graph."""
+    with resources.open_text("renkuaqs", 'graph_nodes_subset_config.json') as graph_nodes_subset_config_fn_f:
+        graph_nodes_subset_config_obj = json.load(graph_nodes_subset_config_fn_f)
+
+    subset_graphs = {}
+    for subset_obj_name, subset_obj_dict in graph_nodes_subset_config_obj.items():
+        r = sparql.query(graph, nodes_subset_query(subset_obj_dict), f"nodes_subset_{subset_obj_name}",
+                         fingerprint=fingerprint)
+        subset_graphs[subset_obj_name] = r.graph
+    return subset_graphs
+
+
 def build_graph_html(revision, paths,
                      include_title=True,
                      template_location="local",
-                     include_ttl_content_within_html=True):
+                     include_ttl_content_within_html=True,
+                     full_history=False):
+
+    graph_str = extract_graph(revision, paths, full_history=full_history)
+
+    with metrics.stage("html_build"):
+        return _build_graph_html_content(graph_str,
+                                         include_title=include_title,
+                                         template_location=template_location,
+                                         include_ttl_content_within_html=include_ttl_content_within_html)
+
+
+def _build_graph_html_content(graph_str,
+                              include_title=True,
+                              template_location="local",
+                              include_ttl_content_within_html=True):
 
     default_graph_graphical_config_fn = 'graph_graphical_config.json'
     graph_nodes_subset_config_fn = 'graph_nodes_subset_config.json'
     graph_reduction_config_fn = 'graph_reduction_config.json'
 
-    graph_str = extract_graph(revision, paths)
-
     full_graph_ttl_str = graph_str.replace("\\\"", '\\\\"')
 
     nodes_graph_config_obj = {}
@@ -210,7 +398,8 @@ def build_graph_html(revision, paths,
     return net.html, graph_str
 
 
-def inspect_oda_graph_inputs(revision, paths, input_notebook: str = None):
+def inspect_oda_graph_inputs(revision, paths, input_notebook: str = None, workers: int = None,
+                             compact_annotations: bool = False):
     if paths is None:
         paths = project_context.path
 
@@ -240,15 +429,17 @@ def inspect_oda_graph_inputs(revision, paths, input_notebook: str = None):
                {query_where}
             """
 
-    r = graph.query(query)
-
-    G = rdflib.Graph()
+    r = sparql.query(graph, query, "inspect_inputs", parameters={"input_notebook": input_notebook})
 
     output = PrettyTable()
     output.field_names = ["Entity ID", "Entity checksum", "Entity input location"]
     output.align["Entity ID"] = "l"
     output.align["Entity checksum"] = "l"
     output.align["Entity input location"] = "l"
+    repository = project_context.repository
+    # checksums of all the files at HEAD, resolved with a single tree walk
+    head_checksums = _revision_checksums(str(repository.path), repository.head.commit.hexsha)
+    input_notebooks = []
     for row in r:
         entity_path = row.entityInputLocation
         entity_checksum = row.entityInputChecksum
@@ -262,50 +453,162 @@ def inspect_oda_graph_inputs(revision, paths, input_notebook: str = None):
         if entity_file_extension == '.ipynb':
             print(f"\033[31mExtracting metadata from the input notebook: {entity_path}, id: {entity_id}\033[0m")
             # get checksum from the path
-            repository = project_context.repository
-            revision = repository.head.commit.hexsha
-            entity_obj = get_entity_from_revision(repository=repository, path=entity_path, revision=revision, bypass_cache=True)
-            print(f"\033[31mEntity object extracted from entity_path: {entity_obj.path}, checksum: {entity_obj.checksum}\033[0m")
+            head_checksum = head_checksums.get(str(entity_path))
+            print(f"\033[31mChecksum of {entity_path} at HEAD: {head_checksum}\033[0m")
             print(f"\033[31mEntity checksum from the graph: {entity_checksum}\033[0m")
-            if str(entity_obj.checksum) == str(entity_checksum):
+            if head_checksum == str(entity_checksum):
                 # file present on disk based on the checksum equality
-                rdf_nb = ontology.nb2rdf(entity_path)
-                aqs_obj = AQS(entity_path)
-                G.parse(data=rdf_nb)
-                rdf_jsonld_str = G.serialize(format="json-ld")
-                rdf_jsonld = json.loads(rdf_jsonld_str)
-
-                print(f"\033[32mlog_aqs_annotation\033[0m")
-
-                annotation_folder_path = Path(
-                    os.path.join(aqs_obj.aqs_annotation_path, entity_file_name, entity_checksum))
-                if annotation_folder_path.exists():
-                    # directory gets cleaned-up in order to avoid to generate duplicate jsonld files
-                    # that can occur in case of new commits where input notebook is not affected
-                    jsonld_files = glob.glob(str(annotation_folder_path.joinpath("*.jsonld")))
-                    for j_f in jsonld_files:
-                        os.remove(j_f)
-                else:
-                    annotation_folder_path.mkdir(parents=True)
+                if (str(entity_path), str(entity_checksum)) not in input_notebooks:
+                    input_notebooks.append((str(entity_path), str(entity_checksum)))
+
+    # sorted, so that the annotations are always written in the same order
+    input_notebooks.sort()
+    with metrics.stage("inspect_extraction"):
+        extracted_notebooks = _extract_input_notebooks(input_notebooks, workers=workers)
+
+    for (entity_path, entity_checksum), (rdf_jsonld, extraction_time) in zip(input_notebooks, extracted_notebooks):
+        entity_file_name, entity_file_extension = os.path.splitext(entity_path)
 
-                for nb2annotation in rdf_jsonld:
-                    nb2annotation["http://odahub.io/ontology#entity_checksum"] = entity_checksum
-                    print(f"found jsonLD annotation:\n", json.dumps(nb2annotation, sort_keys=True, indent=4))
-                    nb2annotation_id_hash = hashlib.sha256(nb2annotation["@id"].encode()).hexdigest()[:8]
+        print(f"\033[32mlog_aqs_annotation\033[0m")
 
-                    jsonld_path = os.path.join(annotation_folder_path, nb2annotation_id_hash + ".jsonld")
-                    with open(jsonld_path, mode="w") as f:
-                        print("writing", jsonld_path)
-                        f.write(json.dumps(nb2annotation, sort_keys=True, indent=4))
+        annotation_folder_path = Path(
+            os.path.join(ENTITY_METADATA_AQS_DIR, entity_file_name, entity_checksum))
+
+        for nb2annotation in rdf_jsonld:
+            nb2annotation["http://odahub.io/ontology#entity_checksum"] = entity_checksum
+
+        n_written, n_unchanged, n_removed = write_annotations(annotation_folder_path, rdf_jsonld,
+                                                              compact=compact_annotations)
+        print(f"annotations in {annotation_folder_path}: {n_written} written, {n_unchanged} unchanged, "
+              f"{n_removed} removed")
 
     print(output, "\n")
 
 
-def build_graph_image(revision, paths, filename, no_oda_info, input_notebook):
+def serialize_annotation(annotation, compact=False):
+    if compact:
+        return json.dumps(annotation, sort_keys=True, separators=(",", ":"))
+    return json.dumps(annotation, sort_keys=True, indent=4)
 
-    if paths is None:
-        paths = project_context.path
 
+def write_annotations(annotation_folder_path, annotations, compact=False):
+    """Write the jsonld annotations of an entity folder, touching only the files whose content changed.
+
+    Every file is replaced atomically, and a new folder is populated aside and then renamed into place,
+    so that a concurrent reader never sees a partially written folder.
+    """
+    annotation_folder_path = Path(annotation_folder_path)
+    annotation_files = {}
+    for annotation in annotations:
+        annotation_id_hash = hashlib.sha256(annotation["@id"].encode()).hexdigest()[:8]
+        annotation_files[annotation_id_hash + ".jsonld"] = serialize_annotation(annotation, compact=compact)
+
+    if not annotation_folder_path.exists():
+        annotation_folder_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_folder_path = Path(tempfile.mkdtemp(dir=annotation_folder_path.parent,
+                                                prefix=f".{annotation_folder_path.name}."))
+        for file_name, content in annotation_files.items():
+            tmp_folder_path.joinpath(file_name).write_text(content)
+        try:
+            os.rename(tmp_folder_path, annotation_folder_path)
+        except OSError:
+            # created in the meantime by a concurrent writer, fall back to the per-file update
+            shutil.rmtree(tmp_folder_path)
+        else:
+            return len(annotation_files), 0, 0
+
+    n_written = 0
+    n_unchanged = 0
+    n_removed = 0
+    for file_name, content in annotation_files.items():
+        if file_utils.write_file_if_changed(annotation_folder_path.joinpath(file_name), content):
+            n_written += 1
+        else:
+            n_unchanged += 1
+    # stale files would otherwise generate duplicate annotations
+    for jsonld_file in annotation_folder_path.glob("*.jsonld"):
+        if jsonld_file.name not in annotation_files:
+            jsonld_file.unlink()
+            n_removed += 1
+
+    return n_written, n_unchanged, n_removed
+
+
+@functools.lru_cache(maxsize=8)
+def _revision_checksums(repository_path, revision):
+    """Map each file path to its checksum (git blob hash) at the given commit, listing the tree once per commit."""
+    ls_tree_output = Repo(repository_path).git.ls_tree("-r", "-z", "--full-tree", revision)
+    checksums = {}
+    for ls_tree_entry in ls_tree_output.split("\0"):
+        if not ls_tree_entry:
+            continue
+        object_info, object_path = ls_tree_entry.split("\t", 1)
+        object_mode, object_type, object_hash = object_info.split()
+        if object_type == "blob":
+            checksums[object_path] = object_hash
+    return checksums
+
+
+def _inspect_workers(workers, n_notebooks):
+    if workers is None:
+        workers = int(os.environ.get(INSPECT_WORKERS_ENV, os.cpu_count() or 1))
+    return max(1, min(workers, n_notebooks))
+
+
+def _extract_input_notebook(entity_path, entity_checksum):
+    start = time.perf_counter()
+    rdf_jsonld = nb2rdf_cache.nb2rdf_jsonld(entity_path, checksum=entity_checksum)
+    return rdf_jsonld, time.perf_counter() - start
+
+
+def _extract_input_notebooks(input_notebooks, workers=None):
+    """Run the extraction of the input notebooks, in a process pool for the notebooks missing from the nb2rdf cache
+    when more than one worker is used.
+
+    The progress is reported as each extraction completes, the results are returned in the order of input_notebooks.
+    """
+    extraction_start = time.perf_counter()
+    extracted_notebooks = [None] * len(input_notebooks)
+    n_extracted = 0
+
+    def extracted(i_notebook, extracted_notebook):
+        nonlocal n_extracted
+        extracted_notebooks[i_notebook] = extracted_notebook
+        n_extracted += 1
+        print(f"\033[32m[{n_extracted}/{len(input_notebooks)}] metadata extracted from the input notebook "
+              f"{input_notebooks[i_notebook][0]} in {extracted_notebook[1]:.2f}s\033[0m")
+
+    # the cached notebooks are read within this process, the pool is only started for the others
+    missed_notebooks = []
+    for i_notebook, (entity_path, entity_checksum) in enumerate(input_notebooks):
+        if nb2rdf_cache.is_cached(entity_path, entity_checksum):
+            extracted(i_notebook, _extract_input_notebook(entity_path, entity_checksum))
+        else:
+            missed_notebooks.append(i_notebook)
+
+    workers = _inspect_workers(workers, len(missed_notebooks)) if missed_notebooks else 0
+    if workers == 1:
+        for i_notebook in missed_notebooks:
+            extracted(i_notebook, _extract_input_notebook(*input_notebooks[i_notebook]))
+    elif workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_extract_input_notebook, *input_notebooks[i_notebook]): i_notebook
+                       for i_notebook in missed_notebooks}
+            for future in as_completed(futures):
+                extracted(futures[future], future.result())
+
+    if input_notebooks:
+        extraction_times = [extraction_time for rdf_jsonld, extraction_time in extracted_notebooks]
+        print(f"Metadata extracted from {len(input_notebooks)} input notebooks "
+              f"({len(input_notebooks) - len(missed_notebooks)} cached) "
+              f"in {time.perf_counter() - extraction_start:.2f}s "
+              f"(slowest {max(extraction_times):.2f}s, total {sum(extraction_times):.2f}s), "
+              f"using {max(workers, 1)} worker(s)\n")
+
+    return extracted_notebooks
+
+
+def _image_renku_graph(revision, paths):
     graph = _renku_graph(revision, paths)
 
     graph.bind("aqs", "http://www.w3.org/ns/aqs#")
@@ -315,6 +618,18 @@ def build_graph_image(revision, paths, filename, no_oda_info, input_notebook):
     graph.bind("odas", "https://odahub.io/ontology#")
     graph.bind("local-renku", f"file://{paths}/")
 
+    return graph
+
+
+def build_graph_image(revision, paths, filename, no_oda_info, input_notebook, reductions=None):
+
+    if paths is None:
+        paths = project_context.path
+
+    # the renku graph is exported only when the result of the query is not cached
+    graph = sparql.LazyGraph(_image_renku_graph, revision, paths)
+    fingerprint = sparql_cache.graph_fingerprint(paths, revision, "renku")
+
     renku_path = paths
 
     query_where = build_query_where(input_notebook=input_notebook, no_oda_info=no_oda_info)
@@ -324,48 +639,59 @@ def build_graph_image(revision, paths, filename, no_oda_info, input_notebook):
                {query_where}
                """
 
-    r = graph.query(query)
+    r = sparql.query(graph, query, "graph_image",
+                     parameters={"input_notebook": input_notebook, "no_oda_info": no_oda_info},
+                     fingerprint=fingerprint)
 
-    G = rdflib.Graph()
-    G.parse(data=r.serialize(format="n3").decode(), format="n3")
+    with metrics.stage("construct_copy"):
+        G = rdflib.Graph()
+        G.parse(data=r.serialize(format="n3").decode(), format="n3")
     G.bind("oda", "http://odahub.io/ontology#")
     G.bind("odas", "https://odahub.io/ontology#")  # the same
     G.bind("local-renku", f"file://{renku_path}/")
 
-    extract_activity_start_time(G)
-
-    if not no_oda_info:
-        # process oda-related information (eg do the inferring)
-        process_oda_info(G)
-
     action_node_dict = {}
     type_label_values_dict = {}
     args_default_value_dict = {}
     out_default_value_dict = {}
 
-    analyze_inputs(G)
-    analyze_arguments(G, action_node_dict, args_default_value_dict)
-    analyze_outputs(G, out_default_value_dict)
-    analyze_types(G, type_label_values_dict)
+    with metrics.stage("graph_analysis"):
+        extract_activity_start_time(G)
+
+        if not no_oda_info:
+            # process oda-related information (eg do the inferring)
+            process_oda_info(G)
+
+        analyze_inputs(G)
+        analyze_arguments(G, action_node_dict, args_default_value_dict)
+        analyze_outputs(G, out_default_value_dict)
+        analyze_types(G, type_label_values_dict)
+
+        if reductions:
+            # before the types and titles are cleaned
+            graph_reduction.reduce_graph(G, reductions)
 
-    clean_graph(G)
+        clean_graph(G)
 
-    stream = io.StringIO()
-    rdf2dot.rdf2dot(G, stream, opts={display})
-    pydot_graph = pydotplus.graph_from_dot_data(stream.getvalue())
+    with metrics.stage("rdf2dot"):
+        stream = io.StringIO()
+        rdf2dot.rdf2dot(G, stream, opts={display})
+        pydot_graph = pydotplus.graph_from_dot_data(stream.getvalue())
 
-    for node in pydot_graph.get_nodes():
-        customize_node(node,
-                       graph_configuration,
-                       type_label_values_dict=type_label_values_dict
-                       )
+    with metrics.stage("customize_node"):
+        for node in pydot_graph.get_nodes():
+            customize_node(node,
+                           graph_configuration,
+                           type_label_values_dict=type_label_values_dict
+                           )
 
-    # list of edges and simple color change
-    for edge in pydot_graph.get_edge_list():
-        customize_edge(edge)
+        # list of edges and simple color change
+        for edge in pydot_graph.get_edge_list():
+            customize_edge(edge)
 
     # final output write over the png image
-    pydot_graph.write_png(filename)
+    with metrics.stage("graphviz"):
+        pydot_graph.write_png(filename)
 
     return filename
 
@@ -598,8 +924,6 @@ def build_query_where(input_notebook: str = None, no_oda_info=False):
 
                     OPTIONAL {{ ?run <http://purl.org/dc/terms/title> ?run_title . }}
 
-                    ?run ?p ?o .
-
                     FILTER (!CONTAINS(str(?a_object), " ")) .
                 }
                 UNION
@@ -625,8 +949,6 @@ def build_query_where(input_notebook: str = None, no_oda_info=False):
                         <http://purl.org/dc/terms/title> ?a_radius_name .
 
                     OPTIONAL {{ ?run <http://purl.org/dc/terms/title> ?run_title . }}
-
-                    ?run ?p ?o .
                 }
                 UNION
                 {
@@ -664,8 +986,6 @@ def build_query_where(input_notebook: str = None, no_oda_info=False):
                     }}
 
                     OPTIONAL {{ ?run <http://purl.org/dc/terms/title> ?run_title . }}
-
-                    ?run ?p ?o .
                 }
             }
                 """
@@ -751,6 +1071,143 @@ def build_query_construct(no_oda_info=False):
     return query_construct
 
 
+# the runs requesting an astro object, an astro region or an astro image, as listed by params
+_PARAMS_RUN_PATTERNS = {
+    "object": """
+        ?run <http://odahub.io/ontology#isUsing> ?aq_module ;
+             <http://odahub.io/ontology#isRequestingAstroObject> ?a_object ;
+             ^oa:hasBody/oa:hasTarget ?runId .
+
+        OPTIONAL { ?run <http://purl.org/dc/terms/title> ?run_title . }
+
+        ?a_object <http://purl.org/dc/terms/title> ?a_object_name .
+
+        ?aq_module <http://purl.org/dc/terms/title> ?aq_module_name .
+    """,
+    "region": """
+        ?run <http://odahub.io/ontology#isUsing> ?aq_module ;
+             <http://odahub.io/ontology#isRequestingAstroRegion> ?a_region ;
+             ^oa:hasBody/oa:hasTarget ?runId .
+
+        OPTIONAL { ?run <http://purl.org/dc/terms/title> ?run_title . }
+
+        ?a_region <http://purl.org/dc/terms/title> ?a_region_name .
+
+        ?aq_module <http://purl.org/dc/terms/title> ?aq_module_name .
+    """,
+    "image": """
+        ?run <http://odahub.io/ontology#isUsing> ?aq_module ;
+             <http://odahub.io/ontology#isRequestingAstroImage> ?a_image ;
+             ^oa:hasBody/oa:hasTarget ?runId .
+
+        OPTIONAL { ?run <http://purl.org/dc/terms/title> ?run_title . }
+
+        ?a_image <http://purl.org/dc/terms/title> ?a_image_name .
+
+        ?aq_module <http://purl.org/dc/terms/title> ?aq_module_name .
+    """
+}
+
+_PARAMS_CONSTRUCT_RUN_PATTERNS = [
+    """
+        ?run <http://odahub.io/ontology#isUsing> ?aq_module ;
+             <http://odahub.io/ontology#isRequestingAstroObject> ?a_object ;
+             ^oa:hasBody/oa:hasTarget ?runId .
+
+        ?a_object <http://purl.org/dc/terms/title> ?a_object_name .
+
+        ?aq_module <http://purl.org/dc/terms/title> ?aq_module_name .
+
+        OPTIONAL { ?run <http://purl.org/dc/terms/title> ?run_title . }
+
+        FILTER (!CONTAINS(str(?a_object), " ")) .
+    """,
+    """
+        ?run <http://odahub.io/ontology#isUsing> ?aq_module ;
+             <http://odahub.io/ontology#isRequestingAstroRegion> ?a_region ;
+             ^oa:hasBody/oa:hasTarget ?runId .
+
+        ?a_region a ?a_region_type ;
+            <http://purl.org/dc/terms/title> ?a_region_name ;
+            <http://odahub.io/ontology#isUsingSkyCoordinates> ?a_sky_coordinates ;
+            <http://odahub.io/ontology#isUsingRadius> ?a_radius .
+
+        ?aq_module <http://purl.org/dc/terms/title> ?aq_module_name .
+
+        OPTIONAL { ?run <http://purl.org/dc/terms/title> ?run_title . }
+    """,
+    """
+        ?run <http://odahub.io/ontology#isUsing> ?aq_module ;
+             <http://odahub.io/ontology#isRequestingAstroImage> ?a_image ;
+             ^oa:hasBody/oa:hasTarget ?runId .
+
+        ?aq_module <http://purl.org/dc/terms/title> ?aq_module_name .
+
+        ?a_image a ?a_image_type ;
+                <http://purl.org/dc/terms/title> ?a_image_name .
+
+        OPTIONAL { ?a_image <http://odahub.io/ontology#isUsingCoordinates> ?a_coordinates . }
+        OPTIONAL { ?a_image <http://odahub.io/ontology#isUsingPosition> ?a_position . }
+        OPTIONAL { ?a_image <http://odahub.io/ontology#isUsingRadius> ?a_radius . }
+        OPTIONAL { ?a_image <http://odahub.io/ontology#isUsingPixels> ?a_pixels . }
+        OPTIONAL { ?a_image <http://odahub.io/ontology#isUsingImageBand> ?a_image_band . }
+
+        OPTIONAL { ?run <http://purl.org/dc/terms/title> ?run_title . }
+    """
+]
+
+
+def build_params_select_query(kind):
+    """Query of the runs requesting an astro object, region or image (kind), as listed by params."""
+    return f"""SELECT DISTINCT ?run ?runId ?a_{kind} ?a_{kind}_name ?aq_module ?aq_module_name
+        WHERE {{
+            {_PARAMS_RUN_PATTERNS[kind]}
+        }}"""
+
+
+def build_params_construct_query():
+    run_patterns_union = "\n        UNION\n".join(f"{{ {run_patterns} }}" for run_patterns in _PARAMS_CONSTRUCT_RUN_PATTERNS)
+
+    return f"""CONSTRUCT {{
+            ?run <http://odahub.io/ontology#isRequestingAstroObject> ?a_object .
+            ?run <http://odahub.io/ontology#isRequestingAstroRegion> ?a_region .
+            ?run <http://odahub.io/ontology#isRequestingAstroImage> ?a_image .
+            ?run <http://purl.org/dc/terms/title> ?run_title .
+            ?run <http://odahub.io/ontology#isUsing> ?aq_module .
+
+            ?a_region a ?a_region_type ;
+                <http://purl.org/dc/terms/title> ?a_region_name ;
+                <http://odahub.io/ontology#isUsingSkyCoordinates> ?a_sky_coordinates ;
+                <http://odahub.io/ontology#isUsingRadius> ?a_radius .
+
+            ?a_image a ?a_image_type ;
+                <http://purl.org/dc/terms/title> ?a_image_name ;
+                <http://odahub.io/ontology#isUsingCoordinates> ?a_coordinates ;
+                <http://odahub.io/ontology#isUsingPosition> ?a_position ;
+                <http://odahub.io/ontology#isUsingRadius> ?a_radius ;
+                <http://odahub.io/ontology#isUsingPixels> ?a_pixels ;
+                <http://odahub.io/ontology#isUsingImageBand> ?a_image_band .
+        }}
+        WHERE {{
+            {run_patterns_union}
+        }}"""
+
+
+def params_graph(graph, fingerprint=None):
+    """The runs requesting an astro object, region or image, along with all their triples, as listed by params."""
+    params_construct = sparql.query(graph, build_params_construct_query(), "params_construct",
+                                    fingerprint=fingerprint).graph
+
+    # all the triples of each matched run are copied once, rather than joining ?run ?p ?o
+    # with every solution of the query
+    with metrics.stage("params_run_triples"):
+        for run in set(params_construct.subjects(rdflib.URIRef("http://odahub.io/ontology#isUsing"), None)):
+            for triple in graph.triples((run, None, None)):
+                params_construct.add(triple)
+
+    return params_construct
+
+
 def clean_graph(g):
     # remove not-needed predicates
     g.remove((None, rdflib.URIRef('http://odahub.io/ontology#isUsing'), None))
@@ -763,7 +1220,10 @@ def clean_graph(g):
     g.remove((None, rdflib.URIRef('http://www.w3.org/ns/prov#hadPlan'), None))
     g.remove((None, rdflib.URIRef('https://swissdatasciencecenter.github.io/renku-ontology#position'), None))
     g.remove((None, rdflib.URIRef('https://swissdatasciencecenter.github.io/renku-ontology#hasArguments'), None))
-    g.remove((None, rdflib.URIRef('https://swissdatasciencecenter.github.io/renku-ontology#hasInputs'), None))
+    # the inputs are displayed through isInputOf, unless they were absorbed within the activity
+    for s, o in list(g[:rdflib.URIRef('https://swissdatasciencecenter.github.io/renku-ontology#hasInputs')]):
+        if not isinstance(o, rdflib.Literal):
+            g.remove((s, rdflib.URIRef('https://swissdatasciencecenter.github.io/renku-ontology#hasInputs'), o))
     # remove all the type triples
     g.remove((None, rdflib.RDF.type, None))
 
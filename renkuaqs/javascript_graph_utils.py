@@ -1,20 +1,37 @@
 import bs4
 import os
+
+import renkuaqs.static_assets as static_assets
+
 from git import Repo
 
 
-def gitignore_file(file_name):
-    if os.path.exists('.gitignore'):
-        with open('.gitignore') as gitignore_file_lines:
-            lines = gitignore_file_lines.readlines()
-        if file_name + "\n" not in lines:
-            lines.append(file_name + "\n")
-            with open(".gitignore", "w") as gitignore_file_write:
-                gitignore_file_write.writelines(lines)
-            commit_msg = f"{file_name} added to the .gitignore file"
-            repo = Repo('.')
-            repo.index.add(".gitignore")
-            repo.index.commit(commit_msg)
+def _git_exclude_path():
+    if os.path.isdir('.git'):
+        return os.path.join('.git', 'info', 'exclude')
+    if os.path.exists('.git'):
+        # eg a worktree or a submodule, whose .git file points to the actual git directory
+        return Repo('.').git.rev_parse("--git-path", "info/exclude")
+    return None
+
+
+def git_exclude_file(file_name):
+    """Exclude a file from git through .git/info/exclude, local to the repository, no commit is needed."""
+    exclude_path = _git_exclude_path()
+    if exclude_path is None:
+        return
+    entry = "/" + file_name.strip("/") + "\n"
+    lines = []
+    if os.path.exists(exclude_path):
+        with open(exclude_path) as exclude_file_lines:
+            lines = exclude_file_lines.readlines()
+    if entry not in lines:
+        if lines and not lines[-1].endswith("\n"):
+            lines[-1] += "\n"
+        lines.append(entry)
+        os.makedirs(os.path.dirname(exclude_path), exist_ok=True)
+        with open(exclude_path, "w") as exclude_file_write:
+            exclude_file_write.writelines(lines)
 
 
 def write_modified_html_content(graph_html_content, html_fn):
@@ -240,35 +257,41 @@ def set_html_head(net):
     css_tag = soup.head.find('style', type="text/css")
     css_tag.decompose()
 
+    # assets already referenced by the pyvis template (eg vis-network, lib/bindings/utils.js)
+    for tag, url_attribute in [('script', 'src'), ('link', 'href')]:
+        for asset_tag in soup.find_all(tag):
+            asset_name = static_assets.asset_name_from_url(asset_tag.get(url_attribute))
+            if asset_name is not None:
+                asset_tag[url_attribute] = static_assets.asset_url(asset_name)
+                if not asset_tag[url_attribute].startswith('http'):
+                    # the integrity hashes refer to the upstream copy
+                    for attribute in ['integrity', 'crossorigin', 'referrerpolicy']:
+                        asset_tag.attrs.pop(attribute, None)
+
     new_script_rdflib_library = soup.new_tag("script", type="application/javascript",
-                                             src="https://unpkg.com/n3/browser/n3.min.js")
+                                             src=static_assets.asset_url("n3.min.js"))
     soup.head.append(new_script_rdflib_library)
 
     new_script_query_sparql_library = soup.new_tag("script", type="application/javascript",
-                                                   src="https://rdf.js.org/comunica-browser/versions/latest"
-                                                       "/engines/query-sparql-rdfjs/comunica-browser.js")
+                                                   src=static_assets.asset_url("comunica-browser.js"))
     soup.head.append(new_script_query_sparql_library)
 
     new_script_bootstrap_icons_css = soup.new_tag("link", rel="stylesheet",  type="text/css",
-                                                   href="https://cdn.jsdelivr.net/npm/bootstrap-icons@1.3.0/font/bootstrap-icons.css")
+                                                   href=static_assets.asset_url("bootstrap-icons.css"))
     soup.head.append(new_script_bootstrap_icons_css)
 
     new_script_jquery_library = soup.new_tag("script", type="application/javascript",
-                                             src="https://ajax.googleapis.com/ajax/libs/jquery/3.5.1/jquery.min.js")
+                                             src=static_assets.asset_url("jquery.min.js"))
     soup.head.append(new_script_jquery_library)
 
     graph_helper_library = soup.new_tag("script", type="application/javascript",
-                                        src="https://odahub.io/renku-aqs-graph-library/graph_helper.js")
+                                        src=static_assets.asset_url("graph_helper.js"))
     soup.head.append(graph_helper_library)
 
     graph_helper_css = soup.new_tag("link", rel="stylesheet",  type="text/css",
-                                    href="https://odahub.io/renku-aqs-graph-library/style.css")
+                                    href=static_assets.asset_url("style.css"))
     soup.head.append(graph_helper_css)
 
-    bindings_lib_tag = soup.find('script', {"src": "lib/bindings/utils.js"})
-    if bindings_lib_tag is not None:
-        bindings_lib_tag["src"] = "../renku-aqs-graph-library/lib/bindings/utils.js"
-
     title_tag = soup.new_tag("title")
     title_tag.string = "Graph visualization"
     soup.head.append(title_tag)
@@ -0,0 +1,196 @@
+import os
+import time
+import resource
+import threading
+
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+
+
+class _Metric(object):
+    metric_type = None
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(label_name, "")) for label_name in self.label_names)
+
+    def _format_labels(self, key, extra=()):
+        pairs = list(zip(self.label_names, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{n}="{_escape_label_value(v)}"' for n, v in pairs) + "}"
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.extend(self._expose_value(key, value))
+        return lines
+
+    def _expose_value(self, key, value):
+        return [f"{self.name}{self._format_labels(key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    metric_type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    metric_type = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(buckets)
+        if self.buckets[-1] != float("inf"):
+            self.buckets += (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            bucket_counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    bucket_counts[i] += 1
+            self._values[key] = (bucket_counts, total + value)
+
+    def _expose_value(self, key, value):
+        bucket_counts, total = value
+        lines = []
+        for upper_bound, count in zip(self.buckets, bucket_counts):
+            le = "+Inf" if upper_bound == float("inf") else _format_value(upper_bound)
+            lines.append(f"{self.name}_bucket{self._format_labels(key, [('le', le)])} {count}")
+        lines.append(f"{self.name}_sum{self._format_labels(key)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{self._format_labels(key)} {bucket_counts[-1]}")
+        return lines
+
+
+class Registry(object):
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def expose(self):
+        _process_rss_bytes.set(_current_rss_bytes())
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _current_rss_bytes():
+    try:
+        with open("/proc/self/statm") as statm_f:
+            return int(statm_f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # peak rather than current RSS, in kilobytes on linux and bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+registry = Registry()
+
+http_requests_total = registry.register(
+    Counter("renkuaqs_http_requests_total", "Number of requests served by the graph server",
+            ("endpoint", "status")))
+http_request_duration_seconds = registry.register(
+    Histogram("renkuaqs_http_request_duration_seconds", "Latency of the requests served by the graph server",
+              ("endpoint",)))
+stage_duration_seconds = registry.register(
+    Histogram("renkuaqs_stage_duration_seconds", "Duration of the graph pipeline stages", ("stage",)))
+cache_requests_total = registry.register(
+    Counter("renkuaqs_cache_requests_total", "Number of cache lookups", ("cache", "result")))
+snapshot_triples = registry.register(
+    Gauge("renkuaqs_snapshot_triples", "Number of triples of the current graph snapshot"))
+snapshot_bytes = registry.register(
+    Gauge("renkuaqs_snapshot_bytes", "Size in bytes of the serialised current graph snapshot"))
+sparql_duration_seconds = registry.register(
+    Histogram("renkuaqs_sparql_duration_seconds", "Duration of the SPARQL queries, by phase (parse, translate, eval)",
+              ("query", "phase")))
+sparql_result_rows = registry.register(
+    Histogram("renkuaqs_sparql_result_rows", "Number of result rows (or triples) of the SPARQL queries", ("query",),
+              buckets=(1, 10, 100, 1000, 10000, 100000, 1000000)))
+sparql_slow_queries_total = registry.register(
+    Counter("renkuaqs_sparql_slow_queries_total", "Number of SPARQL queries above the slow-query threshold",
+            ("query",)))
+_process_rss_bytes = registry.register(
+    Gauge("renkuaqs_process_resident_memory_bytes", "Resident memory of the graph server process"))
+
+_recorded_stages = threading.local()
+# set while a block is profiled, see renkuaqs.profiling
+_stage_profiler = None
+
+
+def set_stage_profiler(profiler):
+    global _stage_profiler
+    _stage_profiler = profiler
+
+
+@contextmanager
+def stage(name):
+    """Time a stage of the graph pipeline (eg renku export, aqs load, merge, serialisation)."""
+    profiler = _stage_profiler
+    if profiler is not None:
+        profiler.start_stage(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+        if profiler is not None:
+            profiler.stop_stage(name)
+
+
+def observe_stage(name, duration):
+    stage_duration_seconds.observe(duration, stage=name)
+    recorded = getattr(_recorded_stages, "stages", None)
+    if recorded is not None:
+        recorded.append((name, duration))
+
+
+@contextmanager
+def recorded_stages():
+    """Collect the stage durations observed within the block, eg to send them back from a worker process."""
+    previous = getattr(_recorded_stages, "stages", None)
+    _recorded_stages.stages = []
+    try:
+        yield _recorded_stages.stages
+    finally:
+        _recorded_stages.stages = previous
+
+
+def cache_lookup(cache, hit):
+    cache_requests_total.inc(cache=cache, result="hit" if hit else "miss")
@@ -0,0 +1,87 @@
+import os
+import json
+import hashlib
+import subprocess
+import rdflib
+
+import renkuaqs.metrics as metrics
+import renkuaqs.file_utils as file_utils
+
+from importlib import metadata
+from pathlib import Path
+from nb2workflow import ontology, nbadapter
+
+from renkuaqs.config import CACHE_DIR_ENV, CACHE_DIR_DEFAULT
+
+
+def _nb2workflow_version():
+    try:
+        return metadata.version("nb2workflow")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def nb2rdf_cache_dir():
+    # the extraction depends on the nb2workflow version, hence the cache does as well
+    cache_dir = os.path.expanduser(os.environ.get(CACHE_DIR_ENV, CACHE_DIR_DEFAULT))
+    return Path(cache_dir, "nb2rdf", _nb2workflow_version())
+
+
+def notebook_origin(notebook_path):
+    """The origin of a notebook as nb2workflow determines it (NotebookAdapter.notebook_origin):
+    the git remote and revision of its folder, or the folder itself outside of a git repository."""
+    notebook_dir = os.path.dirname(os.path.abspath(notebook_path))
+    try:
+        url = subprocess.check_output(["git", "remote", "get-url", "origin"], cwd=notebook_dir,
+                                      stderr=subprocess.DEVNULL).decode().strip()
+        revision = subprocess.check_output(["git", "describe", "--always", "--tags"], cwd=notebook_dir,
+                                           stderr=subprocess.DEVNULL).decode().strip()
+        return f"{url}#{revision}"
+    except subprocess.CalledProcessError:
+        return f"file://{os.path.abspath(notebook_dir)}"
+
+
+def nb2rdf_cache_path(notebook_path, checksum):
+    """Path of the cached annotations of a notebook, None when they cannot be cached.
+
+    Besides the checksum of the notebook, the annotations depend on its name and origin: the workflow IRI
+    is derived from both, and the origin is the oda:location of the workflow.
+    """
+    if checksum is None:
+        return None
+    origin_key = f"{nbadapter.notebook_short_name(notebook_path)}\n{notebook_origin(notebook_path)}"
+    origin_hash = hashlib.blake2b(origin_key.encode(), digest_size=8).hexdigest()
+    return nb2rdf_cache_dir().joinpath(f"{checksum}-{origin_hash}.jsonld")
+
+
+def is_cached(notebook_path, checksum):
+    """Whether the annotations of this version of a notebook were already extracted."""
+    cache_path = nb2rdf_cache_path(notebook_path, checksum)
+    return cache_path is not None and cache_path.exists()
+
+
+def nb2rdf_jsonld(notebook_path, checksum=None):
+    """Return the JSON-LD annotations extracted by nb2workflow from a notebook.
+
+    The result is cached by notebook checksum, name and origin, so that each version of a notebook is parsed
+    once across the CLI commands, the renku hooks and the graph server requests.
+    """
+    cache_path = nb2rdf_cache_path(notebook_path, checksum)
+    if cache_path is not None:
+        if cache_path.exists():
+            metrics.cache_lookup("nb2rdf", True)
+            with open(cache_path) as cache_f:
+                return json.load(cache_f)
+        metrics.cache_lookup("nb2rdf", False)
+
+    with metrics.stage("nb2rdf"):
+        rdf_nb = ontology.nb2rdf(notebook_path)
+        G = rdflib.Graph()
+        G.parse(data=rdf_nb)
+        rdf_jsonld = json.loads(G.serialize(format="json-ld"))
+
+    if cache_path is not None:
+        # concurrent readers either find the complete file or none
+        file_utils.write_file_atomically(cache_path, json.dumps(rdf_jsonld))
+
+    return rdf_jsonld
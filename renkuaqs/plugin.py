@@ -17,10 +17,11 @@
 # limitations under the License.
 
 import os
-import pathlib
 import json
 import re
+import shutil
 import subprocess
+import uuid
 import webbrowser
 import click
 import rdflib
@@ -33,10 +34,17 @@ from renku.core.plugin import hookimpl
 from IPython.display import Image, HTML
 from prettytable import PrettyTable
 from aqsconverters.io import AQS_ANNOTATION_DIR, COMMON_DIR
-from renkuaqs.config import ENTITY_METADATA_AQS_DIR
-from nb2workflow import ontology
+from lockfile import LockFile
+from renkuaqs.config import ENTITY_METADATA_AQS_DIR, RUN_TOKEN_ENV
 
 import renkuaqs.graph_utils as graph_utils
+import renkuaqs.nb2rdf_cache as nb2rdf_cache
+import renkuaqs.capture as capture
+import renkuaqs.astroquery_hook as astroquery_hook
+import renkuaqs.profiling as profiling
+import renkuaqs.sparql as sparql
+import renkuaqs.graph_export as graph_export
+import renkuaqs.graph_reduction as graph_reduction
 
 
 class AQS(object):
@@ -74,9 +82,7 @@ def activity_annotations(activity):
     """``process_run_annotations`` hook implementation."""
     aqs = AQS(activity)
 
-    sitecustomize_path = pathlib.Path(os.path.join(project_context.metadata_path, AQS_ANNOTATION_DIR, "sitecustomize.py"))
-    if sitecustomize_path.exists():
-        sitecustomize_path.unlink()
+    run_token = os.environ.pop(RUN_TOKEN_ENV, None)
 
     annotations = []
 
@@ -94,12 +100,7 @@ def activity_annotations(activity):
             entity_file_name, entity_file_extension = os.path.splitext(entity.path)
             if entity_file_extension == '.ipynb':
                 print(f"\033[31mExtracting metadata from the output notebook: {entity.path}, id: {entity.id}\033[0m")
-                rdf_nb = ontology.nb2rdf(entity.path)
-                print(f"\033[32m{rdf_nb}\033[0m")
-                G = rdflib.Graph()
-                G.parse(data=rdf_nb)
-                rdf_jsonld_str = G.serialize(format="json-ld")
-                rdf_jsonld = json.loads(rdf_jsonld_str)
+                rdf_jsonld = nb2rdf_cache.nb2rdf_jsonld(entity.path, checksum=entity.checksum)
                 for nb2annotation in rdf_jsonld:
                     # to comply with the terminology
                     nb2annotation["http://odahub.io/ontology#entity_checksum"] = entity.checksum
@@ -112,7 +113,28 @@ def activity_annotations(activity):
                         Annotation(id=annotation_id, source="AQS plugin", body=nb2annotation)
                     )
 
-    if os.path.exists(aqs.renku_aqs_path):
+    if run_token is not None:
+        # annotations captured by the hooks of this run only, other runs of the checkout use their own directory
+        annotations.extend(_captured_annotations(activity, capture.capture_path(project_context.metadata_path,
+                                                                                run_token)))
+        shutil.rmtree(capture.run_path(project_context.metadata_path, run_token), ignore_errors=True)
+    elif os.path.exists(aqs.renku_aqs_path):
+        # the annotations of the common directory, written by the hooks of a previous version or by the runs
+        # outside of the hooks of this plugin; a run with its own token cannot tell which of them are its own
+        annotations.extend(_common_annotations(aqs, activity))
+    else:
+        print("nothing to process in process_run_annotations")
+
+    return annotations
+
+
+def _common_annotations(aqs, activity):
+    annotations = []
+    # the common directory is shared by all the runs of the checkout
+    with LockFile(str(aqs.renku_aqs_path)):
+        annotations.extend(_captured_annotations(activity, aqs.renku_aqs_path.joinpath(capture.CAPTURE_FILE_NAME)))
+
+        # annotations written one per file, eg by the hooks of a previous version
         for p in aqs.renku_aqs_path.iterdir():
             if p.match("*json"):
                 print(f"found json annotation: {p}")
@@ -131,9 +153,22 @@ def activity_annotations(activity):
                 annotations.append(
                     Annotation(id=annotation_id, source="AQS plugin", body=aqs_annotation)
                 )
-    else:
-        print("nothing to process in process_run_annotations")
+    return annotations
+
 
+def _captured_annotations(activity, capture_path):
+    annotations = []
+    for annotation_id_hash, aqs_annotation in capture.read_capture(capture_path):
+        # this will make annotations according to https://odahub.io/ontology/
+        annotation_id = "{activity}/annotations/aqs/{id}".format(
+            activity=activity.id, id=aqs_annotation["@id"]
+        )
+        annotations.append(
+            Annotation(id=annotation_id, source="AQS plugin", body=aqs_annotation)
+        )
+    if capture_path.exists():
+        print(f"found {len(annotations)} jsonLD annotations in {capture_path}")
+        capture_path.unlink()
     return annotations
 
 
@@ -141,24 +176,26 @@ def activity_annotations(activity):
 def pre_run(tool):
     print(f"\033[31mhere we will prepare hooks for astroquery, tool given is {tool}\033[0m")
 
-    sitecustomize_dir = Path(project_context.metadata_path, AQS_ANNOTATION_DIR)
+    # each run gets its own directory for the sitecustomize and the captured annotations,
+    # the parallel runs of the same checkout do not share any of them
+    run_token = uuid.uuid4().hex
+    os.environ[RUN_TOKEN_ENV] = run_token
 
-    if not sitecustomize_dir.exists():
-        sitecustomize_dir.mkdir(parents=True)
+    sitecustomize_dir = capture.run_path(project_context.metadata_path, run_token)
+    sitecustomize_dir.mkdir(parents=True, exist_ok=True)
 
-    os.environ["PYTHONPATH"] = f"{sitecustomize_dir}:" + os.environ.get('PYTHONPATH', "")
+    # the hook directory of a previous run within the same process is replaced
+    runs_dir = str(sitecustomize_dir.parent)
+    python_path = os.pathsep.join(p for p in os.environ.get('PYTHONPATH', "").split(os.pathsep)
+                                  if not p.startswith(runs_dir))
+    os.environ["PYTHONPATH"] = f"{sitecustomize_dir}{os.pathsep}{python_path}" if python_path else str(sitecustomize_dir)
 
     sitecustomize_path = os.path.join(sitecustomize_dir, "sitecustomize.py")
 
     print(f"\033[34msitecustomize.py as {sitecustomize_path}\033[0m")
 
-    open(sitecustomize_path, "w").write("""
-print(f"\033[31menabling hooks for astroquery\033[0m")  
-
-import aqsconverters.aq
-
-aqsconverters.aq.autolog()
-""")
+    # the sitecustomize only installs an import hook, enabling the astroquery hooks once astroquery is imported
+    shutil.copy(astroquery_hook.__file__, sitecustomize_path)
 
 
 def _run_id(activity_id):
@@ -181,8 +218,14 @@ def _create_leaderboard(data, metric, format=None):
 
 
 @click.group()
-def aqs():
-    pass
+@click.option("--profile", default=None, type=click.Path(),
+              help="Write a JSON report of the wall time, cpu time and peak memory of each stage of the command")
+@click.option("--profile-pstats", default=None, type=click.Path(),
+              help="Write the cProfile statistics of the slowest stage of the command, to be read with pstats")
+@click.pass_context
+def aqs(ctx, profile, profile_pstats):
+    if profile is not None or profile_pstats is not None:
+        ctx.with_resource(profiling.profile(profile, profile_pstats))
 
 
 @aqs.command()
@@ -196,15 +239,17 @@ def aqs():
 @click.argument("paths", type=click.Path(exists=False), nargs=-1)
 def leaderboard(revision, format, metric, paths):
     """Leaderboard based on performance of astroquery requests"""
-    graph = graph_utils._graph(revision, paths)
+    # the graph is built only when the result of the query is not cached
+    graph = sparql.LazyGraph(graph_utils._overall_graph, revision, paths[0] if paths else None)
+    fingerprint = graph_utils.overall_graph_fingerprint(revision, paths[0] if paths else None)
     leaderboard = dict()
 
     # how to use ontology
-    for r in graph.query(
+    for r in sparql.query(graph,
             """SELECT DISTINCT ?a_object ?aq_module WHERE {{
         ?run <http://odahub.io/ontology#isRequestingAstroObject> ?a_object;
              <http://odahub.io/ontology#isUsing> ?aq_module .
-        }}"""):
+        }}""", "leaderboard", parameters={"metric": metric}, fingerprint=fingerprint):
         print(r)
 
 
@@ -230,7 +275,8 @@ def params(revision, format, paths, diff):
         else:
             return rdf_iteral.toPython()
 
-    graph = graph_utils._graph(revision, paths)
+    graph = graph_utils._overall_graph(revision, paths[0] if paths else None)
+    fingerprint = graph_utils.overall_graph_fingerprint(revision, paths[0] if paths else None)
 
     renku_path = project_context.path
 
@@ -239,28 +285,11 @@ def params(revision, format, paths, diff):
     output.field_names = ["Run ID", "AstroQuery Module", "Astro Object"]
     output.align["Run ID"] = "l"
 
-    # for the query_object
-    query_where = """WHERE {{
-        ?run <http://odahub.io/ontology#isUsing> ?aq_module ;
-             <http://odahub.io/ontology#isRequestingAstroObject> ?a_object ;
-             ^oa:hasBody/oa:hasTarget ?runId .
-        
-        OPTIONAL {{ ?run <http://purl.org/dc/terms/title> ?run_title . }}
-
-        ?a_object <http://purl.org/dc/terms/title> ?a_object_name .
-        
-        ?aq_module <http://purl.org/dc/terms/title> ?aq_module_name .
-
-        ?run ?p ?o .
-
-        }}"""
-
     invalid_entries = 0
 
-    for r in graph.query(f"""
-        SELECT DISTINCT ?run ?runId ?a_object ?a_object_name ?aq_module ?aq_module_name 
-        {query_where}
-        """):
+    # for the query_object
+    for r in sparql.query(graph, graph_utils.build_params_select_query("object"), "params_object",
+                          fingerprint=fingerprint):
         if " " in r.a_object:
             invalid_entries += 1
         else:
@@ -272,27 +301,11 @@ def params(revision, format, paths, diff):
     print(output, "\n")
 
     # for the query_region
-    query_where = """WHERE {{
-        ?run <http://odahub.io/ontology#isUsing> ?aq_module ;
-             <http://odahub.io/ontology#isRequestingAstroRegion> ?a_region ;
-             ^oa:hasBody/oa:hasTarget ?runId .
-        
-        OPTIONAL {{ ?run <http://purl.org/dc/terms/title> ?run_title . }}
-
-        ?a_region <http://purl.org/dc/terms/title> ?a_region_name .
-        
-        ?aq_module <http://purl.org/dc/terms/title> ?aq_module_name .
-
-        ?run ?p ?o .
-    }}"""
-
     output = PrettyTable()
     output.field_names = ["Run ID", "AstroQuery Module", "Astro Region"]
     output.align["Run ID"] = "l"
-    for r in graph.query(f"""
-        SELECT DISTINCT ?run ?runId ?a_region ?a_region_name ?aq_module ?aq_module_name 
-        {query_where}
-        """):
+    for r in sparql.query(graph, graph_utils.build_params_select_query("region"), "params_region",
+                          fingerprint=fingerprint):
         if " " in r.a_region:
             invalid_entries += 1
         else:
@@ -304,27 +317,11 @@ def params(revision, format, paths, diff):
     print(output, "\n")
 
     # for the get_images
-    query_where = """WHERE {{
-        ?run <http://odahub.io/ontology#isUsing> ?aq_module ;
-             <http://odahub.io/ontology#isRequestingAstroImage> ?a_image ;
-             ^oa:hasBody/oa:hasTarget ?runId .
-
-        OPTIONAL {{ ?run <http://purl.org/dc/terms/title> ?run_title . }}
-
-        ?a_image <http://purl.org/dc/terms/title> ?a_image_name .
-
-        ?aq_module <http://purl.org/dc/terms/title> ?aq_module_name .
-
-        ?run ?p ?o .
-    }}"""
-
     output = PrettyTable()
     output.field_names = ["Run ID", "AstroQuery Module", "Astro Image"]
     output.align["Run ID"] = "l"
-    for r in graph.query(f"""
-        SELECT DISTINCT ?run ?runId ?a_image ?a_image_name ?aq_module ?aq_module_name 
-        {query_where}
-        """):
+    for r in sparql.query(graph, graph_utils.build_params_select_query("image"), "params_image",
+                          fingerprint=fingerprint):
         if " " in r.a_image:
             invalid_entries += 1
         else:
@@ -338,97 +335,16 @@ def params(revision, format, paths, diff):
     if invalid_entries > 0:
         print("Some entries within the graph are not valid and therefore the store should be recreated", "\n")
 
-    query_where = """WHERE {{
-            {
-                ?run <http://odahub.io/ontology#isUsing> ?aq_module ;
-                     <http://odahub.io/ontology#isRequestingAstroObject> ?a_object ;
-                     ^oa:hasBody/oa:hasTarget ?runId .
-                 
-                ?a_object <http://purl.org/dc/terms/title> ?a_object_name .
-                
-                ?aq_module <http://purl.org/dc/terms/title> ?aq_module_name .
-                
-                OPTIONAL {{ ?run <http://purl.org/dc/terms/title> ?run_title . }}
-                
-                ?run ?p ?o .
-
-                FILTER (!CONTAINS(str(?a_object), " ")) .
-            
-            }
-            UNION
-            {
-                ?run <http://odahub.io/ontology#isUsing> ?aq_module ;
-                     <http://odahub.io/ontology#isRequestingAstroRegion> ?a_region ;
-                     ^oa:hasBody/oa:hasTarget ?runId .
-                
-                ?a_region a ?a_region_type ; 
-                    <http://purl.org/dc/terms/title> ?a_region_name ;
-                    <http://odahub.io/ontology#isUsingSkyCoordinates> ?a_sky_coordinates ;
-                    <http://odahub.io/ontology#isUsingRadius> ?a_radius .
-                
-                ?aq_module <http://purl.org/dc/terms/title> ?aq_module_name .
-
-                OPTIONAL {{ ?run <http://purl.org/dc/terms/title> ?run_title . }}
-                
-                ?run ?p ?o .
-            }
-            UNION
-            {
-                ?run <http://odahub.io/ontology#isUsing> ?aq_module ;
-                     <http://odahub.io/ontology#isRequestingAstroImage> ?a_image ;
-                     ^oa:hasBody/oa:hasTarget ?runId .
-
-                ?aq_module <http://purl.org/dc/terms/title> ?aq_module_name .
-
-                ?a_image a ?a_image_type ;
-                        <http://purl.org/dc/terms/title> ?a_image_name .
-
-                OPTIONAL {{ ?a_image <http://odahub.io/ontology#isUsingCoordinates> ?a_coordinates . }}
-                OPTIONAL {{ ?a_image <http://odahub.io/ontology#isUsingPosition> ?a_position . }}
-                OPTIONAL {{ ?a_image <http://odahub.io/ontology#isUsingRadius> ?a_radius . }}
-                OPTIONAL {{ ?a_image <http://odahub.io/ontology#isUsingPixels> ?a_pixels . }}
-                OPTIONAL {{ ?a_image <http://odahub.io/ontology#isUsingImageBand> ?a_image_band . }}
-
-                OPTIONAL {{ ?run <http://purl.org/dc/terms/title> ?run_title . }}
-
-                ?run ?p ?o .
-            }
-            }}"""
-
-    r = graph.query(f"""
-        CONSTRUCT {{
-            ?run <http://odahub.io/ontology#isRequestingAstroObject> ?a_object .
-            ?run <http://odahub.io/ontology#isRequestingAstroRegion> ?a_region .
-            ?run <http://odahub.io/ontology#isRequestingAstroImage> ?a_image .
-            ?run <http://purl.org/dc/terms/title> ?run_title .
-            ?run <http://odahub.io/ontology#isUsing> ?aq_module .
-            ?run ?p ?o .
-            
-            ?a_region a ?a_region_type ; 
-                <http://purl.org/dc/terms/title> ?a_region_name ;
-                <http://odahub.io/ontology#isUsingSkyCoordinates> ?a_sky_coordinates ;
-                <http://odahub.io/ontology#isUsingRadius> ?a_radius .
-                
-            ?a_image a ?a_image_type ;
-                <http://purl.org/dc/terms/title> ?a_image_name ;
-                <http://odahub.io/ontology#isUsingCoordinates> ?a_coordinates ;
-                <http://odahub.io/ontology#isUsingPosition> ?a_position ;
-                <http://odahub.io/ontology#isUsingRadius> ?a_radius ;
-                <http://odahub.io/ontology#isUsingPixels> ?a_pixels ;
-                <http://odahub.io/ontology#isUsingImageBand> ?a_image_band .
-        }}
-        {query_where}
-        """)
-
-    G = rdflib.Graph()
-    G.parse(data=r.serialize(format="n3").decode(), format="n3")
+    G = graph_utils.params_graph(graph, fingerprint=fingerprint)
     G.bind("oda", "http://odahub.io/ontology#")
     G.bind("odas", "https://odahub.io/ontology#")  # the same
     G.bind("local-renku", f"file://{renku_path}/")  # ??
 
 
-def show_graph_image(revision="HEAD", paths=os.getcwd(), filename="graph.png", no_oda_info=True, input_notebook=None):
-    filename = graph_utils.build_graph_image(revision, paths, filename, no_oda_info, input_notebook)
+def show_graph_image(revision="HEAD", paths=os.getcwd(), filename="graph.png", no_oda_info=True, input_notebook=None,
+                     reductions=None):
+    filename = graph_utils.build_graph_image(revision, paths, filename, no_oda_info, input_notebook,
+                                             reductions=reductions)
     return Image(filename=filename)
 
 
@@ -439,19 +355,63 @@ def show_graph_image(revision="HEAD", paths=os.getcwd(), filename="graph.png", n
     help="The git revision to generate the log for, default: HEAD",
 )
 @click.option("--input-notebook", default=None, help="Input notebook to process")
+@click.option("--workers", default=None, type=int,
+              help="Number of processes extracting the metadata from the input notebooks, default: number of cpus")
+@click.option("--compact", is_flag=True, help="Write the annotations as compact json, eg for large annotation sets")
 @click.argument("paths", type=click.Path(exists=False), nargs=-1)
-def inspect(revision, paths, input_notebook):
+def inspect(revision, paths, input_notebook, workers, compact):
     """Inspect the input entities within the graph"""
 
     path = paths
     if paths is not None and isinstance(paths, click.Path):
         path = str(path)
 
-    graph_utils.inspect_oda_graph_inputs(revision, path, input_notebook)
+    graph_utils.inspect_oda_graph_inputs(revision, path, input_notebook, workers=workers, compact_annotations=compact)
 
     return ""
 
 
+@aqs.command()
+@click.option("--scope", type=click.Choice(["all-revisions", "head"]), default="all-revisions",
+              help="Keep the annotations of the checksums referenced anywhere within the graph (all-revisions), "
+                   "or only those of the files at HEAD (head)")
+@click.option("--delete", is_flag=True, help="Delete the orphaned annotation folders")
+@click.option("--pack", default=None, type=click.Path(),
+              help="Pack the orphaned annotation folders into a compressed archive (eg aqs-orphaned.tar.gz), "
+                   "and delete them")
+@click.argument("paths", type=click.Path(exists=False), nargs=-1)
+def gc(paths, scope, delete, pack):
+    """Report, and optionally remove, the annotation folders of checksums no longer in the graph"""
+
+    graph_utils.gc_aqs_annotations(paths[0] if paths else None, scope=scope, delete=delete, pack=pack)
+
+
+@aqs.command()
+@click.option(
+    "--revision",
+    default="HEAD",
+    help="The git revision to generate the log for, default: HEAD",
+)
+@click.option("--format", type=click.Choice(graph_export.FORMATS), default="nt", help="Serialisation of the graph")
+@click.option("--compression", type=click.Choice(graph_export.COMPRESSIONS), default=None,
+              help="Compression of the output, default: from the output suffix (.gz, .zst)")
+@click.option("--output", "-o", default="-", type=click.Path(allow_dash=True),
+              help="The output file, default: stdout")
+@click.option("--full-history", is_flag=True,
+              help="Load the annotations of all the versions of the notebooks, "
+                   "including those no longer referenced within the graph")
+@click.argument("paths", type=click.Path(exists=False), nargs=-1)
+def export(revision, format, compression, output, full_history, paths):
+    """Stream the graph, along with the annotations, to a file or stdout"""
+    if compression is None:
+        compression = graph_export.compression_from_filename(output)
+
+    n_triples = graph_utils.export_graph(revision, paths[0] if paths else None, filename=output, format=format,
+                                         compression=compression, full_history=full_history)
+
+    click.echo(f"{n_triples} triples written", err=True)
+
+
 @aqs.command()
 @click.option(
     "--revision",
@@ -461,12 +421,20 @@ def inspect(revision, paths, input_notebook):
 @click.option("--filename", default="graph.png", help="The filename of the output file image")
 @click.option("--input-notebook", default=None, help="Input notebook to process")
 @click.option("--no-oda-info", is_flag=True, help="Exclude oda related information in the output graph")
+@click.option("--reduce", "reductions", default=None,
+              help="Reductions of graph_reduction_config.json to apply, eg Activity,AstrophysicalRegion")
 @click.argument("paths", type=click.Path(exists=False), nargs=-1)
-def display(revision, paths, filename, no_oda_info, input_notebook):
+def display(revision, paths, filename, no_oda_info, input_notebook, reductions):
     path = paths
     if paths is not None and isinstance(paths, click.Path):
         path = str(path)
-    output_filename = graph_utils.build_graph_image(revision, path, filename, no_oda_info, input_notebook)
+    if reductions is not None:
+        try:
+            reductions = graph_reduction.parse_reductions(reductions)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--reduce")
+    output_filename = graph_utils.build_graph_image(revision, path, filename, no_oda_info, input_notebook,
+                                                    reductions=reductions)
     return output_filename
 
 
@@ -494,8 +462,11 @@ def start_session():
 
 
 @aqs.command()
-def show_graph():
-    graph_html_content, ttl_content = graph_utils.build_graph_html(None, None)
+@click.option("--full-history", is_flag=True,
+              help="Load the annotations of all the versions of the notebooks, "
+                   "including those no longer referenced within the graph")
+def show_graph(full_history):
+    graph_html_content, ttl_content = graph_utils.build_graph_html(None, None, full_history=full_history)
     html_fn, ttl_fn = graph_utils.write_graph_files(graph_html_content, ttl_content)
 
     webbrowser.open(html_fn)
@@ -0,0 +1,152 @@
+import json
+import time
+import cProfile
+import pstats
+import threading
+import tracemalloc
+
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import renkuaqs.metrics as metrics
+
+
+class _StageFrame(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        self.memory_start = tracemalloc.get_traced_memory()[0]
+        # highest traced memory seen by the stages nested in this one, tracemalloc has a single peak
+        self.nested_memory_peak = 0
+        self.cprofile = None
+
+
+class StageProfiler(object):
+    """Wall time, cpu time and peak memory of the pipeline stages run within the profiled block.
+
+    The stages are the ones timed with metrics.stage, nested stages are also accounted in their parent stage.
+    Only the stages of the thread starting the profiler are recorded.
+    """
+
+    def __init__(self, cprofile=False):
+        self.cprofile = cprofile
+        self.stages = OrderedDict()
+        self._cprofiles = {}
+        self._stack = []
+        self._thread_id = None
+        self._started_tracemalloc = False
+        self._wall_start = None
+        self._cpu_start = None
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.peak_memory_bytes = None
+
+    def start(self):
+        self._thread_id = threading.get_ident()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        tracemalloc.reset_peak()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        metrics.set_stage_profiler(self)
+
+    def stop(self):
+        metrics.set_stage_profiler(None)
+        self.wall_seconds = time.perf_counter() - self._wall_start
+        self.cpu_seconds = time.process_time() - self._cpu_start
+        self.peak_memory_bytes = max([tracemalloc.get_traced_memory()[1]] +
+                                     [s['peak_memory_bytes'] for s in self.stages.values()])
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+    def start_stage(self, name):
+        if threading.get_ident() != self._thread_id:
+            return
+        frame = _StageFrame(name)
+        if self._stack:
+            self._stack[-1].nested_memory_peak = max(self._stack[-1].nested_memory_peak,
+                                                     tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        if self.cprofile and not self._stack:
+            # a single cProfile profiler can be active at a time, the nested stages are within the outer one
+            frame.cprofile = cProfile.Profile()
+            frame.cprofile.enable()
+        self._stack.append(frame)
+
+    def stop_stage(self, name):
+        if threading.get_ident() != self._thread_id or not self._stack or self._stack[-1].name != name:
+            return
+        frame = self._stack.pop()
+        if frame.cprofile is not None:
+            frame.cprofile.disable()
+            self._cprofiles.setdefault(name, []).append(frame.cprofile)
+
+        memory_peak = max(frame.nested_memory_peak, tracemalloc.get_traced_memory()[1])
+        if self._stack:
+            self._stack[-1].nested_memory_peak = max(self._stack[-1].nested_memory_peak, memory_peak)
+
+        stage = self.stages.setdefault(name, {'calls': 0,
+                                              'wall_seconds': 0.,
+                                              'cpu_seconds': 0.,
+                                              'peak_memory_bytes': 0,
+                                              'peak_memory_increase_bytes': 0})
+        stage['calls'] += 1
+        stage['wall_seconds'] += time.perf_counter() - frame.wall_start
+        stage['cpu_seconds'] += time.process_time() - frame.cpu_start
+        stage['peak_memory_bytes'] = max(stage['peak_memory_bytes'], memory_peak)
+        stage['peak_memory_increase_bytes'] = max(stage['peak_memory_increase_bytes'],
+                                                  memory_peak - frame.memory_start)
+
+    @property
+    def slowest_stage(self):
+        if not self.stages:
+            return None
+        return max(self.stages, key=lambda name: self.stages[name]['wall_seconds'])
+
+    def dump_pstats(self, filename):
+        """Write the cProfile statistics of the slowest profiled (outermost) stage, return the stage name."""
+        profiled_stages = [name for name in self.stages if name in self._cprofiles]
+        if not profiled_stages:
+            return None
+        stage_name = max(profiled_stages, key=lambda name: self.stages[name]['wall_seconds'])
+        stats = pstats.Stats(*self._cprofiles[stage_name])
+        stats.dump_stats(filename)
+        return stage_name
+
+    def report(self):
+        return {
+            'wall_seconds': self.wall_seconds,
+            'cpu_seconds': self.cpu_seconds,
+            'peak_memory_bytes': self.peak_memory_bytes,
+            'slowest_stage': self.slowest_stage,
+            'stages': self.stages
+        }
+
+
+@contextmanager
+def profile(report_filename=None, pstats_filename=None):
+    """Profile the pipeline stages run within the block, eg
+
+        with profiling.profile("profile.json") as profiler:
+            graph_utils.build_graph_image(...)
+        print(profiler.report())
+
+    The JSON report is written to report_filename, and the cProfile statistics
+    of the slowest stage to pstats_filename, when given.
+    """
+    profiler = StageProfiler(cprofile=pstats_filename is not None)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        report = profiler.report()
+        if pstats_filename is not None:
+            report['pstats_stage'] = profiler.dump_pstats(pstats_filename)
+            report['pstats_filename'] = pstats_filename
+        if report_filename is not None:
+            with open(report_filename, "w") as report_f:
+                json.dump(report, report_f, indent=4)
@@ -0,0 +1,45 @@
+import threading
+
+from concurrent.futures import Future
+
+
+class SingleFlight(object):
+    """Coalesce concurrent calls sharing the same key into a single execution.
+
+    The first caller for a key runs the function, the callers arriving while it is in flight
+    wait on the same future and share its result. Nothing is kept once the call completes,
+    so errors are propagated to every waiter but never cached.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            future = self._in_flight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._in_flight[key] = future
+
+        if not is_leader:
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._forget(key)
+            future.set_exception(e)
+            raise
+        self._forget(key)
+        future.set_result(result)
+        return result
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._in_flight
+
+    def _forget(self, key):
+        with self._lock:
+            self._in_flight.pop(key, None)
@@ -0,0 +1,123 @@
+import os
+import json
+import time
+import logging
+import functools
+
+from rdflib.plugins.sparql.parser import parseQuery
+from rdflib.plugins.sparql.algebra import translateQuery
+from rdflib.plugins.sparql.evaluate import evalQuery
+from rdflib.plugins.sparql.processor import SPARQLResult
+
+import renkuaqs.metrics as metrics
+import renkuaqs.sparql_cache as sparql_cache
+
+from renkuaqs.config import SLOW_QUERY_SECONDS_ENV, SLOW_QUERY_SECONDS_DEFAULT, SLOW_QUERY_LOG_ENV
+
+logger = logging.getLogger(__name__)
+
+
+def slow_query_seconds():
+    return float(os.environ.get(SLOW_QUERY_SECONDS_ENV, SLOW_QUERY_SECONDS_DEFAULT))
+
+
+def timed_query(graph, query_str, name, init_bindings=None, parameters=None):
+    """Evaluate a SPARQL query over a graph as graph.query does, timing its parse, translate and evaluation.
+
+    Returns the result, fully evaluated, along with the timings and the number of result rows.
+    The queries slower than the threshold are logged with their name, bindings and parameters
+    (eg the input notebook the query was built for).
+    """
+    init_bindings = init_bindings or {}
+
+    with metrics.stage("sparql"):
+        start = time.perf_counter()
+        parse_tree = parseQuery(query_str)
+        parsed = time.perf_counter()
+        # as graph.query, the prefixes bound within the graph can be used within the query
+        query = translateQuery(parse_tree, None, dict(graph.namespaces()))
+        translated = time.perf_counter()
+        result = SPARQLResult(evalQuery(graph, query, init_bindings))
+        if result.type == "SELECT":
+            # the bindings are generated lazily
+            n_rows = len(result.bindings)
+        elif result.type in ("CONSTRUCT", "DESCRIBE"):
+            n_rows = len(result.graph)
+        else:
+            n_rows = 1
+        evaluated = time.perf_counter()
+
+    stats = {
+        'name': name,
+        'parse_seconds': parsed - start,
+        'translate_seconds': translated - parsed,
+        'eval_seconds': evaluated - translated,
+        'total_seconds': evaluated - start,
+        'rows': n_rows
+    }
+
+    for phase in ('parse', 'translate', 'eval'):
+        metrics.sparql_duration_seconds.observe(stats[f'{phase}_seconds'], query=name, phase=phase)
+    metrics.sparql_result_rows.observe(n_rows, query=name)
+
+    logger.debug(f"query {name}: {n_rows} rows in {stats['total_seconds']:.3f}s "
+                 f"(parse {stats['parse_seconds']:.3f}s, translate {stats['translate_seconds']:.3f}s, "
+                 f"eval {stats['eval_seconds']:.3f}s)")
+
+    if stats['total_seconds'] >= slow_query_seconds():
+        _log_slow_query(stats, query_str, init_bindings, parameters)
+
+    return result, stats
+
+
+class LazyGraph(object):
+    """A graph built on first use, eg only when the queries run over it miss the results cache."""
+
+    def __init__(self, build_graph, *args, **kwargs):
+        self._build_graph = functools.partial(build_graph, *args, **kwargs)
+        self._graph = None
+
+    def __call__(self):
+        if self._graph is None:
+            self._graph = self._build_graph()
+        return self._graph
+
+
+def query(graph, query_str, name, init_bindings=None, parameters=None, fingerprint=None):
+    """Evaluate a SPARQL query, graph can be a LazyGraph.
+
+    With the fingerprint of the graph (see sparql_cache.graph_fingerprint), the result is looked up
+    in the results cache first, and the graph is not used on a hit.
+    """
+    cache = sparql_cache.result_cache() if fingerprint is not None else None
+    if cache is not None:
+        key = sparql_cache.result_key(fingerprint, query_str, name, init_bindings=init_bindings)
+        result = cache.get(fingerprint, key)
+        if result is not None:
+            return result
+
+    if isinstance(graph, LazyGraph):
+        graph = graph()
+    result, stats = timed_query(graph, query_str, name, init_bindings=init_bindings, parameters=parameters)
+
+    if cache is not None:
+        cache.put(fingerprint, key, result)
+    return result
+
+
+def _log_slow_query(stats, query_str, init_bindings, parameters):
+    metrics.sparql_slow_queries_total.inc(query=stats['name'])
+
+    slow_query = dict(stats,
+                      time=time.time(),
+                      init_bindings={str(k): str(v) for k, v in init_bindings.items()},
+                      parameters={str(k): str(v) for k, v in (parameters or {}).items()})
+    logger.warning(f"slow query {stats['name']}: {stats['rows']} rows in {stats['total_seconds']:.3f}s, "
+                   f"eval {stats['eval_seconds']:.3f}s, bindings {slow_query['init_bindings']}, "
+                   f"parameters {slow_query['parameters']}")
+
+    slow_query_log = os.environ.get(SLOW_QUERY_LOG_ENV)
+    if slow_query_log:
+        slow_query['query'] = query_str
+        with open(slow_query_log, "a") as slow_query_log_f:
+            slow_query_log_f.write(json.dumps(slow_query) + "\n")
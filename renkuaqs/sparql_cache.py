@@ -0,0 +1,219 @@
+import io
+import os
+import hashlib
+import threading
+import rdflib
+
+from collections import OrderedDict
+from pathlib import Path
+from importlib import metadata
+from rdflib.query import Result
+from rdflib.plugins.sparql.processor import SPARQLResult
+from git import Repo
+
+import renkuaqs.metrics as metrics
+import renkuaqs.file_utils as file_utils
+
+from renkuaqs.config import (ENTITY_METADATA_AQS_DIR, SPARQL_CACHE_MB_ENV, SPARQL_CACHE_MB_DEFAULT,
+                             SPARQL_DISK_CACHE_ENV, SPARQL_DISK_CACHE_MB_ENV, SPARQL_DISK_CACHE_MB_DEFAULT,
+                             SPARQL_DISK_CACHE_DIR)
+
+# the metadata renku builds its graph from, next to the annotations of the .aqs folder
+RENKU_METADATA_DIR = os.path.join('.renku', 'metadata')
+
+
+def _renkuaqs_version():
+    try:
+        return metadata.version("renku-aqs")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+class GraphFingerprint(object):
+    """Identifies the content of a graph built from a project, without building or hashing the graph."""
+
+    def __init__(self, project_path, digest):
+        self.project_path = str(project_path)
+        self.digest = digest
+
+    def __repr__(self):
+        return f"GraphFingerprint({self.project_path!r}, {self.digest!r})"
+
+
+def _stat_index(project_path, directory):
+    # relative path, size and modification time of the files, as git does to detect the changed files
+    index = []
+    for root, dirs, files in os.walk(os.path.join(project_path, directory)):
+        dirs.sort()
+        for file_name in sorted(files):
+            file_path = os.path.join(root, file_name)
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+            index.append(f"{os.path.relpath(file_path, project_path)}\0{stat.st_size}\0{stat.st_mtime_ns}")
+    return index
+
+
+def graph_fingerprint(project_path, revision=None, *graph_options):
+    """Fingerprint of the graph built from a project at a revision, eg with _overall_graph.
+
+    It combines the commit the revision resolves to with the size and modification time of the files
+    of the .aqs and .renku/metadata folders, which may change before being committed,
+    the graph options (eg which graph is built) and the renkuaqs version.
+    """
+    with metrics.stage("graph_fingerprint"):
+        commit_sha = Repo(project_path, search_parent_directories=True).commit(revision or "HEAD").hexsha
+
+        fingerprint = hashlib.sha256()
+        for part in [_renkuaqs_version(), commit_sha, *map(str, graph_options),
+                     *_stat_index(project_path, ENTITY_METADATA_AQS_DIR),
+                     *_stat_index(project_path, RENKU_METADATA_DIR)]:
+            fingerprint.update(part.encode())
+            fingerprint.update(b"\n")
+
+    return GraphFingerprint(project_path, fingerprint.hexdigest())
+
+
+def result_key(fingerprint, query_str, name, init_bindings=None):
+    """Key of a query result: the graph fingerprint, the query (its name and text) and the bindings."""
+    key = hashlib.sha256()
+    key.update(fingerprint.digest.encode())
+    key.update(f"\n{name}\n{hashlib.sha256(query_str.encode()).hexdigest()}\n".encode())
+    for variable, value in sorted((str(k), v.n3()) for k, v in (init_bindings or {}).items()):
+        key.update(f"{variable}={value}\n".encode())
+    return key.hexdigest()
+
+
+def dump_result(result):
+    """Serialize a result as its type, followed by the SPARQL JSON results (SELECT, ASK) or N-Triples (CONSTRUCT),
+    only the values are kept, not the graph the bindings refer to, and loading it never runs code."""
+    if result.type in ("CONSTRUCT", "DESCRIBE"):
+        content = result.graph.serialize(format="nt", encoding="utf-8")
+    else:
+        content = result.serialize(format="json")
+    return result.type.encode() + b"\n" + content
+
+
+def load_result(payload):
+    # a new result on every lookup, the callers may modify it (eg add triples to the constructed graph)
+    result_type, content = payload.split(b"\n", 1)
+    result_type = result_type.decode()
+    if result_type in ("CONSTRUCT", "DESCRIBE"):
+        graph = rdflib.Graph()
+        graph.parse(data=content.decode(), format="nt")
+        return SPARQLResult({"type_": result_type, "graph": graph})
+    return Result.parse(io.BytesIO(content), format="json")
+
+
+class SPARQLResultCache(object):
+    """Serialized query results, in an in-memory LRU bounded in size, and optionally on disk
+    within the .renku/cache folder of the project, where the least recently used files are evicted."""
+
+    def __init__(self, max_bytes, disk=False, max_disk_bytes=0):
+        self.max_bytes = max_bytes
+        self.disk = disk
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._n_bytes = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        disk = os.environ.get(SPARQL_DISK_CACHE_ENV, "0").lower() in ("1", "true", "yes")
+        return cls(int(float(os.environ.get(SPARQL_CACHE_MB_ENV, SPARQL_CACHE_MB_DEFAULT)) * 1024 ** 2),
+                   disk=disk,
+                   max_disk_bytes=int(float(os.environ.get(SPARQL_DISK_CACHE_MB_ENV,
+                                                           SPARQL_DISK_CACHE_MB_DEFAULT)) * 1024 ** 2))
+
+    def _disk_path(self, fingerprint, key):
+        return Path(fingerprint.project_path, SPARQL_DISK_CACHE_DIR, f"{key}.result")
+
+    def get(self, fingerprint, key):
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+        metrics.cache_lookup("sparql_memory", payload is not None)
+
+        if payload is None and self.disk:
+            disk_path = self._disk_path(fingerprint, key)
+            try:
+                payload = disk_path.read_bytes()
+                # the modification time orders the files for the eviction
+                os.utime(disk_path)
+            except FileNotFoundError:
+                pass
+            metrics.cache_lookup("sparql_disk", payload is not None)
+            if payload is not None:
+                self._put_memory(key, payload)
+
+        return None if payload is None else load_result(payload)
+
+    def put(self, fingerprint, key, result):
+        payload = dump_result(result)
+        self._put_memory(key, payload)
+        if self.disk:
+            disk_path = self._disk_path(fingerprint, key)
+            file_utils.write_file_atomically(disk_path, payload)
+            self._evict_disk(disk_path.parent)
+
+    def _put_memory(self, key, payload):
+        if len(payload) > self.max_bytes:
+            return
+        with self._lock:
+            previous_payload = self._entries.pop(key, None)
+            if previous_payload is not None:
+                self._n_bytes -= len(previous_payload)
+            self._entries[key] = payload
+            self._n_bytes += len(payload)
+            while self._n_bytes > self.max_bytes:
+                evicted_key, evicted_payload = self._entries.popitem(last=False)
+                self._n_bytes -= len(evicted_payload)
+
+    def _evict_disk(self, cache_dir):
+        cache_files = []
+        for cache_file in cache_dir.glob("*.result"):
+            try:
+                stat = cache_file.stat()
+            except FileNotFoundError:
+                continue
+            cache_files.append((stat.st_mtime_ns, stat.st_size, cache_file))
+
+        n_bytes = sum(size for mtime, size, cache_file in cache_files)
+        for mtime, size, cache_file in sorted(cache_files, key=lambda f: f[0]):
+            if n_bytes <= self.max_disk_bytes:
+                break
+            try:
+                cache_file.unlink()
+            except FileNotFoundError:
+                pass
+            n_bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._n_bytes = 0
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def result_cache():
+    """The cache shared by the queries of the process, configured from the environment on first use,
+    None when disabled."""
+    global _result_cache
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = SPARQLResultCache.from_env()
+        cache = _result_cache
+    if cache.max_bytes <= 0 and not cache.disk:
+        return None
+    return cache
+
+
+def set_result_cache(cache):
+    global _result_cache
+    with _result_cache_lock:
+        _result_cache = cache
@@ -0,0 +1,165 @@
+import os
+import sys
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+import importlib.util
+import urllib.request
+
+__this_dir__ = os.path.join(os.path.abspath(os.path.dirname(__file__)))
+
+STATIC_DIR = os.path.join(__this_dir__, "static")
+STATIC_URL_PREFIX = "renkuaqs-static"
+
+with open(os.path.join(STATIC_DIR, "static_assets.json")) as static_assets_fn_f:
+    static_assets_config = json.load(static_assets_fn_f)
+
+_asset_hashes = {}
+# the assets already reported as loaded from their CDN
+_cdn_assets = set()
+
+
+def asset_path(name):
+    """Return the path of the locally available copy of an asset, None if it was not vendored."""
+    asset_config = static_assets_config.get(name)
+    if asset_config is None:
+        return None
+
+    path = os.path.join(STATIC_DIR, name)
+    if os.path.exists(path):
+        return path
+
+    if 'package' in asset_config:
+        # locate the package without importing it
+        package_spec = importlib.util.find_spec(asset_config['package'])
+        if package_spec is None or not package_spec.submodule_search_locations:
+            return None
+        path = os.path.join(package_spec.submodule_search_locations[0], asset_config['path'])
+        if os.path.exists(path):
+            return path
+
+    return None
+
+
+def asset_hash(name):
+    if name not in _asset_hashes:
+        path = asset_path(name)
+        if path is None:
+            return None
+        with open(path, "rb") as asset_f:
+            _asset_hashes[name] = hashlib.sha256(asset_f.read()).hexdigest()[:12]
+    return _asset_hashes[name]
+
+
+def asset_url(name):
+    """Content-hashed relative url of the asset, or its upstream url if no local copy is available."""
+    content_hash = asset_hash(name)
+    if content_hash is not None:
+        return f"{STATIC_URL_PREFIX}/{content_hash}/{name}"
+    if name not in _cdn_assets:
+        _cdn_assets.add(name)
+        logging.warning(f"The asset {name} is not available within the package, it is loaded from its CDN "
+                        f"(fetch it with: python -m renkuaqs.static_assets)")
+    return static_assets_config[name].get('url', name)
+
+
+def asset_name_from_url(url):
+    for name, asset_config in static_assets_config.items():
+        if asset_config.get('url') == url or name == url:
+            return name
+    return None
+
+
+def resolve(url_path):
+    """Resolve a static/<hash>/<name> url path to a local file, None if unknown or the hash is stale.
+
+    The files an asset refers to relatively (eg the fonts of a stylesheet) are served
+    under the hash of the asset referring to them.
+    """
+    parts = url_path.lstrip("/").split("/", 2)
+    if len(parts) != 3 or parts[0] != STATIC_URL_PREFIX:
+        return None
+    content_hash, name = parts[1], parts[2]
+    for asset_name, asset_config in static_assets_config.items():
+        if asset_hash(asset_name) == content_hash and \
+                (name == asset_name or name in asset_config.get('depends', [])):
+            return asset_path(name)
+    return None
+
+
+def copy_assets(destination_dir):
+    """Copy the locally available assets next to a generated html file, under their content-hashed urls."""
+    for name, asset_config in static_assets_config.items():
+        content_hash = asset_hash(name)
+        if content_hash is None:
+            continue
+        for file_name in [name] + asset_config.get('depends', []):
+            path = asset_path(file_name)
+            destination_path = os.path.join(destination_dir, STATIC_URL_PREFIX, content_hash, file_name)
+            if path is not None and not os.path.exists(destination_path):
+                os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+                shutil.copy(path, destination_path)
+
+
+def fetch_assets(force=False):
+    """Download the assets that are not provided by another package into renkuaqs/static, eg before a release.
+
+    Only the assets whose sha256 is recorded within static_assets.json are fetched, and a download not matching
+    it fails, so that the package never vendors an asset that changed upstream.
+    """
+    for name, asset_config in static_assets_config.items():
+        if 'package' in asset_config or 'url' not in asset_config:
+            continue
+        path = os.path.join(STATIC_DIR, name)
+        if os.path.exists(path) and not force:
+            continue
+        if asset_config.get('sha256') is None:
+            logging.warning(f"No sha256 is recorded for the asset {name}, it is not fetched "
+                            f"(record it with: python -m renkuaqs.static_assets --pin)")
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        logging.info(f"Fetching {asset_config['url']} into {path}")
+        # an interrupted or mismatching download does not leave an asset behind
+        try:
+            content_sha256 = _download(asset_config['url'], path + ".part")
+            if content_sha256 != asset_config['sha256']:
+                raise ValueError(f"The sha256 of {asset_config['url']} is {content_sha256}, "
+                                 f"{asset_config['sha256']} is expected")
+            os.replace(path + ".part", path)
+        finally:
+            if os.path.exists(path + ".part"):
+                os.remove(path + ".part")
+        _asset_hashes.pop(name, None)
+
+
+def pin_assets(config_path=os.path.join(STATIC_DIR, "static_assets.json")):
+    """Record within static_assets.json the sha256 of the assets at their pinned urls, eg when their versions change."""
+    for name, asset_config in static_assets_config.items():
+        if 'package' in asset_config or 'url' not in asset_config:
+            continue
+        with tempfile.TemporaryDirectory() as download_dir:
+            asset_config['sha256'] = _download(asset_config['url'], os.path.join(download_dir, "asset"))
+        logging.info(f"Pinned {name} to the sha256 {asset_config['sha256']}")
+    with open(config_path, "w") as config_f:
+        json.dump(static_assets_config, config_f, indent=2)
+        config_f.write("\n")
+
+
+def _download(url, path):
+    # the sha256 of the downloaded content
+    content_hash = hashlib.sha256()
+    with urllib.request.urlopen(url) as response, open(path, "wb") as asset_f:
+        for chunk in iter(lambda: response.read(1024 * 1024), b""):
+            content_hash.update(chunk)
+            asset_f.write(chunk)
+    return content_hash.hexdigest()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level="INFO")
+    if "--pin" in sys.argv[1:]:
+        pin_assets()
+    else:
+        fetch_assets()
@@ -16,7 +16,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+import importlib.util
+
 from setuptools import find_packages, setup
+from setuptools.command.build_py import build_py
+from setuptools.command.sdist import sdist
+from setuptools.command.develop import develop
+
 
 install_requires = [
     'deepdiff',
@@ -32,6 +39,41 @@ install_requires = [
     'lockfile'
 ]
 
+# the javascript and css assets of the interactive graph are vendored within the package at build time,
+# also by the editable installs, RENKUAQS_SKIP_FETCH_ASSETS=1 builds without them (eg offline),
+# they are then loaded from their CDN
+SKIP_FETCH_ASSETS_ENV = 'RENKUAQS_SKIP_FETCH_ASSETS'
+
+
+def fetch_static_assets():
+    if os.environ.get(SKIP_FETCH_ASSETS_ENV):
+        return
+    # renkuaqs/__init__.py requires the dependencies of the package, static_assets.py only the standard library
+    spec = importlib.util.spec_from_file_location(
+        'static_assets', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'renkuaqs', 'static_assets.py'))
+    static_assets = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(static_assets)
+    static_assets.fetch_assets()
+
+
+class BuildPyWithAssets(build_py):
+    def run(self):
+        fetch_static_assets()
+        super().run()
+
+
+class SdistWithAssets(sdist):
+    def run(self):
+        fetch_static_assets()
+        super().run()
+
+
+class DevelopWithAssets(develop):
+    def run(self):
+        fetch_static_assets()
+        super().run()
+
+
 packages = find_packages()
 version_file = open('VERSION')
 
@@ -43,7 +85,16 @@ setup(
     author='Gabriele Barni, Volodymyr Savchenko',
     author_email='',
     install_requires=install_requires,
+    extras_require={
+        'zstd': ['zstandard'],
+        'test': ['pytest', 'pytest-benchmark']
+    },
     packages=packages,
+    cmdclass={
+        'build_py': BuildPyWithAssets,
+        'sdist': SdistWithAssets,
+        'develop': DevelopWithAssets
+    },
     entry_points={
         "renku": ["name_of_plugin = renkuaqs.plugin"],
         "renku.cli_plugins": ["aqs = renkuaqs.plugin:aqs"],
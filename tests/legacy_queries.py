@@ -0,0 +1,270 @@
+# the queries as they were before the removal of the unconstrained ?run ?p ?o patterns,
+# the reference of the equivalence tests of the optimised queries
+
+
+def legacy_build_query_where(input_notebook: str = None, no_oda_info=False):
+    if input_notebook is not None:
+        query_where = f"""WHERE {{
+            {{
+                ?entityInput a <http://www.w3.org/ns/prov#Entity> ;
+                    <http://www.w3.org/ns/prov#atLocation> ?entityInputLocation .
+                        
+                ?entityOutput a <http://www.w3.org/ns/prov#Entity> ; 
+                    <http://www.w3.org/ns/prov#qualifiedGeneration>/<http://www.w3.org/ns/prov#activity> ?activity ;
+                    <http://www.w3.org/ns/prov#atLocation> ?entityOutputLocation . 
+                        
+                FILTER ( ?entityInputLocation = '{input_notebook}' ) .
+                    
+        """
+    else:
+        query_where = """WHERE {
+            {
+                ?entityInput a <http://www.w3.org/ns/prov#Entity> ;
+                    <http://www.w3.org/ns/prov#atLocation> ?entityInputLocation .
+                    
+                ?entityOutput a <http://www.w3.org/ns/prov#Entity> ; 
+                    <http://www.w3.org/ns/prov#qualifiedGeneration>/<http://www.w3.org/ns/prov#activity> ?activity ;
+                    <http://www.w3.org/ns/prov#atLocation> ?entityOutputLocation . 
+                    
+        """
+
+    query_where += """
+                OPTIONAL { ?actionParam <https://swissdatasciencecenter.github.io/renku-ontology#position> ?actionPosition } .
+            }
+            {    
+                ?activity a ?activityType ;
+                    <https://swissdatasciencecenter.github.io/renku-ontology#parameter> ?parameter_value ;
+                    <http://www.w3.org/ns/prov#startedAtTime> ?activityTime ;
+                    <http://www.w3.org/ns/prov#qualifiedAssociation>/<http://www.w3.org/ns/prov#hadPlan>/<https://swissdatasciencecenter.github.io/renku-ontology#command> ?actionCommand ;
+                    <http://www.w3.org/ns/prov#qualifiedUsage>/<http://www.w3.org/ns/prov#entity> ?entityInput .
+                    
+            """
+                    # <http://www.w3.org/ns/prov#qualifiedAssociation>/<http://www.w3.org/ns/prov#hadPlan> ?action ;
+    if not no_oda_info:
+        query_where += """
+            OPTIONAL {
+                {
+                    ?run <http://odahub.io/ontology#isUsing> ?aq_module ;
+                         <http://odahub.io/ontology#isRequestingAstroObject> ?a_object ;
+                         a ?run_rdf_type ;
+                         ^oa:hasBody/oa:hasTarget ?runId ;
+                         ^oa:hasBody/oa:hasTarget ?activity .
+                
+                    ?aq_module <http://purl.org/dc/terms/title> ?aq_module_name ;
+                        a ?aq_mod_rdf_type .
+
+                    ?a_object <http://purl.org/dc/terms/title> ?a_object_name ;
+                        a ?a_obj_rdf_type .
+
+                    OPTIONAL {{ ?run <http://purl.org/dc/terms/title> ?run_title . }}
+
+                    ?run ?p ?o .
+
+                    FILTER (!CONTAINS(str(?a_object), " ")) .
+                }
+                UNION
+                {
+                    ?run <http://odahub.io/ontology#isUsing> ?aq_module ;
+                         <http://odahub.io/ontology#isRequestingAstroRegion> ?a_region ;
+                         a ?run_rdf_type ;
+                         ^oa:hasBody/oa:hasTarget ?runId ;
+                         ^oa:hasBody/oa:hasTarget ?activity .
+
+                    ?aq_module a ?aq_mod_rdf_type ;
+                        <http://purl.org/dc/terms/title> ?aq_module_name .
+
+                    ?a_region a ?a_region_type ; 
+                        <http://purl.org/dc/terms/title> ?a_region_name ;
+                        <http://odahub.io/ontology#isUsingSkyCoordinates> ?a_sky_coordinates ;
+                        <http://odahub.io/ontology#isUsingRadius> ?a_radius .
+
+                    ?a_sky_coordinates a ?a_sky_coordinates_type ;
+                        <http://purl.org/dc/terms/title> ?a_sky_coordinates_name .
+
+                    ?a_radius a ?a_radius_type ;
+                        <http://purl.org/dc/terms/title> ?a_radius_name .
+
+                    OPTIONAL {{ ?run <http://purl.org/dc/terms/title> ?run_title . }}
+
+                    ?run ?p ?o .
+                }
+                UNION
+                {
+                    ?run <http://odahub.io/ontology#isUsing> ?aq_module ;
+                         <http://odahub.io/ontology#isRequestingAstroImage> ?a_image ;
+                         a ?run_rdf_type ;
+                         ^oa:hasBody/oa:hasTarget ?runId ;
+                         ^oa:hasBody/oa:hasTarget ?activity .
+
+                    ?aq_module a ?aq_mod_rdf_type ;
+                        <http://purl.org/dc/terms/title> ?aq_module_name .
+
+                    ?a_image a ?a_image_type ;
+                        <http://purl.org/dc/terms/title> ?a_image_name ;
+
+                    OPTIONAL {{ ?a_image <http://odahub.io/ontology#isUsingCoordinates> ?a_coordinates .
+                         ?a_coordinates a ?a_coordinates_type ;
+                             <http://purl.org/dc/terms/title> ?a_coordinates_name .
+                    }}
+                    OPTIONAL {{ ?a_image <http://odahub.io/ontology#isUsingPosition> ?a_position .
+                         ?a_position a ?a_position_type ;
+                             <http://purl.org/dc/terms/title> ?a_position_name .
+                    }}
+                    OPTIONAL {{ ?a_image <http://odahub.io/ontology#isUsingRadius> ?a_radius .
+                        ?a_radius a ?a_radius_type ;
+                            <http://purl.org/dc/terms/title> ?a_radius_name .
+                    }}
+                    OPTIONAL {{ ?a_image <http://odahub.io/ontology#isUsingPixels> ?a_pixels .
+                        ?a_pixels a ?a_pixels_type ;
+                            <http://purl.org/dc/terms/title> ?a_pixels_name .
+                    }}
+                    OPTIONAL {{ ?a_image <http://odahub.io/ontology#isUsingImageBand> ?a_image_band .
+                        ?a_image_band a ?a_image_band_type ;
+                            <http://purl.org/dc/terms/title> ?a_image_band_name .
+                    }}
+
+                    OPTIONAL {{ ?run <http://purl.org/dc/terms/title> ?run_title . }}
+
+                    ?run ?p ?o .
+                }
+            }
+                """
+
+    query_where += """
+        }
+    }
+    """
+    return query_where
+
+
+LEGACY_PARAMS_QUERY_WHERE = {
+    "object": """WHERE {{
+        ?run <http://odahub.io/ontology#isUsing> ?aq_module ;
+             <http://odahub.io/ontology#isRequestingAstroObject> ?a_object ;
+             ^oa:hasBody/oa:hasTarget ?runId .
+        
+        OPTIONAL {{ ?run <http://purl.org/dc/terms/title> ?run_title . }}
+
+        ?a_object <http://purl.org/dc/terms/title> ?a_object_name .
+        
+        ?aq_module <http://purl.org/dc/terms/title> ?aq_module_name .
+
+        ?run ?p ?o .
+
+        }}""",
+    "region": """WHERE {{
+        ?run <http://odahub.io/ontology#isUsing> ?aq_module ;
+             <http://odahub.io/ontology#isRequestingAstroRegion> ?a_region ;
+             ^oa:hasBody/oa:hasTarget ?runId .
+        
+        OPTIONAL {{ ?run <http://purl.org/dc/terms/title> ?run_title . }}
+
+        ?a_region <http://purl.org/dc/terms/title> ?a_region_name .
+        
+        ?aq_module <http://purl.org/dc/terms/title> ?aq_module_name .
+
+        ?run ?p ?o .
+    }}""",
+    "image": """WHERE {{
+        ?run <http://odahub.io/ontology#isUsing> ?aq_module ;
+             <http://odahub.io/ontology#isRequestingAstroImage> ?a_image ;
+             ^oa:hasBody/oa:hasTarget ?runId .
+
+        OPTIONAL {{ ?run <http://purl.org/dc/terms/title> ?run_title . }}
+
+        ?a_image <http://purl.org/dc/terms/title> ?a_image_name .
+
+        ?aq_module <http://purl.org/dc/terms/title> ?aq_module_name .
+
+        ?run ?p ?o .
+    }}""",
+}
+
+LEGACY_PARAMS_SELECT = {
+    "object": "SELECT DISTINCT ?run ?runId ?a_object ?a_object_name ?aq_module ?aq_module_name",
+    "region": "SELECT DISTINCT ?run ?runId ?a_region ?a_region_name ?aq_module ?aq_module_name",
+    "image": "SELECT DISTINCT ?run ?runId ?a_image ?a_image_name ?aq_module ?aq_module_name",
+}
+
+LEGACY_PARAMS_CONSTRUCT_QUERY_WHERE = """WHERE {{
+            {
+                ?run <http://odahub.io/ontology#isUsing> ?aq_module ;
+                     <http://odahub.io/ontology#isRequestingAstroObject> ?a_object ;
+                     ^oa:hasBody/oa:hasTarget ?runId .
+                 
+                ?a_object <http://purl.org/dc/terms/title> ?a_object_name .
+                
+                ?aq_module <http://purl.org/dc/terms/title> ?aq_module_name .
+                
+                OPTIONAL {{ ?run <http://purl.org/dc/terms/title> ?run_title . }}
+                
+                ?run ?p ?o .
+
+                FILTER (!CONTAINS(str(?a_object), " ")) .
+            
+            }
+            UNION
+            {
+                ?run <http://odahub.io/ontology#isUsing> ?aq_module ;
+                     <http://odahub.io/ontology#isRequestingAstroRegion> ?a_region ;
+                     ^oa:hasBody/oa:hasTarget ?runId .
+                
+                ?a_region a ?a_region_type ; 
+                    <http://purl.org/dc/terms/title> ?a_region_name ;
+                    <http://odahub.io/ontology#isUsingSkyCoordinates> ?a_sky_coordinates ;
+                    <http://odahub.io/ontology#isUsingRadius> ?a_radius .
+                
+                ?aq_module <http://purl.org/dc/terms/title> ?aq_module_name .
+
+                OPTIONAL {{ ?run <http://purl.org/dc/terms/title> ?run_title . }}
+                
+                ?run ?p ?o .
+            }
+            UNION
+            {
+                ?run <http://odahub.io/ontology#isUsing> ?aq_module ;
+                     <http://odahub.io/ontology#isRequestingAstroImage> ?a_image ;
+                     ^oa:hasBody/oa:hasTarget ?runId .
+
+                ?aq_module <http://purl.org/dc/terms/title> ?aq_module_name .
+
+                ?a_image a ?a_image_type ;
+                        <http://purl.org/dc/terms/title> ?a_image_name .
+
+                OPTIONAL {{ ?a_image <http://odahub.io/ontology#isUsingCoordinates> ?a_coordinates . }}
+                OPTIONAL {{ ?a_image <http://odahub.io/ontology#isUsingPosition> ?a_position . }}
+                OPTIONAL {{ ?a_image <http://odahub.io/ontology#isUsingRadius> ?a_radius . }}
+                OPTIONAL {{ ?a_image <http://odahub.io/ontology#isUsingPixels> ?a_pixels . }}
+                OPTIONAL {{ ?a_image <http://odahub.io/ontology#isUsingImageBand> ?a_image_band . }}
+
+                OPTIONAL {{ ?run <http://purl.org/dc/terms/title> ?run_title . }}
+
+                ?run ?p ?o .
+            }
+            }}"""
+
+LEGACY_PARAMS_CONSTRUCT = """
+        CONSTRUCT {
+            ?run <http://odahub.io/ontology#isRequestingAstroObject> ?a_object .
+            ?run <http://odahub.io/ontology#isRequestingAstroRegion> ?a_region .
+            ?run <http://odahub.io/ontology#isRequestingAstroImage> ?a_image .
+            ?run <http://purl.org/dc/terms/title> ?run_title .
+            ?run <http://odahub.io/ontology#isUsing> ?aq_module .
+            ?run ?p ?o .
+            
+            ?a_region a ?a_region_type ; 
+                <http://purl.org/dc/terms/title> ?a_region_name ;
+                <http://odahub.io/ontology#isUsingSkyCoordinates> ?a_sky_coordinates ;
+                <http://odahub.io/ontology#isUsingRadius> ?a_radius .
+                
+            ?a_image a ?a_image_type ;
+                <http://purl.org/dc/terms/title> ?a_image_name ;
+                <http://odahub.io/ontology#isUsingCoordinates> ?a_coordinates ;
+                <http://odahub.io/ontology#isUsingPosition> ?a_position ;
+                <http://odahub.io/ontology#isUsingRadius> ?a_radius ;
+                <http://odahub.io/ontology#isUsingPixels> ?a_pixels ;
+                <http://odahub.io/ontology#isUsingImageBand> ?a_image_band .
+        }
+"""
+
+LEGACY_ODA_SUBSET_QUERY_WHERE = "{\n\tOPTIONAL { ?parameter_binding_ontology_class a <http://www.w3.org/2002/07/owl#Class> . }\n\tOPTIONAL { ?parameter_binding_ontology_class <http://www.w3.org/2000/01/rdf-schema#subClassOf> ?parameter_binding_ontology_parent_class . }\n\tOPTIONAL { ?parameter_binding_ontology_class <http://www.w3.org/2000/01/rdf-schema#label> ?parameter_binding_ontology_class_label . }\n\t\n\tBIND(STRAFTER(STR(?parameter_binding_ontology_class), \"#\") AS ?parameter_binding_ontology_class_extracted_label) .\n}\nUNION\n{\t\n\t?workflow_input <http://odahub.io/ontology#expects> ?parameter_binding_input ;\n\t\t<http://odahub.io/ontology#entity_checksum> ?entityInputChecksum ;\n\t\ta <http://odahub.io/ontology#workflow> .\n\n\t?parameter_binding_input a ?parameter_binding_input_type .\n\t\n\tOPTIONAL\n\t{ \n\t\t?parameter_binding_input a ?parameter_binding_ontology_input_type . \n\t\t?parameter_binding_ontology_input_type a <http://www.w3.org/2002/07/owl#Class> .\n\t}\n\t\n\tBIND(STRAFTER(STR(?parameter_binding_input), \"#\") AS ?parameter_binding_input_name) .\n\t\n\t\n\tOPTIONAL { ?parameter_binding_input <http://odahub.io/ontology#value> ?parameter_binding_input_value . }\n}\nUNION\n{\t\n\t?workflow_output <http://odahub.io/ontology#expects> ?parameter_binding_output ;\n\t\t<http://odahub.io/ontology#outputs> ?output_binding_output ;\n\t\t<http://odahub.io/ontology#entity_checksum> ?entityOutputChecksum ;\n\t\ta <http://odahub.io/ontology#workflow> .\n\n\t?parameter_binding_output a ?parameter_binding_output_type .\n\t\n\tOPTIONAL\n\t{\n\t\t?parameter_binding_output a ?parameter_binding_ontology_output_type . \n\t\t?parameter_binding_ontology_output_type a <http://www.w3.org/2002/07/owl#Class> .\n\t}\n\t\n\t\n\t?output_binding_output a ?output_binding_output_type .\n\t\n\tOPTIONAL\n\t{\n\t\t?output_binding_output a ?output_binding_ontology_output_type .\n\t\t?output_binding_ontology_output_type a <http://www.w3.org/2002/07/owl#Class> .\n\t}\n\t\n\tBIND(STRAFTER(STR(?parameter_binding_output), \"#\") AS ?parameter_binding_output_name) .\n\tBIND(STRAFTER(STR(?output_binding_output), \"#\") AS ?output_binding_output_name) .\n\t\n\tOPTIONAL { ?parameter_binding_equivalent_output_type <http://www.w3.org/2000/01/rdf-schema#equivalentClass> ?parameter_binding_output_type . }\n\tOPTIONAL { ?parameter_binding_output <http://odahub.io/ontology#value> ?parameter_binding_output_value . }\n}\nUNION\n{\t\n\t?run <http://odahub.io/ontology#isUsing> ?aq_module ;\n\t    <http://odahub.io/ontology#isRequestingAstroObject> ?a_object ;\n\t    a ?run_rdf_type ;\n\t    ^<http://www.w3.org/ns/oa#hasBody>/<http://www.w3.org/ns/oa#hasTarget> ?activity .\n\n        ?aq_module <http://purl.org/dc/terms/title> ?aq_module_name ;\n\t    a ?aq_mod_rdf_type .\n\n\t?a_object <http://purl.org/dc/terms/title> ?a_object_name ;\n           a ?a_obj_rdf_type .\n\n\tOPTIONAL { ?run <http://purl.org/dc/terms/title> ?run_title . } .\n\n\t?run ?p ?o .\n\n\tFILTER(!REGEX(STR(?a_object), \"\\\\s\")) .\n\t\n\tOPTIONAL {\n\t  ?aq_type a <http://www.w3.org/2002/07/owl#Class> .\n\t  FILTER (?aq_type IN (?aq_mod_rdf_type, ?a_obj_rdf_type))\n\t}\n}\nUNION\n{\n\t?run <http://odahub.io/ontology#isUsing> ?aq_module ;\n\t    <http://odahub.io/ontology#isRequestingAstroRegion> ?a_region ;\n\t    a ?run_rdf_type ;\n\t    ^<http://www.w3.org/ns/oa#hasBody>/<http://www.w3.org/ns/oa#hasTarget> ?activity .\n\n\t?aq_module a ?aq_mod_rdf_type ;\n\t    <http://purl.org/dc/terms/title> ?aq_module_name .\n\n\t?a_region a ?a_region_type ; \n\t    <http://purl.org/dc/terms/title> ?a_region_name ;\n\t    <http://odahub.io/ontology#isUsingSkyCoordinates> ?a_sky_coordinates ;\n\t    <http://odahub.io/ontology#isUsingRadius> ?a_radius .\n\n\t?a_sky_coordinates a ?a_sky_coordinates_type ;\n\t    <http://purl.org/dc/terms/title> ?a_sky_coordinates_name .\n\n\t?a_radius a ?a_radius_type ;\n\t    <http://purl.org/dc/terms/title> ?a_radius_name .\n\n\tOPTIONAL { ?run <http://purl.org/dc/terms/title> ?run_title . } .\n\n\t?run ?p ?o .\n\t\n\tOPTIONAL {\n\t  ?aq_type a <http://www.w3.org/2002/07/owl#Class> .\n\t  FILTER (?aq_type IN (?aq_mod_rdf_type, ?a_region_type, ?a_sky_coordinates_type, ?a_radius_type))\n\t}\n\t\t\n}\nUNION\n{\n\t?run <http://odahub.io/ontology#isUsing> ?aq_module ;\n\t    <http://odahub.io/ontology#isRequestingAstroImage> ?a_image ;\n\t    a ?run_rdf_type ;\n\t    ^<http://www.w3.org/ns/oa#hasBody>/<http://www.w3.org/ns/oa#hasTarget> ?activity .\n\n\t?aq_module a ?aq_mod_rdf_type ;\n\t    <http://purl.org/dc/terms/title> ?aq_module_name .\n\n\t?a_image a ?a_image_type ;\n\t    <http://purl.org/dc/terms/title> ?a_image_name ;\n\n\tOPTIONAL { ?a_image <http://odahub.io/ontology#isUsingCoordinates> ?a_coordinates .\n\t    ?a_coordinates a ?a_coordinates_type ;\n\t\t<http://purl.org/dc/terms/title> ?a_coordinates_name .\n\t}\n\tOPTIONAL { ?a_image <http://odahub.io/ontology#isUsingPosition> ?a_position .\n\t    ?a_position a ?a_position_type ;\n\t\t<http://purl.org/dc/terms/title> ?a_position_name .\n\t}\n\tOPTIONAL { ?a_image <http://odahub.io/ontology#isUsingRadius> ?a_radius .\n\t    ?a_radius a ?a_radius_type ;\n\t\t<http://purl.org/dc/terms/title> ?a_radius_name .\n\t}\n\tOPTIONAL { ?a_image <http://odahub.io/ontology#isUsingPixels> ?a_pixels .\n\t    ?a_pixels a ?a_pixels_type ;\n\t\t<http://purl.org/dc/terms/title> ?a_pixels_name .\n\t}\n\tOPTIONAL { ?a_image <http://odahub.io/ontology#isUsingImageBand> ?a_image_band .\n\t    ?a_image_band a ?a_image_band_type ;\n\t\t<http://purl.org/dc/terms/title> ?a_image_band_name .\n\t}\n\n\tOPTIONAL { ?run <http://purl.org/dc/terms/title> ?run_title . } .\n\n\t?run ?p ?o .\n\t\n\tOPTIONAL {\n\t  ?aq_type a <http://www.w3.org/2002/07/owl#Class> .\n\t  FILTER (?aq_type IN (?a_coordinates_type, ?a_position_type, ?a_radius_type, ?a_pixels_type, ?a_image_band_type))\n\t}\n\t\n}"
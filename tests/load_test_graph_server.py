@@ -0,0 +1,284 @@
+"""Load test of the interactive graph server against a synthetic project.
+
+The server (renkuaqs._start_graph_http_server) is started in a separate process, with stand-ins
+for the renku graph export and the ontology, and the endpoints are requested with a given concurrency and mix:
+
+    python tests/load_test_graph_server.py --scale medium --concurrency 8 --requests 200 \\
+        --mix /graph_version=10,/ttl_graph=5,/=1 --build-workers 2 --json load_test.json
+
+The cold run is the first run against a freshly started server, with empty caches,
+the warm run repeats the same requests against the same server.
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+__this_dir__ = os.path.join(os.path.abspath(os.path.dirname(__file__)))
+# as the tests, runs against the source tree
+sys.path[:0] = [os.path.dirname(__this_dir__), __this_dir__]
+
+import synthetic_project
+
+SYNTHETIC_GRAPH_ENV = "RENKUAQS_SYNTHETIC_GRAPH"
+
+DEFAULT_MIX = "/graph_version=10,/ttl_graph=5,/=1"
+
+
+def _install_stand_ins():
+    # replaces the renku graph export and the ontology fetch, within the server and its build workers
+    import rdflib
+    import renkuaqs.graph_utils as graph_utils
+
+    renku_graph_path = os.environ[SYNTHETIC_GRAPH_ENV]
+
+    def _renku_graph(revision=None, paths=None):
+        graph = rdflib.Graph()
+        graph.parse(renku_graph_path, format="nt")
+        graph.bind("oa", synthetic_project.OA)
+        return graph
+
+    graph_utils._renku_graph = _renku_graph
+    graph_utils._nodes_subset_ontologies_graph = synthetic_project.ontology_graph
+
+
+def _init_worker(paths):
+    import renkuaqs.graph_build_pool as graph_build_pool
+
+    # within the worker process graph_build_pool._init_worker is the original initializer
+    graph_build_pool._init_worker(paths)
+    _install_stand_ins()
+
+
+def serve(project_dir, port, build_workers):
+    from renku.domain_model.project_context import project_context
+    import renkuaqs
+    import renkuaqs.graph_build_pool as graph_build_pool
+
+    _install_stand_ins()
+    graph_build_pool._init_worker = _init_worker
+
+    os.chdir(project_dir)
+    project_context.push_path(project_dir)
+    renkuaqs._start_graph_http_server(project_dir, str(port), "--build-workers", str(build_workers))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+class GraphServerProcess(object):
+
+    def __init__(self, project_dir, renku_graph_path, build_workers, log_path):
+        self.project_dir = project_dir
+        self.renku_graph_path = renku_graph_path
+        self.build_workers = build_workers
+        self.log_path = log_path
+        self.port = _free_port()
+        self.process = None
+
+    @property
+    def url(self):
+        return f"http://localhost:{self.port}"
+
+    def __enter__(self):
+        env = dict(os.environ, **{SYNTHETIC_GRAPH_ENV: str(self.renku_graph_path),
+                                  # empty caches for each server, ie for each cold run
+                                  "RENKUAQS_CACHE_DIR": tempfile.mkdtemp(prefix="renkuaqs-cache-")})
+        self.log_f = open(self.log_path, "a")
+        self.process = subprocess.Popen([sys.executable, __file__, "--serve", str(self.project_dir),
+                                         "--port", str(self.port), "--build-workers", str(self.build_workers)],
+                                        env=env, stdout=self.log_f, stderr=subprocess.STDOUT)
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                urllib.request.urlopen(self.url + "/graph_version", timeout=5).read()
+                return self
+            except (urllib.error.URLError, ConnectionError):
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError(f"the graph server did not start, see {self.log_path}")
+                time.sleep(0.2)
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.log_f.close()
+
+
+def parse_mix(mix):
+    endpoints, weights = [], []
+    for item in mix.split(","):
+        endpoint, weight = item.rsplit("=", 1)
+        endpoints.append(endpoint)
+        weights.append(float(weight))
+    return endpoints, weights
+
+
+# keys of the JSON responses of the endpoints, at least one of each tuple is expected
+JSON_RESPONSE_KEYS = {
+    '/ttl_graph': (('graph_version',), ('graph_ttl_content', 'added_triples')),
+    '/subgraph': (('nodes',), ('edges',)),
+    '/subsets': (('graph_version',), ('subsets', 'triples')),
+}
+
+
+def valid_response(endpoint, body):
+    """Whether the body is the one expected from the endpoint, rather than eg an error page sent with a 200."""
+    endpoint = urllib.parse.urlparse(endpoint).path
+    if endpoint == '/':
+        return b"<html" in body and b"Error while generating the output graph" not in body
+    if endpoint == '/metrics':
+        return b"# TYPE " in body
+    if endpoint in JSON_RESPONSE_KEYS:
+        try:
+            response_obj = json.loads(body)
+        except ValueError:
+            return False
+        return all(any(key in response_obj for key in keys) for keys in JSON_RESPONSE_KEYS[endpoint])
+    return len(body) > 0
+
+
+def _request(url):
+    start = time.perf_counter()
+    body = b""
+    try:
+        with urllib.request.urlopen(url, timeout=600) as response:
+            body = response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (urllib.error.URLError, ConnectionError):
+        status = None
+    return status, body, time.perf_counter() - start
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100. * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, wall_seconds):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'throughput_rps': (len(latencies) + errors) / wall_seconds if wall_seconds > 0 else None,
+        'mean_ms': 1e3 * sum(latencies) / len(latencies) if latencies else None,
+        'p50_ms': 1e3 * percentile(latencies, 50) if latencies else None,
+        'p95_ms': 1e3 * percentile(latencies, 95) if latencies else None,
+        'p99_ms': 1e3 * percentile(latencies, 99) if latencies else None,
+        'max_ms': 1e3 * latencies[-1] if latencies else None,
+    }
+
+
+def run_load(base_url, endpoints, concurrency):
+    """Request the endpoints with the given concurrency, return the summary overall and per endpoint."""
+    results = {endpoint: ([], [0]) for endpoint in set(endpoints)}
+    lock = threading.Lock()
+
+    def _do(endpoint):
+        status, body, latency = _request(base_url + endpoint)
+        with lock:
+            if status == 200 and valid_response(endpoint, body):
+                results[endpoint][0].append(latency)
+            else:
+                results[endpoint][1][0] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(_do, endpoints))
+    wall_seconds = time.perf_counter() - start
+
+    return {
+        'wall_seconds': wall_seconds,
+        'overall': summarize([latency for latencies, errors in results.values() for latency in latencies],
+                             sum(errors[0] for latencies, errors in results.values()),
+                             wall_seconds),
+        'endpoints': {endpoint: summarize(latencies, errors[0], wall_seconds)
+                      for endpoint, (latencies, errors) in sorted(results.items())}
+    }
+
+
+def _format_ms(value):
+    return "-" if value is None else f"{value:.1f}"
+
+
+def print_report(report):
+    print(f"synthetic project {report['scale']} ({report['triples']} triples), concurrency {report['concurrency']}, "
+          f"{report['build_workers']} build worker(s)")
+    for run_name in ("cold", "warm"):
+        run = report[run_name]
+        print(f"\n{run_name} run: {run['overall']['requests']} requests in {run['wall_seconds']:.2f}s")
+        print(f"{'endpoint':<20}{'requests':>10}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for endpoint, summary in list(run['endpoints'].items()) + [("overall", run['overall'])]:
+            print(f"{endpoint:<20}{summary['requests']:>10}{summary['errors']:>8}"
+                  f"{summary['throughput_rps']:>10.1f}{_format_ms(summary['p50_ms']):>10}"
+                  f"{_format_ms(summary['p95_ms']):>10}{_format_ms(summary['p99_ms']):>10}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scale", default="small", choices=sorted(synthetic_project.SCALES))
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--requests", type=int, default=200, help="Number of requests of each run")
+    ap.add_argument("--mix", default=DEFAULT_MIX, help="Weights of the requested endpoints")
+    ap.add_argument("--build-workers", type=int, default=0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", default=None, help="Write the report as JSON")
+    ap.add_argument("--serve", default=None, help=argparse.SUPPRESS)
+    ap.add_argument("--port", type=int, default=None, help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.serve is not None:
+        return serve(args.serve, args.port, args.build_workers)
+
+    endpoints, weights = parse_mix(args.mix)
+    requested_endpoints = random.Random(args.seed).choices(endpoints, weights=weights, k=args.requests)
+
+    with tempfile.TemporaryDirectory(prefix="renkuaqs-load-test-") as work_dir:
+        project = synthetic_project.generate_project(Path(work_dir, "project"),
+                                                     *synthetic_project.SCALES[args.scale])
+        renku_graph_path = Path(work_dir, "renku_graph.nt")
+        project.renku_graph.serialize(str(renku_graph_path), format="nt", encoding="utf-8")
+
+        report = {
+            'scale': args.scale,
+            'triples': len(project),
+            'concurrency': args.concurrency,
+            'build_workers': args.build_workers,
+            'mix': args.mix,
+        }
+        with GraphServerProcess(project.path, renku_graph_path, args.build_workers,
+                                Path(work_dir, "server.log")) as server:
+            report['cold'] = run_load(server.url, requested_endpoints, args.concurrency)
+            report['warm'] = run_load(server.url, requested_endpoints, args.concurrency)
+
+    print_report(report)
+    if args.json is not None:
+        with open(args.json, "w") as json_f:
+            json.dump(report, json_f, indent=4)
+
+    return report
+
+
+if __name__ == "__main__":
+    main()
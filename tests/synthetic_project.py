@@ -0,0 +1,306 @@
+import os
+import json
+import random
+import hashlib
+import datetime
+import subprocess
+
+import rdflib
+
+from pathlib import Path
+
+# a renku-like project, generated offline, with a given number of activities, notebooks and astroquery annotations:
+# the renku graph is built directly, as export_graph_command would return it, and the .aqs annotations are written
+# as inspect would write them
+
+RENKU = rdflib.Namespace("https://swissdatasciencecenter.github.io/renku-ontology#")
+PROV = rdflib.Namespace("http://www.w3.org/ns/prov#")
+OA = rdflib.Namespace("http://www.w3.org/ns/oa#")
+ODA = rdflib.Namespace("http://odahub.io/ontology#")
+ODAS = rdflib.Namespace("https://odahub.io/ontology#")
+DCT = rdflib.Namespace("http://purl.org/dc/terms/")
+SCHEMA = rdflib.Namespace("http://schema.org/")
+
+ANNOTATION_KINDS = ("object", "region", "image")
+
+# (number of activities, number of notebooks, number of astroquery annotations per run)
+SCALES = {
+    "small": (10, 5, 2),
+    "medium": (100, 20, 5),
+    "large": (500, 50, 10),
+}
+
+ASTRO_OBJECTS = ["Crab", "Mrk 421", "Cyg X-1", "Vela Pulsar", "Sgr A*", "M87", "3C 273", "SN 1987A"]
+ASTROQUERY_MODULES = ["SimbadClass", "NedClass", "SkyViewClass", "VizierClass"]
+IMAGE_BANDS = ["DSS", "2MASS-J", "WISE 3.4", "Fermi 5"]
+
+
+class SyntheticProject(object):
+
+    def __init__(self, path, renku_graph, notebooks):
+        self.path = Path(path)
+        self.renku_graph = renku_graph
+        # (location, checksum) of the notebooks at HEAD
+        self.notebooks = notebooks
+
+    def export_graph(self, revision=None, paths=None):
+        """Stand-in of graph_utils._renku_graph, returning a fresh copy as export_graph_command would."""
+        graph = rdflib.Graph()
+        graph += self.renku_graph
+        graph.bind("oa", OA)
+        return graph
+
+    def __len__(self):
+        return len(self.renku_graph)
+
+
+def ontology_graph():
+    """Stand-in of the odahub ontology, with the classes of the astroquery annotations."""
+    G = rdflib.Graph()
+    for class_name, parent_class_name in [("AstroqueryModule", None),
+                                          ("AstrophysicalObject", None),
+                                          ("AstrophysicalRegion", None),
+                                          ("AstrophysicalImage", None),
+                                          ("SkyCoordinates", "Coordinates"),
+                                          ("Coordinates", None),
+                                          ("Position", None),
+                                          ("Angle", None),
+                                          ("Pixels", None),
+                                          ("ImageBand", None),
+                                          ("Run", None)]:
+        G.add((ODA[class_name], rdflib.RDF.type, rdflib.OWL.Class))
+        G.add((ODA[class_name], rdflib.RDFS.label, rdflib.Literal(class_name)))
+        if parent_class_name is not None:
+            G.add((ODA[class_name], rdflib.RDFS.subClassOf, ODA[parent_class_name]))
+    return G
+
+
+def git_blob_checksum(content: bytes):
+    # the checksum renku records for a file is its git blob hash
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+def notebook_content(i_notebook):
+    source_name = ASTRO_OBJECTS[i_notebook % len(ASTRO_OBJECTS)]
+    notebook = {
+        "cells": [
+            {
+                "cell_type": "code",
+                "execution_count": None,
+                "metadata": {"tags": ["parameters"]},
+                "outputs": [],
+                "source": [
+                    f"src_name = \"{source_name}\"  # http://odahub.io/ontology#AstrophysicalObject\n",
+                    f"radius = {1 + i_notebook % 10}.  # http://odahub.io/ontology#AngleDegrees\n",
+                    f"notebook_index = {i_notebook}  # http://odahub.io/ontology#Integer"
+                ]
+            },
+            {
+                "cell_type": "code",
+                "execution_count": None,
+                "metadata": {},
+                "outputs": [],
+                "source": [
+                    "from astroquery.simbad import Simbad\n",
+                    "result = Simbad.query_object(src_name)"
+                ]
+            },
+            {
+                "cell_type": "code",
+                "execution_count": None,
+                "metadata": {"tags": ["outputs"]},
+                "outputs": [],
+                "source": [
+                    "result_table = \"result.csv\"  # http://odahub.io/ontology#POSIXPath"
+                ]
+            }
+        ],
+        "metadata": {
+            "kernelspec": {"display_name": "Python 3", "language": "python", "name": "python3"}
+        },
+        "nbformat": 4,
+        "nbformat_minor": 4
+    }
+    return json.dumps(notebook, indent=1).encode()
+
+
+def notebook_annotation(location, checksum, i_notebook):
+    """JSON-LD annotation of a notebook, in the shape written by inspect into .aqs/<notebook>/<checksum>."""
+    workflow_id = f"http://odahub.io/ontology#{Path(location).stem}"
+    return [
+        {
+            "@id": workflow_id,
+            "@type": ["http://odahub.io/ontology#workflow"],
+            "http://odahub.io/ontology#expects": [{"@id": f"{workflow_id}_src_name"},
+                                                  {"@id": f"{workflow_id}_radius"}],
+            "http://odahub.io/ontology#outputs": [{"@id": f"{workflow_id}_result_table"}],
+            "http://odahub.io/ontology#entity_checksum": checksum
+        },
+        {
+            "@id": f"{workflow_id}_src_name",
+            "@type": ["http://odahub.io/ontology#AstrophysicalObject"],
+            "http://odahub.io/ontology#value": [{"@value": ASTRO_OBJECTS[i_notebook % len(ASTRO_OBJECTS)]}]
+        },
+        {
+            "@id": f"{workflow_id}_radius",
+            "@type": ["http://odahub.io/ontology#AngleDegrees"],
+            "http://odahub.io/ontology#value": [{"@value": str(1 + i_notebook % 10)}]
+        },
+        {
+            "@id": f"{workflow_id}_result_table",
+            "@type": ["http://odahub.io/ontology#POSIXPath"]
+        }
+    ]
+
+
+def _add_titled_node(G, node, node_type, title):
+    G.add((node, rdflib.RDF.type, ODA[node_type]))
+    G.add((node, DCT.title, rdflib.Literal(title)))
+    return node
+
+
+def _add_astroquery_run(G, rng, activity, kind, i_run):
+    run_id = f"{activity.split('/')[-1]}-{i_run}"
+    run = rdflib.URIRef(f"https://odahub.io/ontology#Run{run_id}")
+    annotation = rdflib.URIRef(f"{activity}/annotations/aqs/{run}")
+
+    G.add((annotation, rdflib.RDF.type, OA.Annotation))
+    G.add((annotation, OA.hasTarget, activity))
+    G.add((annotation, OA.hasBody, run))
+    G.add((annotation, SCHEMA.creator, rdflib.Literal("AQS plugin")))
+
+    module_name = rng.choice(ASTROQUERY_MODULES)
+    aq_module = _add_titled_node(G, ODAS["AQModule" + module_name], "AstroqueryModule", module_name)
+    source_name = rng.choice(ASTRO_OBJECTS)
+
+    G.add((run, rdflib.RDF.type, ODA.Run))
+    G.add((run, DCT.title, rdflib.Literal(f"query_{kind}_{run_id}")))
+    G.add((run, ODA.isUsing, aq_module))
+
+    if kind == "object":
+        a_object = _add_titled_node(G, ODAS["AstroObject" + source_name.replace(" ", "_")],
+                                    "AstrophysicalObject", source_name)
+        G.add((run, ODA.isRequestingAstroObject, a_object))
+    elif kind == "region":
+        coordinates_name = f"{rng.uniform(0, 360):.3f} {rng.uniform(-90, 90):.3f}"
+        radius_name = f"{rng.choice([1, 2, 5, 10])} deg"
+        a_sky_coordinates = _add_titled_node(G, ODAS["SkyCoordinates" + hashlib.sha256(coordinates_name.encode()).hexdigest()],
+                                             "SkyCoordinates", coordinates_name)
+        a_radius = _add_titled_node(G, ODAS["Angle" + hashlib.sha256(radius_name.encode()).hexdigest()],
+                                    "Angle", radius_name)
+        a_region = _add_titled_node(G, ODAS["AstroRegion" + hashlib.sha256((coordinates_name + radius_name).encode()).hexdigest()],
+                                    "AstrophysicalRegion", f"{coordinates_name} {radius_name}")
+        G.add((a_region, ODA.isUsingSkyCoordinates, a_sky_coordinates))
+        G.add((a_region, ODA.isUsingRadius, a_radius))
+        G.add((run, ODA.isRequestingAstroRegion, a_region))
+    elif kind == "image":
+        image_band_name = rng.choice(IMAGE_BANDS)
+        position_name = source_name
+        pixels_name = str(rng.choice([100, 300, 500]))
+        a_position = _add_titled_node(G, ODAS["Position" + hashlib.sha256(position_name.encode()).hexdigest()],
+                                      "Position", position_name)
+        a_image_band = _add_titled_node(G, ODAS["ImageBand" + hashlib.sha256(image_band_name.encode()).hexdigest()],
+                                        "ImageBand", image_band_name)
+        a_pixels = _add_titled_node(G, ODAS["Pixels" + pixels_name], "Pixels", pixels_name)
+        image_name = f"{position_name} {image_band_name} {pixels_name}"
+        a_image = _add_titled_node(G, ODAS["AstroImage" + hashlib.sha256(image_name.encode()).hexdigest()],
+                                   "AstrophysicalImage", image_name)
+        G.add((a_image, ODA.isUsingPosition, a_position))
+        G.add((a_image, ODA.isUsingImageBand, a_image_band))
+        G.add((a_image, ODA.isUsingPixels, a_pixels))
+        G.add((run, ODA.isRequestingAstroImage, a_image))
+    else:
+        raise ValueError(f"unknown annotation kind {kind}")
+
+
+def build_renku_graph(notebooks, n_activities, n_annotations, annotation_kinds=ANNOTATION_KINDS, seed=0):
+    """Build a renku-like graph of n_activities papermill runs of the given notebooks,
+    each with n_annotations astroquery annotations of the given kinds."""
+    rng = random.Random(seed)
+    G = rdflib.Graph()
+    G.bind("oa", OA)
+
+    start_time = datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc)
+    plan = rdflib.URIRef("https://localhost/plans/papermill")
+    G.add((plan, rdflib.RDF.type, PROV.Plan))
+    G.add((plan, RENKU.command, rdflib.Literal("papermill")))
+
+    for i_activity in range(n_activities):
+        location, checksum = notebooks[i_activity % len(notebooks)]
+        activity = rdflib.URIRef(f"https://localhost/activities/{i_activity:08x}")
+
+        input_entity = rdflib.URIRef(f"https://localhost/entities/{checksum}/{location}")
+        G.add((input_entity, rdflib.RDF.type, PROV.Entity))
+        G.add((input_entity, PROV.atLocation, rdflib.Literal(location)))
+        G.add((input_entity, RENKU.checksum, rdflib.Literal(checksum)))
+
+        output_location = f"outputs/{Path(location).stem}_{i_activity}.ipynb"
+        output_checksum = hashlib.sha1(output_location.encode()).hexdigest()
+        output_entity = rdflib.URIRef(f"https://localhost/entities/{output_checksum}/{output_location}")
+        generation = rdflib.URIRef(f"{activity}/generations/0")
+        G.add((output_entity, rdflib.RDF.type, PROV.Entity))
+        G.add((output_entity, PROV.atLocation, rdflib.Literal(output_location)))
+        G.add((output_entity, RENKU.checksum, rdflib.Literal(output_checksum)))
+        G.add((output_entity, PROV.qualifiedGeneration, generation))
+        G.add((generation, rdflib.RDF.type, PROV.Generation))
+        G.add((generation, PROV.activity, activity))
+
+        usage = rdflib.URIRef(f"{activity}/usages/0")
+        G.add((usage, rdflib.RDF.type, PROV.Usage))
+        G.add((usage, PROV.entity, input_entity))
+
+        association = rdflib.URIRef(f"{activity}/association")
+        G.add((association, rdflib.RDF.type, PROV.Association))
+        G.add((association, PROV.hadPlan, plan))
+
+        parameter_value = rdflib.URIRef(f"{activity}/parameter-value/0")
+        G.add((parameter_value, rdflib.RDF.type, RENKU.ParameterValue))
+        G.add((parameter_value, SCHEMA.value, rdflib.Literal(location)))
+
+        G.add((activity, rdflib.RDF.type, PROV.Activity))
+        G.add((activity, PROV.startedAtTime,
+               rdflib.Literal(start_time + datetime.timedelta(minutes=i_activity), datatype=rdflib.XSD.dateTime)))
+        G.add((activity, PROV.qualifiedUsage, usage))
+        G.add((activity, PROV.qualifiedAssociation, association))
+        G.add((activity, RENKU.parameter, parameter_value))
+
+        for i_run in range(n_annotations):
+            _add_astroquery_run(G, rng, activity, annotation_kinds[i_run % len(annotation_kinds)], i_run)
+
+    return G
+
+
+def generate_project(path, n_activities, n_notebooks, n_annotations, annotation_kinds=ANNOTATION_KINDS, seed=0,
+                     write_aqs_annotations=True):
+    """Generate a synthetic project: a git repository with n_notebooks notebooks and their .aqs annotations,
+    along with the renku graph of n_activities runs of those notebooks, each with n_annotations astroquery
+    annotations."""
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+
+    notebooks = []
+    for i_notebook in range(n_notebooks):
+        location = f"notebooks/nb_{i_notebook:04d}.ipynb"
+        content = notebook_content(i_notebook)
+        path.joinpath(location).parent.mkdir(parents=True, exist_ok=True)
+        path.joinpath(location).write_bytes(content)
+        notebooks.append((location, git_blob_checksum(content)))
+
+        if write_aqs_annotations:
+            checksum = notebooks[-1][1]
+            annotation_folder = path.joinpath(".aqs", os.path.splitext(location)[0], checksum)
+            annotation_folder.mkdir(parents=True, exist_ok=True)
+            for i_annotation, annotation in enumerate(notebook_annotation(location, checksum, i_notebook)):
+                annotation_folder.joinpath(f"{i_annotation}.jsonld").write_text(json.dumps(annotation))
+
+    git_env = dict(os.environ,
+                   GIT_AUTHOR_NAME="synthetic", GIT_AUTHOR_EMAIL="synthetic@localhost",
+                   GIT_COMMITTER_NAME="synthetic", GIT_COMMITTER_EMAIL="synthetic@localhost")
+    subprocess.check_call(["git", "init", "-q"], cwd=path, env=git_env)
+    subprocess.check_call(["git", "add", "-A"], cwd=path, env=git_env)
+    subprocess.check_call(["git", "commit", "-q", "-m", "synthetic project"], cwd=path, env=git_env)
+
+    renku_graph = build_renku_graph(notebooks, n_activities, n_annotations,
+                                    annotation_kinds=annotation_kinds, seed=seed)
+
+    return SyntheticProject(path, renku_graph, notebooks)
@@ -0,0 +1,98 @@
+import os
+import json
+import pytest
+
+from types import SimpleNamespace
+
+
+@pytest.fixture
+def renku_project(tmp_path, monkeypatch):
+    from renku.domain_model.project_context import project_context
+    from renkuaqs.config import RUN_TOKEN_ENV
+
+    monkeypatch.delenv(RUN_TOKEN_ENV, raising=False)
+    with project_context.with_path(tmp_path):
+        yield tmp_path
+
+
+def _activity(name):
+    return SimpleNamespace(id=f"https://localhost/activities/{name}", generations=None)
+
+
+def _write_capture(path, *annotation_ids):
+    from renkuaqs.capture import CaptureWriter
+
+    writer = CaptureWriter(path)
+    for annotation_id in annotation_ids:
+        writer.write(annotation_id, {"@id": annotation_id})
+    writer.flush()
+
+
+def _annotation_ids(annotations):
+    return sorted(annotation.body["@id"] for annotation in annotations)
+
+
+def _common_path():
+    from renkuaqs.plugin import AQS
+
+    return AQS(None).renku_aqs_path
+
+
+def test_parallel_runs(renku_project, monkeypatch):
+    from renku.domain_model.project_context import project_context
+    from renkuaqs.config import RUN_TOKEN_ENV
+    import renkuaqs.capture as capture
+    import renkuaqs.plugin as plugin
+
+    # two runs of the checkout, capturing concurrently within their own directory
+    for run_token, annotation_ids in [("run-a", ["a1", "a2"]), ("run-b", ["b1"])]:
+        _write_capture(capture.capture_path(project_context.metadata_path, run_token), *annotation_ids)
+
+    monkeypatch.setenv(RUN_TOKEN_ENV, "run-a")
+    annotations = plugin.activity_annotations(_activity("a"))
+
+    assert _annotation_ids(annotations) == ["a1", "a2"]
+    assert annotations[0].id.startswith("https://localhost/activities/a/annotations/aqs/")
+    assert not capture.run_path(project_context.metadata_path, "run-a").exists()
+    # the token is consumed by the run
+    assert RUN_TOKEN_ENV not in os.environ
+
+    monkeypatch.setenv(RUN_TOKEN_ENV, "run-b")
+    assert _annotation_ids(plugin.activity_annotations(_activity("b"))) == ["b1"]
+
+
+def test_common_directory(renku_project):
+    import renkuaqs.capture as capture
+    import renkuaqs.plugin as plugin
+
+    # the capture file and the one-file-per-annotation layout of the common directory, without a run token
+    common_path = _common_path()
+    _write_capture(common_path.joinpath(capture.CAPTURE_FILE_NAME), "c1")
+    common_path.joinpath("c2.jsonld").write_text(json.dumps({"@id": "c2"}))
+
+    assert _annotation_ids(plugin.activity_annotations(_activity("c"))) == ["c1", "c2"]
+    # the annotations are not reported again by the next run
+    assert list(common_path.iterdir()) == []
+    assert plugin.activity_annotations(_activity("d")) == []
+
+
+def test_run_with_common_directory(renku_project, monkeypatch):
+    from renku.domain_model.project_context import project_context
+    from renkuaqs.config import RUN_TOKEN_ENV
+    import renkuaqs.capture as capture
+    import renkuaqs.plugin as plugin
+
+    _write_capture(capture.capture_path(project_context.metadata_path, "run-a"), "a1")
+    # written by the hooks of a previous version of the plugin
+    common_path = _common_path()
+    _write_capture(common_path.joinpath(capture.CAPTURE_FILE_NAME), "c1")
+    common_path.joinpath("c2.jsonld").write_text(json.dumps({"@id": "c2"}))
+
+    monkeypatch.setenv(RUN_TOKEN_ENV, "run-a")
+    # the common directory is not attributed to the run with its own token
+    assert _annotation_ids(plugin.activity_annotations(_activity("a"))) == ["a1"]
+    assert sorted(p.name for p in common_path.iterdir()) == sorted([capture.CAPTURE_FILE_NAME, "c2.jsonld"])
+
+    # but to the next run without one
+    assert _annotation_ids(plugin.activity_annotations(_activity("b"))) == ["c1", "c2"]
+    assert list(common_path.iterdir()) == []
@@ -0,0 +1,114 @@
+import os
+import json
+import tarfile
+import pytest
+import rdflib
+
+import synthetic_project
+
+RENKU = rdflib.Namespace("https://swissdatasciencecenter.github.io/renku-ontology#")
+
+# checksum of a previous version of a notebook, referenced by the renku graph but no longer at HEAD
+PREVIOUS_CHECKSUM = "1" * 40
+# checksum referenced nowhere
+ORPHANED_CHECKSUM = "2" * 40
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    import renkuaqs.graph_utils as graph_utils
+
+    project = synthetic_project.generate_project(tmp_path / "project", n_activities=3, n_notebooks=3,
+                                                 n_annotations=1)
+    project.renku_graph.add((rdflib.URIRef("https://localhost/entities/previous"), RENKU.checksum,
+                             rdflib.Literal(PREVIOUS_CHECKSUM)))
+    monkeypatch.setattr(graph_utils, "_renku_graph", project.export_graph)
+
+    aqs_path = project.path / ".aqs"
+    for folder in [aqs_path / "notebooks" / "nb_0000" / PREVIOUS_CHECKSUM,
+                   aqs_path / "notebooks" / "nb_0001" / ORPHANED_CHECKSUM,
+                   # a notebook since removed, nested deeper
+                   aqs_path / "old" / "analysis" / "nb" / ORPHANED_CHECKSUM]:
+        folder.mkdir(parents=True)
+        folder.joinpath("0.jsonld").write_text(json.dumps({
+            "@id": f"https://localhost/annotations/{folder.relative_to(aqs_path).as_posix()}",
+            "http://odahub.io/ontology#entity_checksum": folder.name
+        }))
+    # a removed notebook without annotations
+    aqs_path.joinpath("notebooks", "nb_0003", ORPHANED_CHECKSUM).mkdir(parents=True)
+    return project
+
+
+def _relative_folders(project, folders):
+    return sorted(os.path.relpath(folder, project.path) for folder, size in folders)
+
+
+def test_checksum_folders(project):
+    import renkuaqs.graph_utils as graph_utils
+
+    folders = [os.path.relpath(folder, project.path)
+               for folder in graph_utils._aqs_checksum_folders(str(project.path / ".aqs"))]
+
+    assert sorted(folders) == sorted(
+        [os.path.join(".aqs", os.path.splitext(location)[0], checksum) for location, checksum in project.notebooks] +
+        [os.path.join(".aqs", "notebooks", "nb_0000", PREVIOUS_CHECKSUM),
+         os.path.join(".aqs", "notebooks", "nb_0001", ORPHANED_CHECKSUM),
+         os.path.join(".aqs", "old", "analysis", "nb", ORPHANED_CHECKSUM),
+         os.path.join(".aqs", "notebooks", "nb_0003", ORPHANED_CHECKSUM)])
+
+
+@pytest.mark.parametrize("scope", ["all-revisions", "head"])
+def test_gc_delete(project, scope):
+    import renkuaqs.graph_utils as graph_utils
+
+    orphaned_folders = graph_utils.gc_aqs_annotations(str(project.path), scope=scope, delete=True)
+
+    expected_folders = [os.path.join(".aqs", "notebooks", "nb_0001", ORPHANED_CHECKSUM),
+                        os.path.join(".aqs", "notebooks", "nb_0003", ORPHANED_CHECKSUM),
+                        os.path.join(".aqs", "old", "analysis", "nb", ORPHANED_CHECKSUM)]
+    if scope == "head":
+        expected_folders.append(os.path.join(".aqs", "notebooks", "nb_0000", PREVIOUS_CHECKSUM))
+    assert _relative_folders(project, orphaned_folders) == sorted(expected_folders)
+
+    # the annotations of the notebooks at HEAD are kept, nested or not
+    for location, checksum in project.notebooks:
+        assert list(project.path.joinpath(".aqs", os.path.splitext(location)[0], checksum).glob("*.jsonld"))
+    assert project.path.joinpath(".aqs", "notebooks", "nb_0000", PREVIOUS_CHECKSUM).exists() == (scope != "head")
+    assert not project.path.joinpath(".aqs", "notebooks", "nb_0001", ORPHANED_CHECKSUM).exists()
+    # the entity folders left empty are removed, up to .aqs
+    assert not project.path.joinpath(".aqs", "old").exists()
+    assert not project.path.joinpath(".aqs", "notebooks", "nb_0003").exists()
+
+
+def test_gc_report_and_pack(project, tmp_path):
+    import renkuaqs.graph_utils as graph_utils
+
+    orphaned_folders = graph_utils.gc_aqs_annotations(str(project.path))
+    assert len(orphaned_folders) == 3
+    assert project.path.joinpath(".aqs", "old", "analysis", "nb", ORPHANED_CHECKSUM).exists()
+
+    pack_path = tmp_path / "aqs-orphaned.tar.gz"
+    graph_utils.gc_aqs_annotations(str(project.path), pack=str(pack_path))
+    with tarfile.open(pack_path) as archive:
+        assert os.path.join(".aqs", "old", "analysis", "nb", ORPHANED_CHECKSUM, "0.jsonld") in archive.getnames()
+    assert not project.path.joinpath(".aqs", "old").exists()
+
+
+def test_aqs_graph(project, monkeypatch):
+    import renkuaqs.graph_utils as graph_utils
+
+    monkeypatch.chdir(project.path)
+    head_checksums = {checksum for location, checksum in project.notebooks}
+
+    # the annotations of the nested notebook folders, eg .aqs/notebooks/nb_0000/<checksum>
+    head_graph = graph_utils._aqs_graph(entity_checksums=head_checksums)
+    assert len(head_graph) > 0
+    assert {str(checksum) for checksum in head_graph.objects(
+        None, rdflib.URIRef("http://odahub.io/ontology#entity_checksum"))} == head_checksums
+
+    # along with the ones of the previous and removed versions with the full history
+    full_history_graph = graph_utils._aqs_graph()
+    assert {str(checksum) for checksum in full_history_graph.objects(
+        None, rdflib.URIRef("http://odahub.io/ontology#entity_checksum"))} == \
+        head_checksums | {PREVIOUS_CHECKSUM, ORPHANED_CHECKSUM}
+    assert len(full_history_graph) == len(head_graph) + 3
@@ -0,0 +1,82 @@
+import sys
+import importlib.abc
+import importlib.util
+import pytest
+
+HOOKED_MODULE = "renkuaqs_dummy_astroquery"
+
+
+class InMemoryFinder(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    """A finder other than the path based one, as installed by the editable installs."""
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname != HOOKED_MODULE:
+            return None
+        return importlib.util.spec_from_loader(fullname, self)
+
+    def exec_module(self, module):
+        module.found_by = "in-memory finder"
+
+
+@pytest.fixture
+def hook(monkeypatch):
+    import renkuaqs.astroquery_hook as astroquery_hook
+
+    enabled = []
+    monkeypatch.setattr(astroquery_hook, "HOOKED_MODULE", HOOKED_MODULE)
+    monkeypatch.setattr(astroquery_hook, "enable_hooks", lambda: enabled.append(HOOKED_MODULE in sys.modules))
+    monkeypatch.setattr(sys, "meta_path", list(sys.meta_path))
+    monkeypatch.delitem(sys.modules, HOOKED_MODULE, raising=False)
+
+    finder = astroquery_hook.AstroqueryHookFinder()
+    yield finder, enabled
+    finder.uninstall()
+    sys.modules.pop(HOOKED_MODULE, None)
+
+
+def test_import_through_hook(hook, tmp_path, monkeypatch):
+    finder, enabled = hook
+    tmp_path.joinpath(f"{HOOKED_MODULE}.py").write_text("found_by = 'path finder'\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    finder.install()
+    assert finder in sys.meta_path and enabled == []
+
+    module = importlib.import_module(HOOKED_MODULE)
+
+    assert module.found_by == "path finder"
+    # enabled once, after the module is executed, and the finder is removed
+    assert enabled == [True]
+    assert finder not in sys.meta_path
+
+
+def test_delegate_to_meta_path(hook):
+    finder, enabled = hook
+    sys.meta_path.append(InMemoryFinder())
+
+    finder.install()
+    module = importlib.import_module(HOOKED_MODULE)
+
+    assert module.found_by == "in-memory finder"
+    assert enabled == [True]
+
+
+def test_module_not_found(hook):
+    finder, enabled = hook
+
+    finder.install()
+    with pytest.raises(ModuleNotFoundError):
+        importlib.import_module(HOOKED_MODULE)
+
+    assert enabled == []
+    assert finder in sys.meta_path
+
+
+def test_already_imported(hook, monkeypatch):
+    finder, enabled = hook
+    monkeypatch.setitem(sys.modules, HOOKED_MODULE, object())
+
+    finder.install()
+
+    assert enabled == [True]
+    assert finder not in sys.meta_path
@@ -0,0 +1,153 @@
+import os
+import shutil
+import pytest
+
+import synthetic_project
+import legacy_queries
+
+# run with: pytest tests/test_benchmarks.py --benchmark-only --benchmark-group-by=func,param
+# RENKUAQS_BENCHMARK_SCALES selects the scales of synthetic_project.SCALES, eg RENKUAQS_BENCHMARK_SCALES=small,medium,large
+# the benchmarks are skipped by the other pytest runs, unless RENKUAQS_BENCHMARK_SCALES is set
+pytest.importorskip("pytest_benchmark")
+
+BENCHMARK_SCALES_ENV = "RENKUAQS_BENCHMARK_SCALES"
+BENCHMARK_SCALES = os.environ.get(BENCHMARK_SCALES_ENV, "small,medium").split(",")
+# the legacy queries take minutes from the medium scale on, they are compared at the larger scales on demand only,
+# eg RENKUAQS_BENCHMARK_LEGACY_SCALES=small,medium
+BENCHMARK_LEGACY_SCALES_ENV = "RENKUAQS_BENCHMARK_LEGACY_SCALES"
+BENCHMARK_LEGACY_SCALES = os.environ.get(BENCHMARK_LEGACY_SCALES_ENV, "small").split(",")
+
+
+@pytest.fixture(scope="module", params=BENCHMARK_SCALES)
+def generated_project(request, tmp_path_factory):
+    import renkuaqs.graph_utils as graph_utils
+
+    # before the project is generated, which takes minutes at the larger scales
+    if BENCHMARK_SCALES_ENV not in os.environ and not request.config.getoption("benchmark_only", False):
+        pytest.skip(f"the benchmarks run with --benchmark-only or {BENCHMARK_SCALES_ENV}")
+
+    n_activities, n_notebooks, n_annotations = synthetic_project.SCALES[request.param]
+    generated_project = synthetic_project.generate_project(tmp_path_factory.mktemp(f"synthetic-{request.param}"),
+                                                           n_activities, n_notebooks, n_annotations)
+
+    # the annotations of the .aqs folder are loaded, so that the aqs_load stage is measured
+    cwd = os.getcwd()
+    os.chdir(generated_project.path)
+    try:
+        entity_checksums = graph_utils._graph_entity_checksums(generated_project.export_graph())
+        assert len(graph_utils._aqs_graph(entity_checksums=entity_checksums)) > 0
+    finally:
+        os.chdir(cwd)
+
+    return generated_project
+
+
+def _skip_legacy_queries(request, queries):
+    scale = request.node.callspec.params["generated_project"]
+    if queries == "legacy" and scale not in BENCHMARK_LEGACY_SCALES:
+        pytest.skip(f"the legacy queries are benchmarked at the {scale} scale with {BENCHMARK_LEGACY_SCALES_ENV}")
+
+
+@pytest.fixture
+def project(generated_project, monkeypatch, tmp_path):
+    from renku.domain_model.project_context import project_context
+    import renkuaqs.graph_utils as graph_utils
+
+    # stand-ins of the renku graph export and of the ontology fetch
+    monkeypatch.setattr(graph_utils, "_renku_graph", generated_project.export_graph)
+    monkeypatch.setattr(graph_utils, "_nodes_subset_ontologies_graph", synthetic_project.ontology_graph)
+    monkeypatch.setenv("RENKUAQS_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.chdir(generated_project.path)
+
+    with project_context.with_path(generated_project.path):
+        yield generated_project
+
+
+def test_benchmark_extract_graph(benchmark, project):
+    import renkuaqs.graph_utils as graph_utils
+
+    graph_str = benchmark(graph_utils.extract_graph, "HEAD", str(project.path))
+
+    assert len(graph_str) > 0
+
+
+@pytest.mark.skipif(shutil.which("dot") is None, reason="graphviz is not installed")
+def test_benchmark_build_graph_image(benchmark, project, tmp_path):
+    import renkuaqs.graph_utils as graph_utils
+
+    filename = benchmark(graph_utils.build_graph_image,
+                         "HEAD", str(project.path), str(tmp_path / "graph.png"), False, None)
+
+    assert os.path.exists(filename)
+
+
+def test_benchmark_build_graph_html(benchmark, project):
+    import renkuaqs.graph_utils as graph_utils
+
+    html_content, graph_str = benchmark(graph_utils.build_graph_html,
+                                        "HEAD", str(project.path), include_ttl_content_within_html=False)
+
+    assert "<html>" in html_content
+
+
+def test_benchmark_inspect_oda_graph_inputs(benchmark, project, tmp_path):
+    import renkuaqs.graph_utils as graph_utils
+
+    def clear_annotations():
+        # every round extracts the notebooks, rather than reading the nb2rdf cache of the previous round
+        shutil.rmtree(tmp_path / "cache", ignore_errors=True)
+        shutil.rmtree(project.path / ".aqs", ignore_errors=True)
+
+    benchmark.pedantic(graph_utils.inspect_oda_graph_inputs, args=("HEAD", str(project.path)),
+                       kwargs=dict(workers=1), setup=clear_annotations, rounds=3)
+
+    assert len(list((project.path / ".aqs").glob("notebooks/*/*"))) == len(project.notebooks)
+
+
+def test_benchmark_params(benchmark, project):
+    from click.testing import CliRunner
+    from renkuaqs.plugin import params
+
+    result = benchmark(CliRunner().invoke, params, [])
+
+    assert result.exit_code == 0, result.output
+    assert "Astro Object" in result.output
+
+
+def test_benchmark_nodes_subset_queries(benchmark, project):
+    import renkuaqs.graph_utils as graph_utils
+
+    overall_graph = graph_utils._overall_graph("HEAD", str(project.path))
+
+    subset_graphs = benchmark(graph_utils.nodes_subset_graphs, overall_graph)
+
+    assert len(subset_graphs["oda"]) > 0
+
+
+@pytest.mark.parametrize("queries", ["legacy", "optimised"])
+def test_benchmark_graph_image_query(benchmark, project, queries, request):
+    import renkuaqs.graph_utils as graph_utils
+
+    _skip_legacy_queries(request, queries)
+    overall_graph = graph_utils._overall_graph("HEAD", str(project.path))
+    build_query_where = legacy_queries.legacy_build_query_where if queries == "legacy" else graph_utils.build_query_where
+    query = graph_utils.build_query_construct() + build_query_where()
+
+    result = benchmark(lambda: overall_graph.query(query).graph)
+
+    assert len(result) > 0
+
+
+@pytest.mark.parametrize("queries", ["legacy", "optimised"])
+def test_benchmark_params_graph(benchmark, project, queries, request):
+    import renkuaqs.graph_utils as graph_utils
+
+    _skip_legacy_queries(request, queries)
+    overall_graph = graph_utils._overall_graph("HEAD", str(project.path))
+    if queries == "legacy":
+        legacy_query = legacy_queries.LEGACY_PARAMS_CONSTRUCT + "\n" + legacy_queries.LEGACY_PARAMS_CONSTRUCT_QUERY_WHERE
+        result = benchmark(lambda: overall_graph.query(legacy_query).graph)
+    else:
+        result = benchmark(graph_utils.params_graph, overall_graph)
+
+    assert len(result) > 0
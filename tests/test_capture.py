@@ -0,0 +1,107 @@
+import json
+import threading
+import multiprocessing
+import pytest
+
+N_RECORDS = 200
+
+
+def _annotation(writer_id, i):
+    return f"{writer_id}-{i}", {"@id": f"https://localhost/annotations/{writer_id}/{i}", "value": "x" * (i % 50)}
+
+
+def _write_records(path, writer_id, batch_size=7):
+    from renkuaqs.capture import CaptureWriter
+
+    writer = CaptureWriter(path, batch_size=batch_size, batch_seconds=3600)
+    for i in range(N_RECORDS):
+        writer.write(*_annotation(writer_id, i))
+    writer.flush()
+
+
+def _expected_records(*writer_ids):
+    return sorted((annotation_id_hash, json.dumps(annotation, sort_keys=True))
+                  for writer_id in writer_ids
+                  for annotation_id_hash, annotation in [_annotation(writer_id, i) for i in range(N_RECORDS)])
+
+
+def _read_records(path):
+    from renkuaqs.capture import read_capture
+
+    return sorted((annotation_id_hash, json.dumps(annotation, sort_keys=True))
+                  for annotation_id_hash, annotation in read_capture(path))
+
+
+def test_batching(tmp_path):
+    from renkuaqs.capture import CaptureWriter, read_capture
+
+    path = tmp_path / "capture.jsonl"
+    writer = CaptureWriter(path, batch_size=3, batch_seconds=3600)
+    for i in range(2):
+        writer.write(*_annotation("w", i))
+    assert list(read_capture(path)) == []
+
+    writer.write(*_annotation("w", 2))
+    assert [annotation_id_hash for annotation_id_hash, annotation in read_capture(path)] == ["w-0", "w-1", "w-2"]
+
+
+def test_concurrent_processes(tmp_path):
+    path = tmp_path / "capture.jsonl"
+    # the processes of a run, eg of a papermill kernel, append to the same capture file
+    processes = [multiprocessing.get_context("fork").Process(target=_write_records, args=(path, f"p{i}"))
+                 for i in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    assert _read_records(path) == _expected_records("p0", "p1", "p2", "p3")
+
+
+def test_concurrent_threads(tmp_path):
+    from renkuaqs.capture import CaptureWriter
+
+    path = tmp_path / "capture.jsonl"
+    writer = CaptureWriter(path, batch_size=5, batch_seconds=3600)
+
+    def write_records(writer_id):
+        for i in range(N_RECORDS):
+            writer.write(*_annotation(writer_id, i))
+
+    threads = [threading.Thread(target=write_records, args=(f"t{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.flush()
+
+    assert _read_records(path) == _expected_records("t0", "t1", "t2", "t3")
+
+
+def test_incomplete_last_record(tmp_path):
+    path = tmp_path / "capture.jsonl"
+    _write_records(path, "w")
+    # a process killed while writing
+    with open(path, "a") as capture_f:
+        capture_f.write('{"hash":"killed","annotation":{"@id":')
+
+    assert _read_records(path) == _expected_records("w")
+
+    # the next batch is not merged with the incomplete record
+    _write_records(path, "v")
+    assert _read_records(path) == _expected_records("w", "v")
+    assert sum(1 for line in path.read_text().splitlines()) == 2 * N_RECORDS + 1
+
+
+@pytest.mark.parametrize("corrupt_line", ['{"hash":"killed","annot\n', 'not json\n', '{"hash":"no annotation"}\n',
+                                          '[1, 2]\n', '\n'])
+def test_corrupt_record(tmp_path, corrupt_line):
+    path = tmp_path / "capture.jsonl"
+    _write_records(path, "w")
+    with open(path, "a") as capture_f:
+        capture_f.write(corrupt_line)
+    _write_records(path, "v")
+
+    # the corrupt record is skipped, the following ones are still read
+    assert _read_records(path) == _expected_records("w", "v")
@@ -0,0 +1,71 @@
+import os
+import threading
+import pytest
+
+
+def test_write_file_atomically(tmp_path):
+    import renkuaqs.file_utils as file_utils
+
+    path = tmp_path / "nested" / "annotation.jsonld"
+    file_utils.write_file_atomically(path, "{}")
+    assert path.read_text() == "{}"
+
+    file_utils.write_file_atomically(path, b'{"@id": 1}')
+    assert path.read_bytes() == b'{"@id": 1}'
+    # no temporary file is left behind
+    assert os.listdir(path.parent) == ["annotation.jsonld"]
+
+
+def test_write_file_atomically_failure(tmp_path, monkeypatch):
+    import renkuaqs.file_utils as file_utils
+
+    path = tmp_path / "annotation.jsonld"
+    path.write_text("previous")
+
+    def failing_replace(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(file_utils.os, "replace", failing_replace)
+    with pytest.raises(OSError, match="disk full"):
+        file_utils.write_file_atomically(path, "new")
+
+    # the previous content is kept, and the temporary file removed
+    assert path.read_text() == "previous"
+    assert os.listdir(tmp_path) == ["annotation.jsonld"]
+
+
+def test_concurrent_readers(tmp_path):
+    import renkuaqs.file_utils as file_utils
+
+    path = tmp_path / "annotation.jsonld"
+    contents = [str(i).encode() * 100000 for i in range(2)]
+    file_utils.write_file_atomically(path, contents[0])
+    stop = threading.Event()
+
+    def write():
+        for i in range(50):
+            file_utils.write_file_atomically(path, contents[i % 2])
+        stop.set()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    # the readers see either content, never a partially written file
+    while not stop.is_set():
+        assert path.read_bytes() in contents
+    writer.join()
+
+
+def test_write_file_if_changed(tmp_path):
+    import renkuaqs.file_utils as file_utils
+
+    path = tmp_path / "annotation.jsonld"
+    assert file_utils.file_content_hash(path) is None
+
+    assert file_utils.write_file_if_changed(path, "{}")
+    mtime = path.stat().st_mtime_ns
+    assert not file_utils.write_file_if_changed(path, b"{}")
+    assert path.stat().st_mtime_ns == mtime
+    assert file_utils.file_content_hash(path) == file_utils.content_hash(b"{}")
+
+    assert file_utils.write_file_if_changed(path, "{ }")
+    assert path.read_text() == "{ }"
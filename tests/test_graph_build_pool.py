@@ -0,0 +1,71 @@
+import os
+import pytest
+
+
+def _build_in_worker(name):
+    """A build run by the pool, with a stage timed within the worker."""
+    from renku.domain_model.project_context import project_context
+    import renkuaqs.metrics as metrics
+
+    with metrics.stage(name):
+        return os.getpid(), str(project_context.path)
+
+
+def _failing_build():
+    raise ValueError("graph build failed")
+
+
+def _stage_count(stage_name):
+    import renkuaqs.metrics as metrics
+
+    for line in metrics.stage_duration_seconds.expose():
+        if line.startswith(f'renkuaqs_stage_duration_seconds_count{{stage="{stage_name}"}}'):
+            return int(line.split()[-1])
+    return 0
+
+
+@pytest.fixture
+def build_pool(tmp_path):
+    from renkuaqs.graph_build_pool import GraphBuildPool
+
+    pool = GraphBuildPool(max_workers=1, paths=str(tmp_path))
+    yield pool
+    pool.shutdown()
+
+
+def test_worker_process(build_pool, tmp_path):
+    pid, project_path = build_pool.run(_build_in_worker, "test_worker_stage")
+
+    # within the project of the server, in another process
+    assert pid != os.getpid()
+    assert project_path == str(tmp_path)
+    # the stages timed within the worker are reported by the server
+    assert _stage_count("test_worker_stage") == 1
+
+    with pytest.raises(ValueError, match="graph build failed"):
+        build_pool.run(_failing_build)
+    # the worker survives the failed builds
+    assert build_pool.run(_build_in_worker, "test_worker_stage")[0] == pid
+
+
+def test_in_thread(tmp_path):
+    from renkuaqs.graph_build_pool import GraphBuildPool
+
+    pool = GraphBuildPool(max_workers=0, paths=str(tmp_path))
+
+    pid, project_path = pool.run(_build_in_worker, "test_in_thread_stage")
+
+    assert pid == os.getpid()
+    assert project_path == str(tmp_path)
+    assert _stage_count("test_in_thread_stage") == 1
+
+
+def test_workers_from_env(monkeypatch):
+    from renkuaqs.config import GRAPH_BUILD_WORKERS_ENV
+    from renkuaqs.graph_build_pool import GraphBuildPool
+
+    monkeypatch.setenv(GRAPH_BUILD_WORKERS_ENV, "0")
+    pool = GraphBuildPool()
+
+    assert pool.max_workers == 0
+    assert pool.run(lambda: "built") == "built"
@@ -0,0 +1,102 @@
+import io
+import gzip
+import json
+import pytest
+import rdflib
+
+from rdflib.compare import isomorphic
+
+import synthetic_project
+
+
+@pytest.fixture(scope="module")
+def graph():
+    notebooks = [(f"notebooks/nb_{i:04d}.ipynb", f"{i:040x}") for i in range(3)]
+    G = synthetic_project.build_renku_graph(notebooks, 10, 3)
+    G += synthetic_project.ontology_graph()
+    # literals that are not plain strings, and names that are not valid turtle local names
+    G.add((synthetic_project.ODA.run_1, synthetic_project.DCT.title, rdflib.Literal("multi\nline \"title\"")))
+    G.add((synthetic_project.ODA.run_1, synthetic_project.DCT.title, rdflib.Literal("titre", lang="fr")))
+    G.add((synthetic_project.ODA.run_1, synthetic_project.ODA.isUsingRadius, rdflib.Literal(1.5)))
+    G.add((rdflib.BNode(), synthetic_project.ODA["value.with.dots"], synthetic_project.ODA["Sgr_A*"]))
+    G.bind("oda", synthetic_project.ODA)
+    G.bind("dct", synthetic_project.DCT)
+    return G
+
+
+@pytest.mark.parametrize("format,rdflib_format", [("nt", "nt"), ("turtle", "turtle"), ("json-ld", "json-ld")])
+def test_write_graph(graph, format, rdflib_format):
+    import renkuaqs.graph_export as graph_export
+
+    stream = io.BytesIO()
+    n_triples = graph_export.write_graph(graph, stream, format=format)
+
+    parsed_graph = rdflib.Graph()
+    parsed_graph.parse(data=stream.getvalue().decode(), format=rdflib_format)
+
+    assert n_triples == len(graph)
+    assert isomorphic(parsed_graph, graph)
+
+
+def test_write_nquads(graph):
+    import renkuaqs.graph_export as graph_export
+
+    ontology_graph = synthetic_project.ontology_graph()
+    stream = io.BytesIO()
+    graph_export.write_graph({"urn:test:all": graph, "urn:test:ontologies": ontology_graph}, stream, format="nquads")
+
+    dataset = rdflib.ConjunctiveGraph()
+    dataset.parse(data=stream.getvalue().decode(), format="nquads")
+
+    assert isomorphic(dataset.get_context(rdflib.URIRef("urn:test:all")), graph)
+    assert isomorphic(dataset.get_context(rdflib.URIRef("urn:test:ontologies")), ontology_graph)
+
+
+@pytest.mark.parametrize("compression", ["gzip", "zstd"])
+def test_open_output_compression(graph, tmp_path, compression):
+    import renkuaqs.graph_export as graph_export
+
+    if compression == "zstd":
+        zstandard = pytest.importorskip("zstandard")
+
+    filename = str(tmp_path / f"graph.nt{'.gz' if compression == 'gzip' else '.zst'}")
+    assert graph_export.compression_from_filename(filename) == compression
+
+    with graph_export.open_output(filename, compression=compression) as output_f:
+        graph_export.write_graph(graph, output_f, format="nt")
+
+    with open(filename, "rb") as compressed_f:
+        if compression == "gzip":
+            content = gzip.decompress(compressed_f.read())
+        else:
+            content = zstandard.ZstdDecompressor().stream_reader(compressed_f).read()
+
+    parsed_graph = rdflib.Graph()
+    parsed_graph.parse(data=content.decode(), format="nt")
+    assert isomorphic(parsed_graph, graph)
+
+
+def test_export_command(tmp_path, monkeypatch):
+    from click.testing import CliRunner
+    from renku.domain_model.project_context import project_context
+    import renkuaqs.graph_utils as graph_utils
+    from renkuaqs.plugin import export
+
+    project = synthetic_project.generate_project(tmp_path / "project", 5, 2, 2)
+    monkeypatch.setattr(graph_utils, "_renku_graph", project.export_graph)
+    monkeypatch.setattr(graph_utils, "_nodes_subset_ontologies_graph", synthetic_project.ontology_graph)
+    monkeypatch.setenv("RENKUAQS_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.chdir(project.path)
+
+    with project_context.with_path(project.path):
+        overall_graph = graph_utils._overall_graph("HEAD", str(project.path))
+        result = CliRunner().invoke(export, ["--format", "json-ld", "-o", str(tmp_path / "graph.jsonld.gz")])
+
+    assert result.exit_code == 0, result.output
+
+    with gzip.open(tmp_path / "graph.jsonld.gz") as jsonld_f:
+        nodes = json.load(jsonld_f)
+    exported_graph = rdflib.Graph()
+    exported_graph.parse(data=json.dumps(nodes), format="json-ld")
+
+    assert isomorphic(exported_graph, overall_graph)
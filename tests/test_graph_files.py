@@ -0,0 +1,47 @@
+import os
+import subprocess
+
+
+def _git(path, *args):
+    return subprocess.check_output(["git", *args], cwd=path, text=True)
+
+
+def test_write_graph_files_no_commit(tmp_path, monkeypatch):
+    import renkuaqs.graph_utils as graph_utils
+
+    _git(tmp_path, "init", "-q")
+    (tmp_path / ".gitignore").write_text("*.pyc\n")
+    _git(tmp_path, "add", ".gitignore")
+    _git(tmp_path, "-c", "user.name=test", "-c", "user.email=test@localhost", "commit", "-q", "-m", "init")
+    head = _git(tmp_path, "rev-parse", "HEAD")
+
+    monkeypatch.chdir(tmp_path)
+    for _ in range(2):
+        html_fn, ttl_fn = graph_utils.write_graph_files("<html></html>", "<a> <b> <c> .")
+
+    assert os.path.dirname(html_fn) == os.path.dirname(ttl_fn) == "renkuaqs-graph"
+    assert (tmp_path / html_fn).read_text() == "<html></html>"
+    # the generated files are neither committed nor listed within .gitignore, and the tree stays clean
+    assert _git(tmp_path, "rev-parse", "HEAD") == head
+    assert (tmp_path / ".gitignore").read_text() == "*.pyc\n"
+    assert _git(tmp_path, "status", "--porcelain") == ""
+    assert (tmp_path / ".git" / "info" / "exclude").read_text().splitlines().count("/renkuaqs-graph") == 1
+
+
+def test_build_graph_html(tmp_path, monkeypatch):
+    from renku.domain_model.project_context import project_context
+    import synthetic_project
+    import renkuaqs.graph_utils as graph_utils
+
+    project = synthetic_project.generate_project(tmp_path / "project", n_activities=3, n_notebooks=2, n_annotations=1)
+    monkeypatch.setattr(graph_utils, "_renku_graph", project.export_graph)
+    monkeypatch.setattr(graph_utils, "_nodes_subset_ontologies_graph", synthetic_project.ontology_graph)
+    monkeypatch.setenv("RENKUAQS_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.chdir(project.path)
+
+    with project_context.with_path(project.path):
+        html_content, graph_str = graph_utils.build_graph_html("HEAD", str(project.path),
+                                                               include_ttl_content_within_html=False)
+
+    assert "<html>" in html_content
+    assert "AstroqueryModule" in graph_str
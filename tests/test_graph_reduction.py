@@ -0,0 +1,93 @@
+import pytest
+import rdflib
+
+RENKU = rdflib.Namespace("https://swissdatasciencecenter.github.io/renku-ontology#")
+PROV = rdflib.Namespace("http://www.w3.org/ns/prov#")
+ODA = rdflib.Namespace("http://odahub.io/ontology#")
+ODAS = rdflib.Namespace("https://odahub.io/ontology#")
+DCT = rdflib.Namespace("http://purl.org/dc/terms/")
+LOCAL = rdflib.Namespace("https://localhost/")
+
+
+@pytest.fixture
+def graph():
+    G = rdflib.Graph()
+    G.add((LOCAL.activity, rdflib.RDF.type, PROV.Activity))
+    G.add((LOCAL.activity, RENKU.hasInputs, LOCAL.input))
+    G.add((LOCAL.activity, RENKU.hasOutputs, LOCAL.output))
+    G.add((LOCAL.activity, PROV.qualifiedAssociation, LOCAL.association))
+    G.add((LOCAL.input, rdflib.RDF.type, PROV.Entity))
+    G.add((LOCAL.input, PROV.atLocation, rdflib.Literal("notebooks/nb.ipynb")))
+    # also the input of another activity, kept as a node
+    G.add((LOCAL.output, rdflib.RDF.type, PROV.Entity))
+    G.add((LOCAL.other_activity, RENKU.hasInputs, LOCAL.output))
+
+    G.add((LOCAL.region, rdflib.RDF.type, ODAS.AstrophysicalRegion))
+    G.add((LOCAL.region, ODA.isUsingSkyCoordinates, LOCAL.coordinates))
+    G.add((LOCAL.region, ODA.isUsingRadius, LOCAL.radius))
+    G.add((LOCAL.coordinates, DCT.title, rdflib.Literal("83.63 22.01")))
+    G.add((LOCAL.radius, DCT.title, rdflib.Literal("5 arcmin")))
+    return G
+
+
+def test_reduce_graph(graph):
+    import renkuaqs.graph_reduction as graph_reduction
+
+    graph_reduction.reduce_graph(graph, graph_reduction.parse_reductions("AstrophysicalRegion, Activity"))
+
+    assert set(graph.objects(LOCAL.region, ODA.isUsingSkyCoordinates)) == {rdflib.Literal("83.63 22.01")}
+    assert set(graph.objects(LOCAL.region, ODA.isUsingRadius)) == {rdflib.Literal("5 arcmin")}
+    assert (LOCAL.coordinates, None, None) not in graph
+    assert (LOCAL.radius, None, None) not in graph
+
+    assert set(graph.objects(LOCAL.activity, RENKU.hasInputs)) == {rdflib.Literal("input")}
+    assert (LOCAL.input, None, None) not in graph
+    assert set(graph.objects(LOCAL.activity, RENKU.hasOutputs)) == {rdflib.Literal("output")}
+    assert (LOCAL.output, rdflib.RDF.type, PROV.Entity) in graph
+    # the predicates not listed are kept as edges
+    assert (LOCAL.activity, PROV.qualifiedAssociation, LOCAL.association) in graph
+
+
+def test_reduce_graph_selected_reductions(graph):
+    import renkuaqs.graph_reduction as graph_reduction
+
+    n_triples = len(graph)
+    graph_reduction.reduce_graph(graph, ("AstrophysicalImage",))
+
+    assert len(graph) == n_triples
+    with pytest.raises(ValueError):
+        graph_reduction.parse_reductions("Activity,Plan")
+
+
+def test_reduced_snapshot(graph, monkeypatch):
+    import pickle
+    import renkuaqs
+    from renkuaqs.graph_build_pool import GraphBuildPool
+    from renkuaqs.graph_snapshot import GraphSnapshot
+
+    builds = []
+
+    class RecordingPool(GraphBuildPool):
+        def run(self, fn, *args, **kwargs):
+            builds.append(fn.__name__)
+            return super().run(fn, *args, **kwargs)
+
+    # the reduced views are built like the snapshots, by the build pool rather than by the request threads
+    monkeypatch.setattr(renkuaqs, "_graph_build_pool", RecordingPool(max_workers=0))
+    graph_snapshot = GraphSnapshot.from_graph(graph, "abcdef12", graph_ttl_content="")
+    reduced_snapshot = renkuaqs._get_reduced_snapshot(graph_snapshot, ("AstrophysicalRegion",))
+
+    assert renkuaqs._get_reduced_snapshot(graph_snapshot, ("AstrophysicalRegion",)) is reduced_snapshot
+    assert renkuaqs._get_reduced_snapshot(graph_snapshot, ()) is graph_snapshot
+    assert builds == ["build_reduced_snapshot_artifact"]
+    # the reduced views are not pickled along with the snapshot
+    assert pickle.loads(pickle.dumps(graph_snapshot)).reduced_snapshots == {}
+    assert graph_snapshot.reduced_snapshots == {("AstrophysicalRegion",): reduced_snapshot}
+
+    assert reduced_snapshot.graph_version == graph_snapshot.graph_version
+    assert not reduced_snapshot.has_node(str(LOCAL.coordinates))
+    assert reduced_snapshot.node_literals[str(LOCAL.region)][str(ODA.isUsingRadius)] == ["5 arcmin"]
+
+    reduced_graph = rdflib.Graph()
+    reduced_graph.parse(data=reduced_snapshot.graph_ttl_content, format="turtle")
+    assert len(reduced_graph) == len(reduced_snapshot)
@@ -0,0 +1,184 @@
+import re
+import json
+import threading
+import urllib.error
+import urllib.request
+import pytest
+
+from functools import partial
+
+import synthetic_project
+import load_test_graph_server
+
+
+@pytest.fixture
+def graph_server(tmp_path, monkeypatch):
+    """The graph server, within the test process, serving a synthetic project."""
+    from http.server import ThreadingHTTPServer
+    from renku.domain_model.project_context import project_context
+    import renkuaqs
+    import renkuaqs.graph_utils as graph_utils
+    from renkuaqs.graph_snapshot import GraphSnapshotStore
+    from renkuaqs.single_flight import SingleFlight
+
+    project = synthetic_project.generate_project(tmp_path / "project", n_activities=5, n_notebooks=3,
+                                                 n_annotations=2, seed=1)
+    monkeypatch.setattr(graph_utils, "_renku_graph", project.export_graph)
+    monkeypatch.setattr(graph_utils, "_nodes_subset_ontologies_graph", synthetic_project.ontology_graph)
+    monkeypatch.setenv("RENKUAQS_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(renkuaqs, "_graph_snapshots", GraphSnapshotStore(4))
+    monkeypatch.setattr(renkuaqs, "_graph_builds", SingleFlight())
+    monkeypatch.chdir(project.path)
+
+    server = ThreadingHTTPServer(("localhost", 0), partial(renkuaqs.HTTPGraphHandler, directory=str(project.path)))
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    with project_context.with_path(project.path):
+        server_thread.start()
+        try:
+            yield f"http://localhost:{server.server_address[1]}", project
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+def get(url):
+    try:
+        with urllib.request.urlopen(url, timeout=60) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def test_graph_page_build_error(graph_server, monkeypatch):
+    import renkuaqs.graph_build_pool as graph_build_pool
+
+    def failing_build(paths):
+        raise RuntimeError("graph build failed")
+
+    monkeypatch.setattr(graph_build_pool, "build_graph_html_artifact", failing_build)
+    url, project = graph_server
+
+    status, body = get(url + "/")
+
+    # the error page is not reported as a success, neither by the status nor by the load test validation
+    assert status == 500
+    assert b"graph build failed" in body
+    assert not load_test_graph_server.valid_response("/", body)
+
+
+def test_valid_response():
+    assert load_test_graph_server.valid_response("/", b"<html><body>graph</body></html>")
+    assert not load_test_graph_server.valid_response(
+        "/", b"<html><body><h1>Error while generating the output graph:</h1></body></html>")
+    assert load_test_graph_server.valid_response(
+        "/ttl_graph?since=abcdef12", json.dumps({"graph_version": "abcdef12", "added_triples": ""}).encode())
+    assert not load_test_graph_server.valid_response("/ttl_graph", b"<html>error</html>")
+    assert not load_test_graph_server.valid_response("/subsets", json.dumps({"graph_version": "abcdef12"}).encode())
+
+
+def test_graph_page_in_request_thread(graph_server, monkeypatch):
+    import renkuaqs
+    from renkuaqs.graph_build_pool import GraphBuildPool
+
+    url, project = graph_server
+    # as started with --build-workers 0, the page is built within the request thread
+    monkeypatch.setattr(renkuaqs, "_graph_build_pool", GraphBuildPool(max_workers=0, paths=str(project.path)))
+
+    status, body = get(url + "/")
+
+    assert status == 200, body
+    assert load_test_graph_server.valid_response("/", body)
+
+
+def test_import_plugin_first():
+    import sys
+    import subprocess
+
+    # as loaded by renku through the plugin entry point, in a fresh interpreter
+    subprocess.check_call([sys.executable, "-c", "import renkuaqs.plugin"])
+
+
+def test_subgraph(graph_server):
+    import urllib.parse
+
+    url, project = graph_server
+    status, body = get(url + "/subsets")
+    assert status == 200
+    nodes = json.loads(body)['nodes']
+    node = next(n for n in nodes if "/activities/" in n)
+
+    def subgraph(**params):
+        return get(url + "/subgraph?" + urllib.parse.urlencode(dict(node=node, **params)))
+
+    subgraphs = {}
+    for depth in range(3):
+        status, body = subgraph(depth=depth)
+        assert status == 200, body
+        subgraphs[depth] = json.loads(body)
+    node_ids = {depth: {n['id'] for n in subgraphs[depth]['nodes']} for depth in subgraphs}
+    assert node_ids[0] == {node}
+    assert node_ids[0] < node_ids[1] < node_ids[2]
+
+    labels = {edge['label'] for edge in subgraphs[1]['edges']}
+    predicate = sorted(labels)[0]
+    status, body = subgraph(depth=1, predicates=predicate)
+    assert {edge['label'] for edge in json.loads(body)['edges']} == {predicate}
+
+    assert subgraph(depth="two")[0] == 400
+    assert get(url + "/subgraph?depth=1")[0] == 400
+    assert get(url + "/subgraph?" + urllib.parse.urlencode({'node': "https://localhost/unknown"}))[0] == 404
+
+
+def test_metrics(graph_server):
+    import time
+    import test_metrics
+
+    url, project = graph_server
+    assert get(url + "/graph_version")[0] == 200
+    assert get(url + "/unknown.txt")[0] == 404
+
+    expected_samples = [r'renkuaqs_http_requests_total\{endpoint="/graph_version",status="200"\} [1-9]',
+                        r'renkuaqs_http_requests_total\{endpoint="static",status="404"\} [1-9]',
+                        r'renkuaqs_http_request_duration_seconds_count\{endpoint="/graph_version"\} [1-9]']
+    # the requests are counted once their response is sent
+    deadline = time.monotonic() + 10
+    while True:
+        status, body = get(url + "/metrics")
+        assert status == 200
+        text = body.decode()
+        if all(re.search("^" + sample, text, re.MULTILINE) for sample in expected_samples) or \
+                time.monotonic() > deadline:
+            break
+        time.sleep(0.05)
+
+    test_metrics._check_exposition(text)
+    for sample in expected_samples:
+        assert re.search("^" + sample, text, re.MULTILINE), sample
+
+
+def test_subsets(graph_server):
+    import base64
+
+    url, project = graph_server
+    status, body = get(url + "/subsets")
+    assert status == 200
+    subsets = json.loads(body)
+    assert subsets['subsets']
+    subset_name = sorted(subsets['subsets'])[0]
+    bitset = base64.b64decode(subsets['subsets'][subset_name]['bitset'])
+    assert len(bitset) == (len(subsets['nodes']) + 7) // 8
+
+    status, body = get(url + f"/subsets?subset={subset_name}")
+    assert status == 200
+    assert len(json.loads(body)['triples'].splitlines()) == subsets['subsets'][subset_name]['n_triples']
+
+    status, body = get(url + "/subsets?reduce=Activity")
+    assert status == 200
+    reduced_subsets = json.loads(body)
+    assert set(reduced_subsets['subsets']) == set(subsets['subsets'])
+    assert len(base64.b64decode(reduced_subsets['subsets'][subset_name]['bitset'])) == \
+        (len(reduced_subsets['nodes']) + 7) // 8
+
+    # the subset triples are not reduced, they would not match the reduced nodes
+    assert get(url + f"/subsets?subset={subset_name}&reduce=Activity")[0] == 400
+    assert get(url + "/subsets?subset=unknown")[0] == 404
@@ -0,0 +1,159 @@
+import rdflib
+import pytest
+
+LOCAL = rdflib.Namespace("https://localhost/")
+
+GRAPH_TTL = """
+@prefix local: <https://localhost/> .
+
+local:activity local:hasInputs local:input ;
+    local:hasOutputs local:output ;
+    local:annotation [ local:value "1" ; local:nested [ local:value "2" ] ] ,
+        [ local:value "3" ] .
+local:input local:title "input" .
+"""
+
+
+def _snapshot(graph, graph_version):
+    from renkuaqs.graph_snapshot import GraphSnapshot, skolemize_graph
+
+    return GraphSnapshot.from_graph(skolemize_graph(graph), graph_version)
+
+
+def _parsed_graph(ttl=GRAPH_TTL):
+    graph = rdflib.Graph()
+    graph.parse(data=ttl, format="turtle")
+    return graph
+
+
+def test_delta():
+    previous_graph = _parsed_graph()
+    graph = _parsed_graph()
+    graph.remove((LOCAL.input, LOCAL.title, None))
+    graph.add((LOCAL.input, LOCAL.title, rdflib.Literal("renamed input")))
+
+    added_triples, removed_triples = _snapshot(graph, "bbbbbbbb").delta(_snapshot(previous_graph, "aaaaaaaa"))
+
+    assert added_triples == ['<https://localhost/input> <https://localhost/title> "renamed input" .']
+    assert removed_triples == ['<https://localhost/input> <https://localhost/title> "input" .']
+
+
+def test_delta_blank_nodes():
+    # the blank nodes are labelled differently at each parse
+    previous_snapshot = _snapshot(_parsed_graph(), "aaaaaaaa")
+    snapshot = _snapshot(_parsed_graph(), "bbbbbbbb")
+
+    assert snapshot.delta(previous_snapshot) == ([], [])
+    assert not any("_:" in triple_nt for triple_nt in snapshot.triples_nt)
+    # the blank nodes with distinct values are kept apart
+    assert len(snapshot) == len(_parsed_graph())
+
+    graph = _parsed_graph(GRAPH_TTL.replace('"3"', '"4"'))
+    added_triples, removed_triples = _snapshot(graph, "cccccccc").delta(previous_snapshot)
+    assert len(added_triples) == len(removed_triples) == 2
+    assert any('"4"' in triple_nt for triple_nt in added_triples)
+
+
+def test_delta_multiline_literal():
+    previous_snapshot = _snapshot(_parsed_graph(), "aaaaaaaa")
+    graph = _parsed_graph()
+    graph.add((LOCAL.input, LOCAL.description, rdflib.Literal('first line\nsecond "line"', lang="en")))
+
+    added_triples, removed_triples = _snapshot(graph, "bbbbbbbb").delta(previous_snapshot)
+
+    # each triple is a single N-Triples line
+    assert added_triples == ['<https://localhost/input> <https://localhost/description> '
+                             '"first line\\nsecond \\"line\\""@en .']
+    added_graph = rdflib.Graph()
+    added_graph.parse(data="\n".join(added_triples), format="nt")
+    assert set(added_graph) == {(LOCAL.input, LOCAL.description,
+                                 rdflib.Literal('first line\nsecond "line"', lang="en"))}
+
+
+@pytest.fixture
+def snapshot_store():
+    from renkuaqs.graph_snapshot import GraphSnapshotStore
+
+    store = GraphSnapshotStore(2)
+    for graph_version in ("1a2b3c4d", "1a2b9999"):
+        store.put(_snapshot(_parsed_graph(), graph_version))
+    return store
+
+
+def test_snapshot_store_get(snapshot_store):
+    assert snapshot_store.get("1a2b3c4d").graph_version == "1a2b3c4d"
+    # the full sha of a graph version
+    assert snapshot_store.get("1a2b3c4d" + "0" * 32).graph_version == "1a2b3c4d"
+    assert snapshot_store.get("1a2b3c4").graph_version == "1a2b3c4d"
+    # too short, or matching several versions
+    assert snapshot_store.get("1") is None
+    assert snapshot_store.get("1a2b") is None
+    assert snapshot_store.get("") is None
+    assert snapshot_store.get("ffffffff") is None
+
+
+def test_snapshot_store_eviction(snapshot_store):
+    # the least recently used snapshot is evicted
+    snapshot_store.get("1a2b3c4d")
+    snapshot_store.put(_snapshot(_parsed_graph(), "5e6f7a8b"))
+
+    assert len(snapshot_store) == 2
+    assert snapshot_store.get("1a2b9999") is None
+    assert snapshot_store.get("1a2b3c4d") is not None
+
+
+CHAIN_TTL = """
+@prefix local: <https://localhost/> .
+
+local:a local:hasInputs local:b ;
+    local:title "a" .
+local:b a local:Input ;
+    local:next local:c .
+local:c local:hasInputs local:d .
+local:e local:next local:a .
+"""
+
+
+def _node(name):
+    return str(LOCAL[name])
+
+
+def _subgraph_nodes(subgraph):
+    return sorted(node['id'][len(str(LOCAL)):] for node in subgraph['nodes'])
+
+
+@pytest.mark.parametrize("depth, nodes", [(0, ["a"]), (1, ["a", "b", "e"]), (2, ["a", "b", "c", "e"]),
+                                          (3, ["a", "b", "c", "d", "e"]), (10, ["a", "b", "c", "d", "e"])])
+def test_subgraph_depth(depth, nodes):
+    snapshot = _snapshot(_parsed_graph(CHAIN_TTL), "aaaaaaaa")
+
+    subgraph = snapshot.subgraph(_node("a"), depth=depth)
+
+    assert subgraph['graph_version'] == "aaaaaaaa"
+    assert _subgraph_nodes(subgraph) == nodes
+    # the edges between the nodes within the neighbourhood, in both directions
+    assert len(subgraph['edges']) == len(nodes) - 1
+    assert all(edge['from'] in {node['id'] for node in subgraph['nodes']} and
+               edge['to'] in {node['id'] for node in subgraph['nodes']} for edge in subgraph['edges'])
+
+
+def test_subgraph_predicates():
+    snapshot = _snapshot(_parsed_graph(CHAIN_TTL), "aaaaaaaa")
+
+    # by local name or full IRI
+    assert _subgraph_nodes(snapshot.subgraph(_node("a"), depth=3, predicates=["hasInputs"])) == ["a", "b"]
+    assert _subgraph_nodes(snapshot.subgraph(_node("e"), depth=3, predicates=[str(LOCAL.next)])) == ["a", "e"]
+    assert _subgraph_nodes(snapshot.subgraph(_node("a"), depth=3, predicates=["next", "hasInputs"])) == \
+        ["a", "b", "c", "d", "e"]
+    assert _subgraph_nodes(snapshot.subgraph(_node("a"), depth=3, predicates=["unknown"])) == ["a"]
+
+
+def test_subgraph_node_info():
+    snapshot = _snapshot(_parsed_graph(CHAIN_TTL), "aaaaaaaa")
+
+    nodes = {node['id']: node for node in snapshot.subgraph(_node("a"))['nodes']}
+
+    assert nodes[_node("b")]['types'] == [str(LOCAL.Input)]
+    assert nodes[_node("a")]['literals'] == {str(LOCAL.title): ["a"]}
+    with pytest.raises(KeyError):
+        snapshot.subgraph(_node("unknown"))
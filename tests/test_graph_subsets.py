@@ -0,0 +1,57 @@
+import base64
+import pytest
+import rdflib
+
+import synthetic_project
+
+
+@pytest.fixture(scope="module")
+def overall_graph(tmp_path_factory):
+    from renku.domain_model.project_context import project_context
+    import renkuaqs.graph_utils as graph_utils
+
+    project = synthetic_project.generate_project(tmp_path_factory.mktemp("synthetic"), 10, 3, 3)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(graph_utils, "_renku_graph", project.export_graph)
+        monkeypatch.setattr(graph_utils, "_nodes_subset_ontologies_graph", synthetic_project.ontology_graph)
+        monkeypatch.setenv("RENKUAQS_CACHE_DIR", str(tmp_path_factory.mktemp("cache")))
+        monkeypatch.chdir(project.path)
+        with project_context.with_path(project.path):
+            yield graph_utils._overall_graph("HEAD", str(project.path))
+
+
+def _bitset_nodes(node_index, bitset):
+    bitset = base64.b64decode(bitset)
+    return {node for i_node, node in enumerate(node_index) if bitset[i_node // 8] & (1 << (i_node % 8))}
+
+
+def test_subset_bitsets(overall_graph):
+    import renkuaqs.graph_utils as graph_utils
+    from renkuaqs.graph_snapshot import GraphSnapshot
+
+    subset_graphs = graph_utils.nodes_subset_graphs(overall_graph)
+    graph_snapshot = GraphSnapshot.from_graph(overall_graph, "abcdef12", graph_ttl_content="",
+                                              subset_graphs=subset_graphs)
+    subsets = graph_snapshot.subsets()
+
+    assert set(subsets['subsets']) == set(subset_graphs)
+    oda_nodes = {str(node) for s, p, o in subset_graphs["oda"] for node in (s, o)
+                 if not isinstance(node, rdflib.Literal)}
+    oda_bitset_nodes = _bitset_nodes(subsets['nodes'], subsets['subsets']['oda']['bitset'])
+    assert len(oda_bitset_nodes) > 0
+    assert oda_bitset_nodes == oda_nodes & set(subsets['nodes'])
+    assert subsets['subsets']['oda']['n_triples'] == len(subset_graphs["oda"])
+
+
+def test_reduced_subset_bitsets(overall_graph):
+    import renkuaqs.graph_utils as graph_utils
+    from renkuaqs.graph_snapshot import GraphSnapshot
+
+    graph_snapshot = GraphSnapshot.from_graph(overall_graph, "abcdef12", graph_ttl_content="",
+                                              subset_graphs=graph_utils.nodes_subset_graphs(overall_graph))
+    reduced_snapshot = graph_snapshot.reduce(("AstrophysicalRegion",))
+    subsets = reduced_snapshot.subsets()
+
+    oda_bitset_nodes = _bitset_nodes(subsets['nodes'], subsets['subsets']['oda']['bitset'])
+    assert len(subsets['nodes']) < len(graph_snapshot.node_index)
+    assert oda_bitset_nodes <= set(graph_snapshot.node_subsets['oda']['nodes'])
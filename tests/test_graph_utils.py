@@ -0,0 +1,151 @@
+import json
+import os
+import pytest
+
+from git import Repo
+
+
+@pytest.fixture
+def repository(tmp_path):
+    repository = Repo.init(tmp_path / "repository")
+    with repository.config_writer() as config_writer:
+        config_writer.set_value("user", "name", "test")
+        config_writer.set_value("user", "email", "test@localhost")
+    return repository
+
+
+def _commit(repository, files):
+    for file_path, content in files.items():
+        path = os.path.join(repository.working_tree_dir, file_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+    repository.index.add(list(files))
+    return repository.index.commit("test").hexsha
+
+
+def _blob_hashes(repository, revision, file_paths):
+    return {file_path: repository.git.rev_parse(f"{revision}:{file_path}") for file_path in file_paths}
+
+
+def test_revision_checksums(repository):
+    import renkuaqs.graph_utils as graph_utils
+
+    # nested, with spaces and non-ascii characters, that git quotes unless -z is used
+    files = {"analysis.ipynb": "{}", "notebooks/nested analysis.ipynb": '{"cells": []}',
+             "notebooks/données.ipynb": '{"cells": [1]}'}
+    first_revision = _commit(repository, files)
+    second_revision = _commit(repository, {"analysis.ipynb": '{"cells": [2]}', "data/output.txt": "1"})
+
+    checksums = graph_utils._revision_checksums(repository.working_tree_dir, first_revision)
+    second_checksums = graph_utils._revision_checksums(repository.working_tree_dir, second_revision)
+
+    # the checksums are the git blob hashes, as recorded by renku
+    assert checksums == _blob_hashes(repository, first_revision, files)
+    assert checksums["notebooks/données.ipynb"] == \
+        repository.git.hash_object(os.path.join(repository.working_tree_dir, "notebooks/données.ipynb"))
+    assert second_checksums == _blob_hashes(repository, second_revision, list(files) + ["data/output.txt"])
+    assert second_checksums["analysis.ipynb"] != checksums["analysis.ipynb"]
+
+
+def test_revision_checksums_cached(repository, monkeypatch):
+    import renkuaqs.graph_utils as graph_utils
+
+    revision = _commit(repository, {"analysis.ipynb": "{}"})
+    graph_utils._revision_checksums.cache_clear()
+    graph_utils._revision_checksums(repository.working_tree_dir, revision)
+
+    # the tree of a commit is listed once
+    monkeypatch.setattr(graph_utils, "Repo", None)
+    assert graph_utils._revision_checksums(repository.working_tree_dir, revision) == \
+        _blob_hashes(repository, revision, ["analysis.ipynb"])
+
+
+def _annotation(annotation_id, value):
+    return {"@id": f"https://localhost/annotations/{annotation_id}", "http://odahub.io/ontology#value": value}
+
+
+def test_write_annotations(tmp_path):
+    import renkuaqs.graph_utils as graph_utils
+
+    folder_path = tmp_path / ".aqs" / "notebooks" / "analysis" / ("a" * 40)
+
+    assert graph_utils.write_annotations(folder_path, [_annotation("1", 1), _annotation("2", 2)]) == (2, 0, 0)
+    file_names = sorted(p.name for p in folder_path.iterdir())
+    assert len(file_names) == 2
+    # no temporary folder is left next to the entity folder
+    assert sorted(p.name for p in folder_path.parent.iterdir()) == ["a" * 40]
+
+    mtimes = {p.name: p.stat().st_mtime_ns for p in folder_path.iterdir()}
+    # 1 unchanged, 2 updated, 3 added, and the files of the removed annotations are deleted
+    assert graph_utils.write_annotations(folder_path, [_annotation("1", 1), _annotation("2", 20),
+                                                       _annotation("3", 3)]) == (2, 1, 0)
+    assert graph_utils.write_annotations(folder_path, [_annotation("1", 1), _annotation("2", 20)]) == (0, 2, 1)
+
+    assert sorted(p.name for p in folder_path.iterdir()) == file_names
+    # the unchanged file is not rewritten
+    assert sum(1 for name in file_names if folder_path.joinpath(name).stat().st_mtime_ns == mtimes[name]) == 1
+    annotations = sorted((json.loads(p.read_text()) for p in folder_path.glob("*.jsonld")), key=lambda a: a["@id"])
+    assert annotations == [_annotation("1", 1), _annotation("2", 20)]
+
+
+def test_write_annotations_compact(tmp_path):
+    import renkuaqs.graph_utils as graph_utils
+
+    folder_path = tmp_path / ("a" * 40)
+    graph_utils.write_annotations(folder_path, [_annotation("1", 1)])
+    indented_content = next(folder_path.glob("*.jsonld")).read_text()
+
+    # the same annotations, written again in another format
+    assert graph_utils.write_annotations(folder_path, [_annotation("1", 1)], compact=True) == (1, 0, 0)
+    compact_content = next(folder_path.glob("*.jsonld")).read_text()
+    assert "\n" not in compact_content and "\n" in indented_content
+    assert json.loads(compact_content) == json.loads(indented_content)
+
+
+def test_write_annotations_concurrent_folder(tmp_path, monkeypatch):
+    import renkuaqs.graph_utils as graph_utils
+
+    folder_path = tmp_path / ("a" * 40)
+    rename = os.rename
+
+    def concurrent_rename(src, dst):
+        # the folder is created by another writer in the meantime
+        monkeypatch.setattr(os, "rename", rename)
+        graph_utils.write_annotations(folder_path, [_annotation("1", 1), _annotation("3", 3)])
+        rename(src, dst)
+
+    monkeypatch.setattr(os, "rename", concurrent_rename)
+
+    assert graph_utils.write_annotations(folder_path, [_annotation("1", 1), _annotation("2", 2)]) == (1, 1, 1)
+    assert sorted(json.loads(p.read_text())["@id"] for p in folder_path.glob("*.jsonld")) == \
+        [_annotation("1", 1)["@id"], _annotation("2", 2)["@id"]]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a" * 40]
+
+
+def test_overall_graph_entity_checksums(tmp_path, monkeypatch):
+    import rdflib
+    import synthetic_project
+    import renkuaqs.graph_utils as graph_utils
+
+    project = synthetic_project.generate_project(tmp_path / "project", n_activities=3, n_notebooks=2,
+                                                 n_annotations=2, seed=2)
+    monkeypatch.setattr(graph_utils, "_renku_graph", project.export_graph)
+    monkeypatch.setattr(graph_utils, "_nodes_subset_ontologies_graph", synthetic_project.ontology_graph)
+    monkeypatch.chdir(project.path)
+    # the annotations of a version of a notebook no longer referenced by the renku graph
+    orphaned_id = rdflib.URIRef("https://localhost/annotations/orphaned")
+    location, checksum = project.notebooks[0]
+    orphaned_folder = project.path.joinpath(".aqs", os.path.splitext(location)[0], "0" * 40)
+    orphaned_folder.mkdir(parents=True)
+    orphaned_folder.joinpath("0.jsonld").write_text(json.dumps({
+        "@id": str(orphaned_id), "http://odahub.io/ontology#entity_checksum": "0" * 40}))
+
+    graph = graph_utils._overall_graph(None, str(project.path))
+    full_history_graph = graph_utils._overall_graph(None, str(project.path), full_history=True)
+
+    assert (orphaned_id, None, None) not in graph
+    assert (orphaned_id, None, None) in full_history_graph
+    assert set(full_history_graph) - set(graph) == set(full_history_graph.triples((orphaned_id, None, None)))
+    # the annotations of the referenced versions are loaded
+    assert set(graph.subjects(rdflib.URIRef("http://odahub.io/ontology#entity_checksum"), rdflib.Literal(checksum)))
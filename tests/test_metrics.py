@@ -0,0 +1,87 @@
+import re
+
+# a sample line of the Prometheus text exposition format, https://prometheus.io/docs/instrumenting/exposition_formats/
+SAMPLE_LINE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*'
+                         r'(\{[a-zA-Z_][a-zA-Z0-9_]*="(\\.|[^"\\])*"(,[a-zA-Z_][a-zA-Z0-9_]*="(\\.|[^"\\])*")*\})?'
+                         r' (-?[0-9.e+-]+|\+Inf|-Inf|NaN)$')
+
+
+def _check_exposition(text):
+    assert text.endswith("\n")
+    metric_types = {}
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            continue
+        if line.startswith("# TYPE "):
+            name, metric_type = line[len("# TYPE "):].split(" ")
+            assert metric_type in ("counter", "gauge", "histogram")
+            assert name not in metric_types
+            metric_types[name] = metric_type
+            continue
+        assert SAMPLE_LINE.match(line), line
+        name = line.split("{")[0].split(" ")[0]
+        # the samples follow the TYPE line of their metric
+        assert name in metric_types or re.sub("_(bucket|sum|count)$", "", name) in metric_types, line
+    return metric_types
+
+
+def test_exposition():
+    from renkuaqs.metrics import Registry, Counter, Gauge, Histogram
+
+    registry = Registry()
+    requests = registry.register(Counter("test_requests_total", "Number of requests", ("endpoint", "status")))
+    triples = registry.register(Gauge("test_triples", "Number of triples"))
+    duration = registry.register(Histogram("test_duration_seconds", "Duration", ("stage",), buckets=(0.1, 1.0)))
+
+    requests.inc(endpoint="/ttl_graph", status=200)
+    requests.inc(2, endpoint="/ttl_graph", status=200)
+    requests.inc(endpoint='/a"b\\c\nd', status=404)
+    triples.set(1234)
+    for value in (0.05, 0.5, 0.5, 2.0):
+        duration.observe(value, stage="sparql")
+
+    text = registry.expose()
+    assert _check_exposition(text) == {"test_requests_total": "counter", "test_triples": "gauge",
+                                       "test_duration_seconds": "histogram"}
+    lines = text.splitlines()
+    assert lines[:2] == ["# HELP test_requests_total Number of requests", "# TYPE test_requests_total counter"]
+    assert 'test_requests_total{endpoint="/ttl_graph",status="200"} 3' in lines
+    # the label values are escaped
+    assert 'test_requests_total{endpoint="/a\\"b\\\\c\\nd",status="404"} 1' in lines
+    assert "test_triples 1234" in lines
+    # cumulative buckets, up to +Inf
+    assert [line for line in lines if line.startswith("test_duration_seconds")] == [
+        'test_duration_seconds_bucket{stage="sparql",le="0.1"} 1',
+        'test_duration_seconds_bucket{stage="sparql",le="1.0"} 3',
+        'test_duration_seconds_bucket{stage="sparql",le="+Inf"} 4',
+        'test_duration_seconds_sum{stage="sparql"} 3.05',
+        'test_duration_seconds_count{stage="sparql"} 4',
+    ]
+
+
+def test_registry_exposition():
+    import renkuaqs.metrics as metrics
+
+    with metrics.stage("test_stage"):
+        pass
+    metrics.cache_lookup("test_cache", True)
+
+    text = metrics.registry.expose()
+
+    metric_types = _check_exposition(text)
+    assert metric_types["renkuaqs_http_requests_total"] == "counter"
+    assert metric_types["renkuaqs_stage_duration_seconds"] == "histogram"
+    assert 'renkuaqs_cache_requests_total{cache="test_cache",result="hit"} 1' in text.splitlines()
+    assert re.search(r'^renkuaqs_process_resident_memory_bytes [1-9][0-9]*$', text, re.MULTILINE)
+
+
+def test_recorded_stages():
+    import renkuaqs.metrics as metrics
+
+    with metrics.recorded_stages() as stages:
+        with metrics.stage("test_recorded_stage"):
+            pass
+    with metrics.stage("test_not_recorded_stage"):
+        pass
+
+    assert [name for name, duration in stages] == ["test_recorded_stage"]
@@ -0,0 +1,167 @@
+import pytest
+
+NOTEBOOK_TTL = """
+@prefix oda: <http://odahub.io/ontology#> .
+
+<https://localhost/notebooks/{name}> a oda:Workflow ;
+    oda:version "{version}" .
+"""
+
+
+@pytest.fixture
+def nb2rdf_calls(tmp_path, monkeypatch):
+    import renkuaqs.nb2rdf_cache as nb2rdf_cache
+    from renkuaqs.config import CACHE_DIR_ENV
+
+    calls = []
+
+    def nb2rdf(notebook_path):
+        calls.append(notebook_path)
+        return NOTEBOOK_TTL.format(name=notebook_path, version=len(calls))
+
+    monkeypatch.setattr(nb2rdf_cache.ontology, "nb2rdf", nb2rdf)
+    monkeypatch.setenv(CACHE_DIR_ENV, str(tmp_path / "cache"))
+    # outside of a git repository, the origin of the notebooks is their folder
+    monkeypatch.chdir(tmp_path)
+    return calls
+
+
+def _ids(rdf_jsonld):
+    return [annotation["@id"] for annotation in rdf_jsonld]
+
+
+def test_cache_hit(nb2rdf_calls, tmp_path):
+    import renkuaqs.nb2rdf_cache as nb2rdf_cache
+
+    rdf_jsonld = nb2rdf_cache.nb2rdf_jsonld("analysis.ipynb", checksum="a" * 40)
+    assert _ids(rdf_jsonld) == ["https://localhost/notebooks/analysis.ipynb"]
+
+    # the same version of the notebook, eg from another process, is not parsed again
+    assert nb2rdf_cache.nb2rdf_jsonld("analysis.ipynb", checksum="a" * 40) == rdf_jsonld
+    assert nb2rdf_calls == ["analysis.ipynb"]
+    assert nb2rdf_cache.is_cached("analysis.ipynb", "a" * 40)
+    assert nb2rdf_cache.nb2rdf_cache_path("analysis.ipynb", "a" * 40).exists()
+    assert nb2rdf_cache.nb2rdf_cache_dir().is_relative_to(tmp_path / "cache")
+
+    # at another path, the workflow of the notebook has another name and location
+    tmp_path.joinpath("moved").mkdir()
+    moved_rdf_jsonld = nb2rdf_cache.nb2rdf_jsonld("moved/analysis.ipynb", checksum="a" * 40)
+    assert _ids(moved_rdf_jsonld) == ["https://localhost/notebooks/moved/analysis.ipynb"]
+    assert nb2rdf_calls == ["analysis.ipynb", "moved/analysis.ipynb"]
+
+
+def test_cache_origin(nb2rdf_calls, tmp_path):
+    from git import Repo
+    import renkuaqs.nb2rdf_cache as nb2rdf_cache
+
+    repository = Repo.init(tmp_path)
+    repository.create_remote("origin", "https://localhost/project.git")
+    with repository.config_writer() as config_writer:
+        config_writer.set_value("user", "name", "test")
+        config_writer.set_value("user", "email", "test@localhost")
+    tmp_path.joinpath("analysis.ipynb").write_text("{}")
+    repository.index.add(["analysis.ipynb"])
+    revision = repository.index.commit("test").hexsha
+
+    assert nb2rdf_cache.notebook_origin("analysis.ipynb") == f"https://localhost/project.git#{revision[:7]}"
+    nb2rdf_cache.nb2rdf_jsonld("analysis.ipynb", checksum="a" * 40)
+    nb2rdf_cache.nb2rdf_jsonld("analysis.ipynb", checksum="a" * 40)
+    assert len(nb2rdf_calls) == 1
+
+    # the location of the workflow is described from the latest commit
+    repository.index.commit("other")
+    assert not nb2rdf_cache.is_cached("analysis.ipynb", "a" * 40)
+    nb2rdf_cache.nb2rdf_jsonld("analysis.ipynb", checksum="a" * 40)
+    assert len(nb2rdf_calls) == 2
+
+
+def test_cache_invalidation(nb2rdf_calls, monkeypatch):
+    import renkuaqs.nb2rdf_cache as nb2rdf_cache
+
+    nb2rdf_cache.nb2rdf_jsonld("analysis.ipynb", checksum="a" * 40)
+    # another version of the notebook
+    nb2rdf_cache.nb2rdf_jsonld("analysis.ipynb", checksum="b" * 40)
+    assert len(nb2rdf_calls) == 2
+
+    # another version of nb2workflow, whose extraction can differ
+    monkeypatch.setattr(nb2rdf_cache, "_nb2workflow_version", lambda: "0.0.0-test")
+    rdf_jsonld = nb2rdf_cache.nb2rdf_jsonld("analysis.ipynb", checksum="a" * 40)
+    assert len(nb2rdf_calls) == 3
+    assert rdf_jsonld[0]["http://odahub.io/ontology#version"] == [{"@value": "3"}]
+
+
+def test_without_checksum(nb2rdf_calls):
+    import renkuaqs.nb2rdf_cache as nb2rdf_cache
+
+    # the working copy of a notebook, not versioned yet
+    for _ in range(2):
+        nb2rdf_cache.nb2rdf_jsonld("analysis.ipynb")
+
+    assert len(nb2rdf_calls) == 2
+    assert not nb2rdf_cache.nb2rdf_cache_dir().exists()
+
+
+def _extracted_paths(output):
+    return [line.split("input notebook ")[1].split(" in ")[0]
+            for line in output.splitlines() if "metadata extracted from the input notebook" in line]
+
+
+def test_extract_cached_notebooks(nb2rdf_calls, monkeypatch, capsys):
+    import renkuaqs.graph_utils as graph_utils
+    import renkuaqs.nb2rdf_cache as nb2rdf_cache
+
+    input_notebooks = [(f"nb_{i}.ipynb", f"{i}" * 40) for i in range(3)]
+    for entity_path, entity_checksum in input_notebooks:
+        nb2rdf_cache.nb2rdf_jsonld(entity_path, checksum=entity_checksum)
+
+    def no_pool(*args, **kwargs):
+        raise AssertionError("no process pool is needed when every notebook is cached")
+
+    monkeypatch.setattr(graph_utils, "ProcessPoolExecutor", no_pool)
+    capsys.readouterr()
+
+    extracted_notebooks = graph_utils._extract_input_notebooks(input_notebooks, workers=4)
+
+    assert [_ids(rdf_jsonld) for rdf_jsonld, extraction_time in extracted_notebooks] == \
+        [[f"https://localhost/notebooks/{entity_path}"] for entity_path, entity_checksum in input_notebooks]
+    assert len(nb2rdf_calls) == 3
+    output = capsys.readouterr().out
+    assert "[3/3] metadata extracted" in output
+    assert "(3 cached)" in output and "using 1 worker(s)" in output
+
+
+def test_extract_progress(nb2rdf_calls, monkeypatch, capsys):
+    import time
+    import renkuaqs.graph_utils as graph_utils
+    import renkuaqs.nb2rdf_cache as nb2rdf_cache
+
+    nb2rdf = nb2rdf_cache.ontology.nb2rdf
+
+    def slow_nb2rdf(notebook_path):
+        if notebook_path == "slow.ipynb":
+            time.sleep(1)
+        return nb2rdf(notebook_path)
+
+    monkeypatch.setattr(nb2rdf_cache.ontology, "nb2rdf", slow_nb2rdf)
+    input_notebooks = [("cached.ipynb", "c" * 40), ("slow.ipynb", "0" * 40), ("fast.ipynb", "f" * 40)]
+    nb2rdf_cache.nb2rdf_jsonld("cached.ipynb", checksum="c" * 40)
+    submitted = []
+
+    class RecordingPool(graph_utils.ProcessPoolExecutor):
+        def submit(self, fn, *args, **kwargs):
+            submitted.append(args[0])
+            return super().submit(fn, *args, **kwargs)
+
+    monkeypatch.setattr(graph_utils, "ProcessPoolExecutor", RecordingPool)
+    capsys.readouterr()
+
+    extracted_notebooks = graph_utils._extract_input_notebooks(input_notebooks, workers=4)
+
+    # the results in the order of the notebooks, the progress in the order of completion
+    assert [_ids(rdf_jsonld) for rdf_jsonld, extraction_time in extracted_notebooks] == \
+        [[f"https://localhost/notebooks/{entity_path}"] for entity_path, entity_checksum in input_notebooks]
+    assert sorted(submitted) == ["fast.ipynb", "slow.ipynb"]
+    output = capsys.readouterr().out
+    assert _extracted_paths(output) == ["cached.ipynb", "fast.ipynb", "slow.ipynb"]
+    assert "[3/3] metadata extracted from the input notebook slow.ipynb" in output
+    assert "(1 cached)" in output and "using 2 worker(s)" in output
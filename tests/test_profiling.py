@@ -0,0 +1,75 @@
+import json
+import time
+import pstats
+import threading
+
+
+def _allocate(n_bytes):
+    return bytearray(n_bytes)
+
+
+def _run_stages():
+    import renkuaqs.metrics as metrics
+
+    with metrics.stage("test_outer"):
+        with metrics.stage("test_inner"):
+            buffer = _allocate(20 * 1024 * 1024)
+            del buffer
+        time.sleep(0.05)
+    with metrics.stage("test_inner"):
+        pass
+
+
+def test_profile_report(tmp_path):
+    import renkuaqs.profiling as profiling
+
+    report_path = tmp_path / "profile.json"
+    with profiling.profile(str(report_path)) as profiler:
+        _run_stages()
+
+    report = json.loads(report_path.read_text())
+    assert report == json.loads(json.dumps(profiler.report()))
+    assert list(report['stages']) == ["test_inner", "test_outer"]
+    assert report['stages']['test_inner']['calls'] == 2
+    assert report['stages']['test_outer']['calls'] == 1
+    assert report['slowest_stage'] == "test_outer"
+    # the nested stages are also accounted in their parent stage
+    assert report['stages']['test_outer']['wall_seconds'] >= 0.05
+    assert report['wall_seconds'] >= report['stages']['test_outer']['wall_seconds']
+    for stage_name in ("test_inner", "test_outer"):
+        assert report['stages'][stage_name]['peak_memory_increase_bytes'] >= 20 * 1024 * 1024
+    assert report['peak_memory_bytes'] >= 20 * 1024 * 1024
+    assert 'pstats_filename' not in report
+
+
+def test_profile_pstats(tmp_path):
+    import renkuaqs.profiling as profiling
+
+    pstats_path = tmp_path / "profile.pstats"
+    with profiling.profile(pstats_filename=str(pstats_path)) as profiler:
+        _run_stages()
+
+    # the statistics of the slowest outermost stage
+    assert profiler.dump_pstats(str(pstats_path)) == "test_outer"
+    stats = pstats.Stats(str(pstats_path))
+    assert any(function_name == "_allocate" for file_name, line, function_name in stats.stats)
+
+
+def test_profile_other_threads():
+    import renkuaqs.metrics as metrics
+    import renkuaqs.profiling as profiling
+
+    def run_stage():
+        with metrics.stage("test_other_thread"):
+            pass
+
+    with profiling.profile() as profiler:
+        thread = threading.Thread(target=run_stage)
+        thread.start()
+        thread.join()
+
+    # only the stages of the profiled thread are recorded
+    assert profiler.report()['stages'] == {}
+    assert profiler.slowest_stage is None
+    # the profiler is no longer set once the block is left
+    assert metrics._stage_profiler is None
@@ -0,0 +1,100 @@
+import time
+import threading
+import pytest
+
+from concurrent.futures import ThreadPoolExecutor
+
+N_CALLERS = 8
+
+
+def _call_concurrently(single_flight, key, fn, started, release, n_callers=N_CALLERS):
+    """Call fn through single_flight from n_callers threads, the others arriving while the first is in flight."""
+    def call():
+        try:
+            return single_flight.do(key, fn)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(n_callers) as executor:
+        leader = executor.submit(call)
+        assert started.wait(10)
+        followers = [executor.submit(call) for _ in range(n_callers - 1)]
+        # the followers are waiting on the call in flight
+        while sum(1 for f in followers if f.running()) < n_callers - 1:
+            time.sleep(0.01)
+        time.sleep(0.1)
+        release.set()
+        return [leader] + followers
+
+
+def test_coalesce():
+    from renkuaqs.single_flight import SingleFlight
+
+    single_flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def build():
+        calls.append(threading.get_ident())
+        started.set()
+        assert release.wait(10)
+        return object()
+
+    futures = _call_concurrently(single_flight, "abc1234", build, started, release)
+
+    results = [f.result() for f in futures]
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert not single_flight.in_flight("abc1234")
+
+    # nothing is kept once the call completes
+    started.clear()
+    assert single_flight.do("abc1234", build) is not results[0]
+    assert len(calls) == 2
+
+
+def test_error_propagation():
+    from renkuaqs.single_flight import SingleFlight
+
+    single_flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def failing_build():
+        calls.append(1)
+        started.set()
+        assert release.wait(10)
+        raise RuntimeError("graph build failed")
+
+    futures = _call_concurrently(single_flight, "abc1234", failing_build, started, release)
+
+    errors = [f.result() for f in futures]
+    assert len(calls) == 1
+    assert all(isinstance(e, RuntimeError) and str(e) == "graph build failed" for e in errors)
+
+    # the error is not cached, the next call runs again
+    assert single_flight.do("abc1234", lambda: "rebuilt") == "rebuilt"
+
+
+def test_distinct_keys():
+    from renkuaqs.single_flight import SingleFlight
+
+    single_flight = SingleFlight()
+    barrier = threading.Barrier(2, timeout=10)
+
+    def build(key):
+        # both keys are in flight at the same time, they are not coalesced
+        barrier.wait()
+        return key
+
+    with ThreadPoolExecutor(2) as executor:
+        futures = [executor.submit(single_flight.do, key, build, key) for key in ("abc1234", "def5678")]
+        assert [f.result() for f in futures] == ["abc1234", "def5678"]
+
+
+def test_arguments():
+    from renkuaqs.single_flight import SingleFlight
+
+    assert SingleFlight().do("key", lambda a, b=0: a + b, 1, b=2) == 3
+    with pytest.raises(KeyError):
+        SingleFlight().do("key", {}.__getitem__, "missing")
@@ -0,0 +1,162 @@
+import os
+import shutil
+import pytest
+
+import synthetic_project
+
+SUBJECTS_QUERY = "SELECT ?s WHERE { ?s ?p ?o }"
+SUBJECTS_CONSTRUCT = "CONSTRUCT { ?s <https://localhost/seen> true } WHERE { ?s ?p ?o }"
+
+
+@pytest.fixture(scope="module")
+def generated_project(tmp_path_factory):
+    return synthetic_project.generate_project(tmp_path_factory.mktemp("synthetic"), n_activities=5, n_notebooks=3,
+                                              n_annotations=2, seed=1)
+
+
+@pytest.fixture
+def result_cache(tmp_path, monkeypatch):
+    import renkuaqs.sparql_cache as sparql_cache
+
+    cache = sparql_cache.SPARQLResultCache(1024 ** 2, disk=True, max_disk_bytes=1024 ** 2)
+    monkeypatch.setattr(sparql_cache, "_result_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def project(generated_project, monkeypatch, tmp_path):
+    from renku.domain_model.project_context import project_context
+    import renkuaqs.graph_utils as graph_utils
+
+    export_calls = []
+
+    def export_graph(revision=None, paths=None):
+        export_calls.append(revision)
+        return generated_project.export_graph(revision, paths)
+
+    monkeypatch.setattr(graph_utils, "_renku_graph", export_graph)
+    monkeypatch.setattr(graph_utils, "_nodes_subset_ontologies_graph", synthetic_project.ontology_graph)
+    monkeypatch.setenv("RENKUAQS_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.chdir(generated_project.path)
+
+    with project_context.with_path(generated_project.path):
+        yield generated_project, export_calls
+
+
+def _fingerprint(project_path):
+    import renkuaqs.sparql_cache as sparql_cache
+
+    return sparql_cache.graph_fingerprint(str(project_path), "HEAD", "overall")
+
+
+def test_graph_fingerprint(project):
+    generated_project, export_calls = project
+
+    fingerprint = _fingerprint(generated_project.path)
+    assert _fingerprint(generated_project.path).digest == fingerprint.digest
+
+    # a new annotation changes the fingerprint, without the graph being exported
+    annotation_path = generated_project.path / ".aqs" / "extra.jsonld"
+    annotation_path.write_text("[]")
+    try:
+        assert _fingerprint(generated_project.path).digest != fingerprint.digest
+    finally:
+        os.remove(annotation_path)
+    assert export_calls == []
+
+
+def test_cached_results(project, result_cache):
+    import renkuaqs.sparql as sparql
+    import renkuaqs.graph_utils as graph_utils
+
+    generated_project, export_calls = project
+    fingerprint = _fingerprint(generated_project.path)
+    graph = sparql.LazyGraph(graph_utils._overall_graph, "HEAD", str(generated_project.path))
+
+    rows = set(sparql.query(graph, SUBJECTS_QUERY, "subjects", fingerprint=fingerprint))
+    triples = set(sparql.query(graph, SUBJECTS_CONSTRUCT, "subjects_construct", fingerprint=fingerprint).graph)
+    assert len(export_calls) == 1
+
+    # the graph is not built again, and each lookup returns a new result the caller can modify
+    graph = sparql.LazyGraph(graph_utils._overall_graph, "HEAD", str(generated_project.path))
+    assert set(sparql.query(graph, SUBJECTS_QUERY, "subjects", fingerprint=fingerprint)) == rows
+    construct_graph = sparql.query(graph, SUBJECTS_CONSTRUCT, "subjects_construct", fingerprint=fingerprint).graph
+    construct_graph.remove((None, None, None))
+    assert set(sparql.query(graph, SUBJECTS_CONSTRUCT, "subjects_construct", fingerprint=fingerprint).graph) == triples
+    assert len(export_calls) == 1
+
+
+def test_disk_cache(project, result_cache):
+    import renkuaqs.sparql as sparql
+    import renkuaqs.sparql_cache as sparql_cache
+    import renkuaqs.graph_utils as graph_utils
+
+    generated_project, export_calls = project
+    cache_dir = generated_project.path / ".renku" / "cache" / "renkuaqs-sparql"
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    fingerprint = _fingerprint(generated_project.path)
+    graph = sparql.LazyGraph(graph_utils._overall_graph, "HEAD", str(generated_project.path))
+    rows = set(sparql.query(graph, SUBJECTS_QUERY, "subjects", fingerprint=fingerprint))
+
+    # eg another process
+    result_cache.clear()
+    assert set(sparql.query(graph, SUBJECTS_QUERY, "subjects", fingerprint=fingerprint)) == rows
+    assert len(export_calls) == 1
+
+    # the least recently used results are evicted beyond the size of the disk cache
+    n_bytes = sum(cache_file.stat().st_size for cache_file in cache_dir.glob("*.result"))
+    small_cache = sparql_cache.SPARQLResultCache(0, disk=True, max_disk_bytes=n_bytes)
+    for name in ("subjects_1", "subjects_2"):
+        small_cache.put(fingerprint, sparql_cache.result_key(fingerprint, SUBJECTS_QUERY, name),
+                        sparql.query(graph, SUBJECTS_QUERY, name))
+    assert [cache_file.name for cache_file in cache_dir.glob("*.result")] == \
+        [sparql_cache.result_key(fingerprint, SUBJECTS_QUERY, "subjects_2") + ".result"]
+
+
+def test_memory_cache_eviction(project):
+    import renkuaqs.sparql as sparql
+    import renkuaqs.sparql_cache as sparql_cache
+    import renkuaqs.graph_utils as graph_utils
+
+    generated_project, export_calls = project
+    fingerprint = _fingerprint(generated_project.path)
+    graph = graph_utils._overall_graph("HEAD", str(generated_project.path))
+    result = sparql.query(graph, SUBJECTS_QUERY, "subjects")
+
+    cache = sparql_cache.SPARQLResultCache(int(len(sparql_cache.dump_result(result)) * 1.5))
+    keys = [sparql_cache.result_key(fingerprint, SUBJECTS_QUERY, name) for name in ("subjects_1", "subjects_2")]
+    for key in keys:
+        cache.put(fingerprint, key, result)
+
+    assert cache.get(fingerprint, keys[0]) is None
+    assert set(cache.get(fingerprint, keys[1])) == set(result)
+
+
+def test_params_cached(project, result_cache):
+    from click.testing import CliRunner
+    from renkuaqs.plugin import params
+
+    generated_project, export_calls = project
+
+    first_result = CliRunner().invoke(params, [])
+    result_cache.clear()
+    second_result = CliRunner().invoke(params, [])
+
+    assert first_result.exit_code == 0, first_result.output
+    assert second_result.output == first_result.output
+
+
+def test_result_entry_size(project):
+    import renkuaqs.sparql as sparql
+    import renkuaqs.sparql_cache as sparql_cache
+    import renkuaqs.graph_utils as graph_utils
+
+    generated_project, export_calls = project
+    graph = graph_utils._overall_graph("HEAD", str(generated_project.path))
+    result = sparql.query(graph, SUBJECTS_QUERY + " LIMIT 1", "one_subject")
+
+    # only the values of the rows are stored, not the graph the bindings refer to
+    payload = sparql_cache.dump_result(result)
+    assert len(payload) < 1024
+    assert len(result) == 1 and len(graph) > 100
+    assert list(sparql_cache.load_result(payload)) == list(result)
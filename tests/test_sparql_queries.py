@@ -0,0 +1,90 @@
+import json
+import pytest
+
+from importlib import resources
+
+import synthetic_project
+import legacy_queries
+
+# the optimised queries must return the same results as the legacy ones, over synthetic projects
+# of a few sizes and compositions
+EQUIVALENCE_PROJECTS = {
+    "small": dict(n_activities=10, n_notebooks=5, n_annotations=2),
+    "medium": dict(n_activities=40, n_notebooks=10, n_annotations=4),
+    "objects-only": dict(n_activities=10, n_notebooks=3, n_annotations=3, annotation_kinds=("object",)),
+    "no-annotations": dict(n_activities=5, n_notebooks=3, n_annotations=0),
+}
+
+
+@pytest.fixture(scope="module", params=sorted(EQUIVALENCE_PROJECTS))
+def generated_project(request, tmp_path_factory):
+    return synthetic_project.generate_project(tmp_path_factory.mktemp(f"synthetic-{request.param}"),
+                                              seed=1, **EQUIVALENCE_PROJECTS[request.param])
+
+
+@pytest.fixture
+def overall_graph(generated_project, monkeypatch, tmp_path):
+    from renku.domain_model.project_context import project_context
+    import renkuaqs.graph_utils as graph_utils
+
+    monkeypatch.setattr(graph_utils, "_renku_graph", generated_project.export_graph)
+    monkeypatch.setattr(graph_utils, "_nodes_subset_ontologies_graph", synthetic_project.ontology_graph)
+    monkeypatch.setenv("RENKUAQS_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.chdir(generated_project.path)
+
+    with project_context.with_path(generated_project.path):
+        yield graph_utils._overall_graph("HEAD", str(generated_project.path))
+
+
+def _rows(result):
+    return {tuple(row) for row in result}
+
+
+def _triples(result):
+    return set(result.graph)
+
+
+@pytest.mark.parametrize("kind", synthetic_project.ANNOTATION_KINDS)
+def test_params_select_query(overall_graph, kind):
+    import renkuaqs.graph_utils as graph_utils
+
+    legacy_query = legacy_queries.LEGACY_PARAMS_SELECT[kind] + "\n" + legacy_queries.LEGACY_PARAMS_QUERY_WHERE[kind]
+
+    assert _rows(overall_graph.query(graph_utils.build_params_select_query(kind))) == \
+        _rows(overall_graph.query(legacy_query))
+
+
+def test_params_graph(overall_graph):
+    import renkuaqs.graph_utils as graph_utils
+
+    legacy_query = legacy_queries.LEGACY_PARAMS_CONSTRUCT + "\n" + legacy_queries.LEGACY_PARAMS_CONSTRUCT_QUERY_WHERE
+
+    assert set(graph_utils.params_graph(overall_graph)) == _triples(overall_graph.query(legacy_query))
+
+
+@pytest.mark.parametrize("no_oda_info", [False, True])
+@pytest.mark.parametrize("with_input_notebook", [False, True])
+def test_graph_image_query(generated_project, overall_graph, no_oda_info, with_input_notebook):
+    import renkuaqs.graph_utils as graph_utils
+
+    input_notebook = generated_project.notebooks[0][0] if with_input_notebook else None
+    query_construct = graph_utils.build_query_construct(no_oda_info=no_oda_info)
+
+    query = query_construct + graph_utils.build_query_where(input_notebook=input_notebook, no_oda_info=no_oda_info)
+    legacy_query = query_construct + legacy_queries.legacy_build_query_where(input_notebook=input_notebook,
+                                                                              no_oda_info=no_oda_info)
+
+    assert _triples(overall_graph.query(query)) == _triples(overall_graph.query(legacy_query))
+
+
+def test_oda_nodes_subset_query(overall_graph):
+    import renkuaqs.graph_utils as graph_utils
+
+    with resources.open_text("renkuaqs", 'graph_nodes_subset_config.json') as graph_nodes_subset_config_fn_f:
+        oda_subset = json.load(graph_nodes_subset_config_fn_f)["oda"]
+
+    legacy_oda_subset = dict(oda_subset, query_where=legacy_queries.LEGACY_ODA_SUBSET_QUERY_WHERE)
+
+    assert "?run ?p ?o" not in oda_subset["query_where"]
+    assert _triples(overall_graph.query(graph_utils.nodes_subset_query(oda_subset))) == \
+        _triples(overall_graph.query(graph_utils.nodes_subset_query(legacy_oda_subset)))
@@ -0,0 +1,161 @@
+import os
+import pytest
+
+ASSETS_CONFIG = {
+    "n3.min.js": {
+        "url": "https://unpkg.com/n3/browser/n3.min.js"
+    },
+    "bootstrap-icons.css": {
+        "url": "https://cdn.jsdelivr.net/npm/bootstrap-icons@1.3.0/font/bootstrap-icons.css",
+        "depends": ["fonts/bootstrap-icons.woff"]
+    },
+    "fonts/bootstrap-icons.woff": {
+        "url": "https://cdn.jsdelivr.net/npm/bootstrap-icons@1.3.0/font/fonts/bootstrap-icons.woff"
+    },
+    "jquery.min.js": {
+        "url": "https://ajax.googleapis.com/ajax/libs/jquery/3.5.1/jquery.min.js"
+    }
+}
+
+
+@pytest.fixture
+def static_dir(tmp_path, monkeypatch):
+    import renkuaqs.static_assets as static_assets
+
+    static_dir = tmp_path / "static"
+    # vendored, except jquery
+    for name, content in [("n3.min.js", "n3"), ("bootstrap-icons.css", "icons"),
+                          ("fonts/bootstrap-icons.woff", "font")]:
+        static_dir.joinpath(name).parent.mkdir(parents=True, exist_ok=True)
+        static_dir.joinpath(name).write_text(content)
+    tmp_path.joinpath("secret.txt").write_text("secret")
+
+    monkeypatch.setattr(static_assets, "STATIC_DIR", str(static_dir))
+    monkeypatch.setattr(static_assets, "static_assets_config", ASSETS_CONFIG)
+    monkeypatch.setattr(static_assets, "_asset_hashes", {})
+    monkeypatch.setattr(static_assets, "_cdn_assets", set())
+    return static_dir
+
+
+def test_asset_url(static_dir):
+    import renkuaqs.static_assets as static_assets
+
+    n3_hash = static_assets.asset_hash("n3.min.js")
+    assert static_assets.asset_url("n3.min.js") == f"renkuaqs-static/{n3_hash}/n3.min.js"
+    assert n3_hash != static_assets.asset_hash("bootstrap-icons.css")
+    # loaded from its CDN when not vendored
+    assert static_assets.asset_url("jquery.min.js") == ASSETS_CONFIG["jquery.min.js"]["url"]
+    assert static_assets.asset_name_from_url(ASSETS_CONFIG["jquery.min.js"]["url"]) == "jquery.min.js"
+
+
+def test_resolve(static_dir):
+    import renkuaqs.static_assets as static_assets
+
+    n3_hash = static_assets.asset_hash("n3.min.js")
+    icons_hash = static_assets.asset_hash("bootstrap-icons.css")
+
+    assert static_assets.resolve(f"/renkuaqs-static/{n3_hash}/n3.min.js") == str(static_dir / "n3.min.js")
+    # the fonts of the stylesheet, under its hash
+    assert static_assets.resolve(f"/renkuaqs-static/{icons_hash}/fonts/bootstrap-icons.woff") == \
+        str(static_dir / "fonts" / "bootstrap-icons.woff")
+    # stale hash, unknown or not vendored asset, or not under the static prefix
+    assert static_assets.resolve("/renkuaqs-static/000000000000/n3.min.js") is None
+    assert static_assets.resolve(f"/renkuaqs-static/{n3_hash}/bootstrap-icons.css") is None
+    assert static_assets.resolve(f"/renkuaqs-static/{n3_hash}/jquery.min.js") is None
+    assert static_assets.resolve(f"/static/{n3_hash}/n3.min.js") is None
+
+
+@pytest.mark.parametrize("name", ["../secret.txt", "fonts/../../secret.txt", "/secret.txt", "%2e%2e/secret.txt"])
+def test_resolve_path_traversal(static_dir, name):
+    import renkuaqs.static_assets as static_assets
+
+    for asset_name in ASSETS_CONFIG:
+        content_hash = static_assets.asset_hash(asset_name) or "000000000000"
+        assert static_assets.resolve(f"/renkuaqs-static/{content_hash}/{name}") is None
+
+
+def test_copy_assets(static_dir, tmp_path):
+    import renkuaqs.static_assets as static_assets
+
+    destination_dir = tmp_path / "renkuaqs-graph"
+    static_assets.copy_assets(str(destination_dir))
+
+    copied_files = sorted(os.path.relpath(os.path.join(root, file_name), destination_dir)
+                          for root, dirs, files in os.walk(destination_dir) for file_name in files)
+    icons_hash = static_assets.asset_hash("bootstrap-icons.css")
+    assert copied_files == sorted([
+        os.path.join("renkuaqs-static", static_assets.asset_hash("n3.min.js"), "n3.min.js"),
+        os.path.join("renkuaqs-static", icons_hash, "bootstrap-icons.css"),
+        os.path.join("renkuaqs-static", icons_hash, "fonts", "bootstrap-icons.woff"),
+        os.path.join("renkuaqs-static", static_assets.asset_hash("fonts/bootstrap-icons.woff"),
+                     "fonts", "bootstrap-icons.woff"),
+    ])
+    # the relative urls of the generated html resolve to the copies
+    assert destination_dir.joinpath(static_assets.asset_url("n3.min.js")).read_text() == "n3"
+
+
+def _upstream_asset(tmp_path, content):
+    import hashlib
+
+    upstream_path = tmp_path / "upstream.js"
+    upstream_path.write_text(content)
+    return upstream_path.as_uri(), hashlib.sha256(content.encode()).hexdigest()
+
+
+def test_fetch_assets(static_dir, tmp_path, monkeypatch):
+    import renkuaqs.static_assets as static_assets
+
+    url, sha256 = _upstream_asset(tmp_path, "jquery")
+    monkeypatch.setattr(static_assets, "static_assets_config",
+                        dict(ASSETS_CONFIG, **{"jquery.min.js": {"url": url, "sha256": sha256}}))
+
+    static_assets.fetch_assets()
+
+    assert static_dir.joinpath("jquery.min.js").read_text() == "jquery"
+    assert not static_dir.joinpath("jquery.min.js.part").exists()
+    # the vendored assets are kept
+    assert static_dir.joinpath("n3.min.js").read_text() == "n3"
+    assert static_assets.asset_url("jquery.min.js").startswith("renkuaqs-static/")
+
+
+def test_fetch_assets_verified(static_dir, tmp_path, monkeypatch, caplog):
+    import renkuaqs.static_assets as static_assets
+
+    url, sha256 = _upstream_asset(tmp_path, "jquery")
+    # changed upstream since its sha256 was recorded
+    monkeypatch.setattr(static_assets, "static_assets_config",
+                        dict(ASSETS_CONFIG, **{"jquery.min.js": {"url": url, "sha256": "0" * 64}}))
+    with pytest.raises(ValueError, match=sha256):
+        static_assets.fetch_assets()
+    assert sorted(p.name for p in static_dir.iterdir()) == ["bootstrap-icons.css", "fonts", "n3.min.js"]
+
+    # not pinned yet
+    monkeypatch.setattr(static_assets, "static_assets_config",
+                        dict(ASSETS_CONFIG, **{"jquery.min.js": {"url": url, "sha256": None}}))
+    static_assets.fetch_assets()
+    assert not static_dir.joinpath("jquery.min.js").exists()
+    assert "No sha256 is recorded for the asset jquery.min.js" in caplog.text
+
+    # loaded from its CDN, which is reported once
+    caplog.clear()
+    for _ in range(2):
+        assert static_assets.asset_url("jquery.min.js") == url
+    assert caplog.text.count("The asset jquery.min.js is not available within the package") == 1
+
+
+def test_pin_assets(static_dir, tmp_path, monkeypatch):
+    import json
+    import renkuaqs.static_assets as static_assets
+
+    url, sha256 = _upstream_asset(tmp_path, "jquery")
+    assets_config = {"jquery.min.js": {"url": url, "sha256": None},
+                     "lib/bindings/utils.js": {"package": "pyvis", "path": "lib/bindings/utils.js"}}
+    monkeypatch.setattr(static_assets, "static_assets_config", assets_config)
+
+    static_assets.pin_assets(str(tmp_path / "static_assets.json"))
+
+    assert json.loads(tmp_path.joinpath("static_assets.json").read_text()) == {
+        "jquery.min.js": {"url": url, "sha256": sha256},
+        "lib/bindings/utils.js": {"package": "pyvis", "path": "lib/bindings/utils.js"}}
+    static_assets.fetch_assets()
+    assert static_dir.joinpath("jquery.min.js").read_text() == "jquery"